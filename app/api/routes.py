@@ -1,275 +1,753 @@
-from fastapi import APIRouter, Depends
+import asyncio
+import base64
+import importlib.util
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func, distinct, extract
-from app.database import get_db
-from app.models import Transaction
+from sqlalchemy import DateTime, cast, func, null, or_, select, tuple_
+from app.cache import cache_respostas
+from app.categorias import classificar, treinar
+from app.cestas import atualizar_cestas, regras_do_produto
+from app.config.settings import get_settings
+from app.consultas_lentas import consultas_lentas
+from app import metricas
+from app import exportacao
+from app import ingestao
+from app.arrow import FormatoResposta, formato_resposta
+from app.database import AsyncSessionLocal, get_db, get_async_db, em_paralelo, executar_em_paralelo, estado_pools
+from app.filtros import FiltrosAnalise, filtros_analise
+from app.modelos import registro_modelos
+from app.monitoramento import RotaMedida
+from app.models import AlteracaoTransacoes, SegmentoCliente, Transaction
+from app.rollups import BASE, clientes_distintos_aprox, escolher_fonte_async, atualizar_rollups
 from app.schemas import *
-from typing import Dict
+from app.segmentacao import atualizar_segmentos, carregar_modelo
+from app.serializacao import RespostaJSON, Tabela, colunas, validar
+from typing import Dict, List, Literal, Optional
 
-router = APIRouter()
+router = APIRouter(route_class=RotaMedida)
+settings = get_settings()
+
+# Produtos aceitos por chamada de /produtos/classificar
+MAX_PRODUTOS_CLASSIFICAR = 50000
+# Transações aceitas por chamada de /transacoes/ingerir
+MAX_TRANSACOES_INGERIR = 100000
+
+async def _clientes_aprox(db: AsyncSession, filtros: FiltrosAnalise, por_pais: bool) -> Optional[Dict]:
+    """Clientes distintos pelos esboços HyperLogLog quando approx=true; None para contar exato"""
+    if not filtros.aproximado:
+        return None
+    return await clientes_distintos_aprox(db, filtros.condicoes, filtros.dimensoes(), por_pais)
+
+async def _analise_vendas_por_pais(db: AsyncSession, filtros: FiltrosAnalise) -> Dict:
+    clientes_aprox = await _clientes_aprox(db, filtros, por_pais=True)
+    medidas = ['total_vendas'] if clientes_aprox is not None else ['total_vendas', 'numero_clientes']
+    fonte = await escolher_fonte_async(db, ['Pais'] + filtros.dimensoes(), medidas)
+    total_vendas = fonte.medida('total_vendas')
+    selecionadas = [fonte.dimensao('Pais').label('Pais'), total_vendas.label('total_vendas')]
+    if clientes_aprox is None:
+        selecionadas.append(fonte.medida('numero_clientes').label('numero_clientes'))
+    consulta = (
+        select(*selecionadas)
+        .where(*filtros.condicoes(fonte))
+        .group_by(fonte.dimensao('Pais'))
+        .order_by(total_vendas.desc(), fonte.dimensao('Pais'))
+    )
+    resultados = (await db.execute(consulta)).all()
+
+    if clientes_aprox is None:
+        paises, totais, numero_clientes = colunas(resultados, 'Pais', 'total_vendas', 'numero_clientes')
+    else:
+        paises, totais = colunas(resultados, 'Pais', 'total_vendas')
+        numero_clientes = [clientes_aprox.get(p, 0) for p in paises]
+    # Dividido aqui e não no SQL: o DuckDB arredondaria o quociente para a escala DECIMAL da view
+    ticket_medio = [t / n if n else 0 for t, n in zip(totais, numero_clientes)]
+
+    return {
+        "status": "success",
+        "data": Tabela(
+            VendasPorPaisResponse,
+            pais=paises,
+            total_vendas=list(map(float, totais)),
+            numero_clientes=list(map(int, numero_clientes)),
+            ticket_medio=list(map(float, ticket_medio))
+        ),
+        "total_paises": len(paises)
+    }
 
 @router.get("/analise/vendas-por-pais", response_model=AnaliseVendasPaisResponse)
-def get_vendas_por_pais(db: Session = Depends(get_db)):
+async def get_vendas_por_pais(filtros: FiltrosAnalise = Depends(filtros_analise), formato: FormatoResposta = Depends(formato_resposta), db: AsyncSession = Depends(get_async_db)):
     try:
-        resultados = (
-            db.query(
-                Transaction.Pais,
-                func.sum(Transaction.ValorTotalFatura).label('total_vendas'),
-                func.count(distinct(Transaction.IDCliente)).label('numero_clientes'),
-                (func.sum(Transaction.ValorTotalFatura) / func.count(distinct(Transaction.IDCliente))).label('ticket_medio')
-            )
-            .group_by(Transaction.Pais)
-            .order_by(func.sum(Transaction.ValorTotalFatura).desc())
-            .all()
-        )
+        return formato.responder(await _analise_vendas_por_pais(db, filtros), AnaliseVendasPaisResponse)
+    except Exception as e:
+        return AnaliseVendasPaisResponse(status="error", data=[], total_paises=0)
 
-        dados = [
-            VendasPorPaisResponse(
-                pais=r.Pais,
-                total_vendas=float(r.total_vendas),
-                numero_clientes=r.numero_clientes,
-                ticket_medio=float(r.ticket_medio)
-            )
-            for r in resultados
-        ]
+def _serie_temporal(linhas: list, rotulo: str, coluna: str) -> Tabela:
+    valores, totais, quantidades = colunas(linhas, coluna, 'total_vendas', 'quantidade_vendas')
+    return Tabela(
+        VendasTemporalResponse,
+        periodo=[f"{rotulo} {v}" for v in valores],
+        total_vendas=list(map(float, totais)),
+        quantidade_vendas=list(map(int, quantidades)),
+        ticket_medio=[float(t/q) for t, q in zip(totais, quantidades)]
+    )
 
-        return AnaliseVendasPaisResponse(
-            status="success",
-            data=dados,
-            total_paises=len(dados)
+async def _analise_temporal(db: AsyncSession, filtros: FiltrosAnalise) -> Dict:
+    fonte = await escolher_fonte_async(db, ['Mes', 'DiaSemana', 'SemanaAno'] + filtros.dimensoes(), ['total_vendas', 'quantidade_vendas'])
+
+    mes = fonte.dimensao('Mes')
+    dia_semana = fonte.dimensao('DiaSemana')
+    semana = fonte.dimensao('SemanaAno')
+
+    # Vendas por mês, dia da semana e semana em uma única leitura (GROUPING SETS)
+    consulta = (
+        select(
+            func.grouping(mes).label('sem_mes'),
+            func.grouping(dia_semana).label('sem_dia_semana'),
+            mes.label('Mes'),
+            dia_semana.label('DiaSemana'),
+            semana.label('SemanaAno'),
+            fonte.medida('total_vendas').label('total_vendas'),
+            fonte.medida('quantidade_vendas').label('quantidade_vendas')
         )
-    except Exception as e:
-        return AnaliseVendasPaisResponse(status="error", data=[], total_paises=0)
+        .where(*filtros.condicoes(fonte))
+        .group_by(func.grouping_sets(mes, dia_semana, semana))
+        .order_by(mes, dia_semana, semana)
+    )
+    resultados = (await db.execute(consulta)).all()
+    vendas_mes = [r for r in resultados if r.sem_mes == 0]
+    vendas_dia_semana = [r for r in resultados if r.sem_dia_semana == 0]
+    vendas_semana = [r for r in resultados if r.sem_mes == 1 and r.sem_dia_semana == 1]
+
+    return {
+        "status": "success",
+        "vendas_por_mes": _serie_temporal(vendas_mes, "Mês", 'Mes'),
+        "vendas_por_dia_semana": _serie_temporal(vendas_dia_semana, "Dia", 'DiaSemana'),
+        "vendas_por_semana": _serie_temporal(vendas_semana, "Semana", 'SemanaAno')
+    }
 
 @router.get("/analise/temporal", response_model=AnaliseTemporalResponse)
-def get_analise_temporal(db: Session = Depends(get_db)):
+async def get_analise_temporal(filtros: FiltrosAnalise = Depends(filtros_analise), formato: FormatoResposta = Depends(formato_resposta), db: AsyncSession = Depends(get_async_db)):
     try:
-        # Vendas por mês
-        vendas_mes = (
-            db.query(
-                Transaction.Mes,
-                func.sum(Transaction.ValorTotalFatura).label('total_vendas'),
-                func.count(Transaction.NumeroFatura).label('quantidade_vendas')
-            )
-            .group_by(Transaction.Mes)
-            .order_by(Transaction.Mes)
-            .all()
-        )
+        return formato.responder(await _analise_temporal(db, filtros), AnaliseTemporalResponse)
+    except Exception as e:
+        return AnaliseTemporalResponse(status="error", vendas_por_mes=[], vendas_por_dia_semana=[], vendas_por_semana=[])
 
-        # Vendas por dia da semana
-        vendas_dia_semana = (
-            db.query(
-                Transaction.DiaSemana,
-                func.sum(Transaction.ValorTotalFatura).label('total_vendas'),
-                func.count(Transaction.NumeroFatura).label('quantidade_vendas')
-            )
-            .group_by(Transaction.DiaSemana)
-            .order_by(Transaction.DiaSemana)
-            .all()
+async def _analise_produtos(db: AsyncSession, filtros: FiltrosAnalise) -> Dict:
+    # Top 10 produtos
+    fonte = await escolher_fonte_async(db, ['CodigoProduto', 'Descricao'] + filtros.dimensoes(), ['total_vendas', 'quantidade_itens'])
+    valor_total = fonte.medida('total_vendas')
+    consulta_top = (
+        select(
+            fonte.dimensao('CodigoProduto').label('CodigoProduto'),
+            fonte.dimensao('Descricao').label('Descricao'),
+            fonte.medida('quantidade_itens').label('quantidade_vendida'),
+            valor_total.label('valor_total')
         )
+        .where(*filtros.condicoes(fonte))
+        .group_by(fonte.dimensao('CodigoProduto'), fonte.dimensao('Descricao'))
+        .order_by(valor_total.desc(), fonte.dimensao('CodigoProduto'), fonte.dimensao('Descricao'))
+        .limit(10)
+    )
 
-        # Vendas por semana
-        vendas_semana = (
-            db.query(
-                Transaction.SemanaAno,
-                func.sum(Transaction.ValorTotalFatura).label('total_vendas'),
-                func.count(Transaction.NumeroFatura).label('quantidade_vendas')
-            )
-            .group_by(Transaction.SemanaAno)
-            .order_by(Transaction.SemanaAno)
-            .all()
+    # Análise por categoria
+    fonte = await escolher_fonte_async(db, ['CategoriaProduto', 'CategoriaPreco'] + filtros.dimensoes(), ['total_vendas', 'quantidade_itens'])
+    valor_total = fonte.medida('total_vendas')
+    consulta_categorias = (
+        select(
+            fonte.dimensao('CategoriaProduto').label('CategoriaProduto'),
+            valor_total.label('valor_total'),
+            fonte.medida('quantidade_itens').label('quantidade_vendida')
         )
+        .where(*filtros.condicoes(fonte))
+        .group_by(fonte.dimensao('CategoriaProduto'))
+        .order_by(valor_total.desc(), fonte.dimensao('CategoriaProduto'))
+    )
 
-        return AnaliseTemporalResponse(
-            status="success",
-            vendas_por_mes=[
-                VendasTemporalResponse(
-                    periodo=f"Mês {r.Mes}",
-                    total_vendas=float(r.total_vendas),
-                    quantidade_vendas=r.quantidade_vendas,
-                    ticket_medio=float(r.total_vendas/r.quantidade_vendas)
-                ) for r in vendas_mes
-            ],
-            vendas_por_dia_semana=[
-                VendasTemporalResponse(
-                    periodo=f"Dia {r.DiaSemana}",
-                    total_vendas=float(r.total_vendas),
-                    quantidade_vendas=r.quantidade_vendas,
-                    ticket_medio=float(r.total_vendas/r.quantidade_vendas)
-                ) for r in vendas_dia_semana
-            ],
-            vendas_por_semana=[
-                VendasTemporalResponse(
-                    periodo=f"Semana {r.SemanaAno}",
-                    total_vendas=float(r.total_vendas),
-                    quantidade_vendas=r.quantidade_vendas,
-                    ticket_medio=float(r.total_vendas/r.quantidade_vendas)
-                ) for r in vendas_semana
-            ]
+    # Distribuição por categoria de preço
+    consulta_preco = (
+        select(
+            fonte.dimensao('CategoriaPreco').label('CategoriaPreco'),
+            valor_total.label('valor_total')
         )
-    except Exception as e:
-        return AnaliseTemporalResponse(status="error", vendas_por_mes=[], vendas_por_dia_semana=[], vendas_por_semana=[])
+        .where(*filtros.condicoes(fonte))
+        .group_by(fonte.dimensao('CategoriaPreco'))
+    )
+
+    # As três consultas são independentes: executadas ao mesmo tempo, em conexões separadas
+    # enquanto houver vaga para sessões extras
+    top_produtos, categorias, dist_preco = await executar_em_paralelo(
+        db, consulta_top, consulta_categorias, consulta_preco
+    )
+
+    codigos, descricoes, quantidades, valores = colunas(top_produtos, 'CodigoProduto', 'Descricao', 'quantidade_vendida', 'valor_total')
+    nomes_categorias, valores_categorias, quantidades_categorias = colunas(categorias, 'CategoriaProduto', 'valor_total', 'quantidade_vendida')
+
+    return {
+        "status": "success",
+        "top_produtos": Tabela(
+            ProdutoAnalise,
+            codigo=codigos,
+            descricao=descricoes,
+            quantidade_vendida=list(map(int, quantidades)),
+            valor_total=list(map(float, valores)),
+            ticket_medio=[float(v/q) for v, q in zip(valores, quantidades)]
+        ),
+        "categorias": Tabela(
+            CategoriaProdutoAnalise,
+            categoria=nomes_categorias,
+            valor_total=list(map(float, valores_categorias)),
+            quantidade_vendida=list(map(int, quantidades_categorias)),
+            ticket_medio=[float(v/q) for v, q in zip(valores_categorias, quantidades_categorias)]
+        ),
+        "distribuicao_preco": {
+            d.CategoriaPreco: float(d.valor_total) for d in dist_preco
+        }
+    }
 
 @router.get("/analise/produtos", response_model=AnaliseProdutosResponse)
-def get_analise_produtos(db: Session = Depends(get_db)):
+async def get_analise_produtos(filtros: FiltrosAnalise = Depends(filtros_analise), formato: FormatoResposta = Depends(formato_resposta), db: AsyncSession = Depends(get_async_db)):
     try:
-        # Top 10 produtos
-        top_produtos = (
-            db.query(
-                Transaction.CodigoProduto,
-                Transaction.Descricao,
-                func.sum(Transaction.Quantidade).label('quantidade_vendida'),
-                func.sum(Transaction.ValorTotalFatura).label('valor_total')
-            )
-            .group_by(Transaction.CodigoProduto, Transaction.Descricao)
-            .order_by(func.sum(Transaction.ValorTotalFatura).desc())
-            .limit(10)
-            .all()
-        )
+        return formato.responder(await _analise_produtos(db, filtros), AnaliseProdutosResponse)
+    except Exception as e:
+        return AnaliseProdutosResponse(status="error", top_produtos=[], categorias=[], distribuicao_preco={})
 
-        # Análise por categoria
-        categorias = (
-            db.query(
-                Transaction.CategoriaProduto,
-                func.sum(Transaction.ValorTotalFatura).label('valor_total'),
-                func.sum(Transaction.Quantidade).label('quantidade_vendida')
-            )
-            .group_by(Transaction.CategoriaProduto)
-            .order_by(func.sum(Transaction.ValorTotalFatura).desc())
-            .all()
+async def _consultar_clientes(db: AsyncSession, filtros: FiltrosAnalise) -> list:
+    clientes_aprox = await _clientes_aprox(db, filtros, por_pais=True)
+    medidas = ['total_vendas', 'quantidade_vendas']
+    if clientes_aprox is None:
+        medidas.append('numero_clientes')
+    fonte = await escolher_fonte_async(db, ['IDCliente', 'Pais'] + filtros.dimensoes(), medidas)
+    id_cliente = fonte.dimensao('IDCliente')
+    pais = fonte.dimensao('Pais')
+    total_compras = fonte.medida('total_vendas')
+
+    # Totais por cliente, por país e geral em uma única leitura (GROUPING SETS).
+    # A posição de cada cliente é calculada no banco para trazer só o top 10.
+    agrupado = (
+        select(
+            func.grouping(id_cliente).label('sem_cliente'),
+            func.grouping(pais).label('sem_pais'),
+            id_cliente.label('IDCliente'),
+            pais.label('Pais'),
+            total_compras.label('total_compras'),
+            fonte.medida('quantidade_vendas').label('frequencia_compras'),
+            (fonte.medida('numero_clientes') if clientes_aprox is None else null()).label('numero_clientes'),
+            func.max(pais).label('pais_cliente'),
+            func.row_number().over(
+                partition_by=[func.grouping(id_cliente), func.grouping(pais)],
+                order_by=[total_compras.desc(), id_cliente, pais]
+            ).label('posicao')
         )
+        .where(*filtros.condicoes(fonte))
+        .group_by(func.grouping_sets(id_cliente, pais, tuple_()))
+        .subquery()
+    )
+    consulta = (
+        select(agrupado)
+        .where(or_(agrupado.c.sem_cliente == 1, agrupado.c.posicao <= 10))
+        .order_by(agrupado.c.sem_cliente, agrupado.c.posicao)
+    )
+    resultados = (await db.execute(consulta)).all()
+    if clientes_aprox is None:
+        return resultados
 
-        # Distribuição por categoria de preço
-        dist_preco = (
-            db.query(
-                Transaction.CategoriaPreco,
-                func.sum(Transaction.ValorTotalFatura).label('valor_total')
-            )
-            .group_by(Transaction.CategoriaPreco)
-            .all()
+    # Clientes distintos por país e no geral vêm dos esboços, não do count(distinct)
+    clientes_aprox.update(await _clientes_aprox(db, filtros, por_pais=False))
+    return [
+        SimpleNamespace(**{
+            **r._asdict(),
+            'numero_clientes': clientes_aprox.get(None if r.sem_pais else r.Pais, 0)
+        }) if r.sem_cliente == 1 else r
+        for r in resultados
+    ]
+
+def _montar_clientes(resultados: list) -> Dict:
+    # Top 10 clientes
+    top_clientes = [r for r in resultados if r.sem_cliente == 0]
+
+    # Distribuição por país
+    dist_pais = {
+        r.Pais: int(r.numero_clientes)
+        for r in resultados if r.sem_cliente == 1 and r.sem_pais == 0
+    }
+
+    # Média de compras por cliente (0 quando os filtros não encontram nenhuma transação)
+    total = next(r for r in resultados if r.sem_cliente == 1 and r.sem_pais == 1)
+    media_compras = total.frequencia_compras / total.numero_clientes if total.numero_clientes else 0
+
+    ids, totais, frequencias, paises = colunas(top_clientes, 'IDCliente', 'total_compras', 'frequencia_compras', 'pais_cliente')
+
+    return {
+        "status": "success",
+        "top_clientes": Tabela(
+            ClienteAnalise,
+            id_cliente=ids,
+            total_compras=list(map(float, totais)),
+            frequencia_compras=list(map(int, frequencias)),
+            ticket_medio=[float(t/f) for t, f in zip(totais, frequencias)],
+            pais=paises
+        ),
+        "distribuicao_por_pais": dist_pais,
+        "media_compras_por_cliente": float(media_compras)
+    }
+
+def _montar_vendas_por_pais(resultados: list) -> Dict:
+    """Vendas por país a partir das linhas de _consultar_clientes (conjunto agrupado só por país)"""
+    por_pais = [r for r in resultados if r.sem_cliente == 1 and r.sem_pais == 0]
+    paises, totais, numero_clientes = colunas(por_pais, 'Pais', 'total_compras', 'numero_clientes')
+    dados = Tabela(
+        VendasPorPaisResponse,
+        pais=paises,
+        total_vendas=list(map(float, totais)),
+        numero_clientes=list(map(int, numero_clientes)),
+        ticket_medio=[float(t/n) for t, n in zip(totais, numero_clientes)]
+    )
+    return {"status": "success", "data": dados, "total_paises": len(dados)}
+
+async def _analise_clientes(db: AsyncSession, filtros: FiltrosAnalise) -> Dict:
+    return _montar_clientes(await _consultar_clientes(db, filtros))
+
+@router.get("/analise/clientes", response_model=AnaliseClientesResponse)
+async def get_analise_clientes(filtros: FiltrosAnalise = Depends(filtros_analise), formato: FormatoResposta = Depends(formato_resposta), db: AsyncSession = Depends(get_async_db)):
+    try:
+        return formato.responder(await _analise_clientes(db, filtros), AnaliseClientesResponse)
+    except Exception as e:
+        return AnaliseClientesResponse(status="error", top_clientes=[], distribuicao_por_pais={}, media_compras_por_cliente=0)
+
+def _intervalo_faturamento(fonte, granularidade: str):
+    """Início do intervalo (hour/day/week/month) de cada linha, truncado no banco"""
+    if granularidade == 'hour':
+        return cast(func.date_trunc('hour', fonte.dimensao('DataFatura')), DateTime)
+    dia = cast(fonte.dimensao('Dia'), DateTime)
+    if granularidade == 'day':
+        return dia
+    return cast(func.date_trunc(granularidade, dia), DateTime)
+
+async def _analise_faturamento(db: AsyncSession, filtros: FiltrosAnalise) -> Dict:
+    # Só a série por hora precisa de DataFatura; por dia, semana ou mês basta o rollup diário
+    dimensao = 'DataFatura' if filtros.granularidade == 'hour' else 'Dia'
+    fonte = await escolher_fonte_async(db, [dimensao] + filtros.dimensoes(), ['total_vendas', 'quantidade_vendas', 'faturas_unicas'])
+    intervalo = _intervalo_faturamento(fonte, filtros.granularidade)
+
+    # Série por intervalo e total geral em uma única leitura (GROUPING SETS)
+    consulta = (
+        select(
+            func.grouping(intervalo).label('total_geral'),
+            intervalo.label('DataFatura'),
+            fonte.medida('total_vendas').label('valor_total'),
+            fonte.medida('quantidade_vendas').label('quantidade_faturas'),
+            fonte.medida('faturas_unicas').label('faturas_unicas')
         )
+        .where(*filtros.condicoes(fonte))
+        .group_by(func.grouping_sets(intervalo, tuple_()))
+        .order_by(intervalo)
+    )
+    return _montar_faturamento((await db.execute(consulta)).all())
 
-        return AnaliseProdutosResponse(
-            status="success",
-            top_produtos=[
-                ProdutoAnalise(
-                    codigo=p.CodigoProduto,
-                    descricao=p.Descricao,
-                    quantidade_vendida=p.quantidade_vendida,
-                    valor_total=float(p.valor_total),
-                    ticket_medio=float(p.valor_total/p.quantidade_vendida)
-                ) for p in top_produtos
-            ],
-            categorias=[
-                CategoriaProdutoAnalise(
-                    categoria=c.CategoriaProduto,
-                    valor_total=float(c.valor_total),
-                    quantidade_vendida=c.quantidade_vendida,
-                    ticket_medio=float(c.valor_total/c.quantidade_vendida)
-                ) for c in categorias
-            ],
-            distribuicao_preco={
-                d.CategoriaPreco: float(d.valor_total) for d in dist_preco
-            }
+def _montar_faturamento(resultados: list) -> Dict:
+    evolucao = [r for r in resultados if r.total_geral == 0]
+    totais = next(r for r in resultados if r.total_geral == 1)
+
+    # Média diária de faturamento e proporção de faturas únicas
+    total_faturas = totais.quantidade_faturas or 0
+    media_diaria = totais.valor_total / total_faturas if total_faturas > 0 else 0
+    proporcao = totais.faturas_unicas / total_faturas if total_faturas > 0 else 0
+
+    datas, valores, quantidades = colunas(evolucao, 'DataFatura', 'valor_total', 'quantidade_faturas')
+
+    return {
+        "status": "success",
+        "media_diaria": float(media_diaria),
+        "proporcao_faturas_unicas": float(proporcao),
+        "evolucao_temporal": Tabela(
+            FaturamentoDiario,
+            data=datas,
+            valor_total=list(map(float, valores)),
+            quantidade_faturas=list(map(int, quantidades)),
+            ticket_medio=[float(v/q) for v, q in zip(valores, quantidades)]
         )
+    }
+
+@router.get("/analise/faturamento", response_model=AnaliseFaturamentoResponse)
+async def get_analise_faturamento(filtros: FiltrosAnalise = Depends(filtros_analise), formato: FormatoResposta = Depends(formato_resposta), db: AsyncSession = Depends(get_async_db)):
+    try:
+        return formato.responder(await _analise_faturamento(db, filtros), AnaliseFaturamentoResponse)
     except Exception as e:
-        return AnaliseProdutosResponse(status="error", top_produtos=[], categorias=[], distribuicao_preco={})
+        return AnaliseFaturamentoResponse(status="error", media_diaria=0, proporcao_faturas_unicas=0, evolucao_temporal=[])
 
-@router.get("/analise/clientes", response_model=AnaliseClientesResponse)
-def get_analise_clientes(db: Session = Depends(get_db)):
+@router.post("/admin/rollups/atualizar")
+def atualizar_rollups_endpoint(db: Session = Depends(get_db)):
     try:
-        # Top 10 clientes
-        top_clientes = (
-            db.query(
-                Transaction.IDCliente,
-                func.sum(Transaction.ValorTotalFatura).label('total_compras'),
-                func.count(Transaction.NumeroFatura).label('frequencia_compras'),
-                func.max(Transaction.Pais).label('pais')
-            )
-            .group_by(Transaction.IDCliente)
-            .order_by(func.sum(Transaction.ValorTotalFatura).desc())
-            .limit(10)
-            .all()
-        )
+        rollups = atualizar_rollups(db)
+        cache_respostas.invalidar()
+        return {"status": "success", "rollups": rollups}
+    except Exception as e:
+        db.rollback()
+        return {"status": "error", "message": f"Erro ao atualizar rollups: {str(e)}"}
+
+@router.post("/admin/segmentos/atualizar")
+def atualizar_segmentos_endpoint(db: Session = Depends(get_db)):
+    try:
+        return {"status": "success", **atualizar_segmentos(db)}
+    except Exception as e:
+        db.rollback()
+        return {"status": "error", "message": f"Erro ao atualizar segmentos: {str(e)}"}
 
-        # Distribuição por país
-        dist_pais = dict(
-            db.query(
-                Transaction.Pais,
-                func.count(distinct(Transaction.IDCliente))
+@router.get("/segmentos", response_model=SegmentosResponse)
+async def get_segmentos(db: AsyncSession = Depends(get_async_db)):
+    try:
+        consulta = (
+            select(
+                SegmentoCliente.Segmento,
+                func.count().label('quantidade_clientes'),
+                func.avg(SegmentoCliente.Recencia).label('recencia_media'),
+                func.avg(SegmentoCliente.Frequencia).label('frequencia_media'),
+                func.avg(SegmentoCliente.ValorMonetario).label('valor_monetario_medio')
             )
-            .group_by(Transaction.Pais)
-            .all()
+            .group_by(SegmentoCliente.Segmento)
         )
+        resultados = {r.Segmento: r for r in (await db.execute(consulta)).all()}
+        ultima_compra = (await db.execute(select(func.max(SegmentoCliente.UltimaCompra)))).scalar()
+        total = sum(r.quantidade_clientes for r in resultados.values())
 
-        # Média de compras por cliente
-        media_compras = (
-            db.query(
-                func.count(Transaction.NumeroFatura) / 
-                func.count(distinct(Transaction.IDCliente))
-            )
-            .scalar()
+        # Na ordem dos clusters do modelo
+        segmentacao = carregar_modelo()
+        return SegmentosResponse(
+            status="success",
+            data_referencia=(ultima_compra + timedelta(days=1)).date().isoformat() if ultima_compra else None,
+            total_clientes=total,
+            segmentos=[
+                SegmentoResumo(
+                    segmento=nome,
+                    descricao=segmentacao.descricoes[nome],
+                    quantidade_clientes=r.quantidade_clientes,
+                    proporcao_clientes=r.quantidade_clientes / total,
+                    recencia_media=float(r.recencia_media),
+                    frequencia_media=float(r.frequencia_media),
+                    valor_monetario_medio=float(r.valor_monetario_medio)
+                )
+                for _, nome in sorted(segmentacao.segmentos.items())
+                if (r := resultados.get(nome)) is not None
+            ]
         )
+    except Exception as e:
+        return SegmentosResponse(status="error", total_clientes=0, segmentos=[])
 
-        return AnaliseClientesResponse(
+@router.get("/segmentos/clientes", response_model=SegmentosClientesResponse)
+async def get_segmentos_clientes(
+    id_cliente: List[str] = Query(..., description="Um ou mais clientes"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        ids = list(dict.fromkeys(id_cliente))
+        consulta = select(SegmentoCliente).where(SegmentoCliente.IDCliente.in_(ids))
+        encontrados = {c.IDCliente: c for c in (await db.execute(consulta)).scalars()}
+        return SegmentosClientesResponse(
             status="success",
-            top_clientes=[
-                ClienteAnalise(
+            data=[
+                SegmentoClienteDetalhe(
                     id_cliente=c.IDCliente,
-                    total_compras=float(c.total_compras),
-                    frequencia_compras=c.frequencia_compras,
-                    ticket_medio=float(c.total_compras/c.frequencia_compras),
-                    pais=c.pais
-                ) for c in top_clientes
+                    segmento=c.Segmento,
+                    cluster=c.Cluster,
+                    recencia=c.Recencia,
+                    frequencia=c.Frequencia,
+                    valor_monetario=float(c.ValorMonetario),
+                    ultima_compra=c.UltimaCompra
+                )
+                for c in (encontrados[i] for i in ids if i in encontrados)
             ],
-            distribuicao_por_pais=dist_pais,
-            media_compras_por_cliente=float(media_compras)
+            nao_encontrados=[i for i in ids if i not in encontrados]
         )
     except Exception as e:
-        return AnaliseClientesResponse(status="error", top_clientes=[], distribuicao_por_pais={}, media_compras_por_cliente=0)
+        return SegmentosClientesResponse(status="error", data=[], nao_encontrados=[])
 
-@router.get("/analise/faturamento", response_model=AnaliseFaturamentoResponse)
-def get_analise_faturamento(db: Session = Depends(get_db)):
+@router.post("/admin/cestas/atualizar")
+def atualizar_cestas_endpoint(db: Session = Depends(get_db)):
+    try:
+        return {"status": "success", **atualizar_cestas(db)}
+    except Exception as e:
+        db.rollback()
+        return {"status": "error", "message": f"Erro ao atualizar a análise de cestas: {str(e)}"}
+
+@router.get("/cestas/regras", response_model=RegrasCestaResponse)
+async def get_regras_cesta(
+    produto: str = Query(..., description="CodigoProduto do antecedente"),
+    limite: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        return RegrasCestaResponse(status="success", produto=produto, **(await regras_do_produto(db, produto, limite)))
+    except Exception as e:
+        return RegrasCestaResponse(status="error", produto=produto, faturas_produto=0, total_faturas=0, regras=[])
+
+@router.post("/admin/categorias/treinar")
+def treinar_categorias_endpoint(db: Session = Depends(get_db)):
     try:
-        # Média diária de faturamento
-        media_diaria = (
-            db.query(func.avg(Transaction.ValorTotalFatura))
-            .scalar()
+        return {"status": "success", **treinar(db)}
+    except Exception as e:
+        return {"status": "error", "message": f"Erro ao treinar o classificador de categorias: {str(e)}"}
+
+@router.post("/produtos/classificar", response_model=ClassificarProdutosResponse)
+def classificar_produtos(requisicao: ClassificarProdutosRequest):
+    try:
+        if len(requisicao.produtos) > MAX_PRODUTOS_CLASSIFICAR:
+            raise ValueError(f"No máximo {MAX_PRODUTOS_CLASSIFICAR} produtos por chamada")
+        codigos = [p.codigo for p in requisicao.produtos]
+        resultado = classificar(codigos, [p.descricao for p in requisicao.produtos])
+        resposta = {
+            "status": "success",
+            "versao": resultado["versao"],
+            "descricoes_unicas": resultado["descricoes_unicas"],
+            "cache_acertos": resultado["cache_acertos"],
+            "data": Tabela(ProdutoClassificado, codigo=codigos, categoria=resultado["categorias"], cluster=resultado["clusters"])
+        }
+        validar(resposta, ClassificarProdutosResponse)
+        return RespostaJSON(resposta)
+    except Exception as e:
+        return ClassificarProdutosResponse(status="error", versao=0, descricoes_unicas=0, cache_acertos=0, data=[])
+
+@router.post("/transacoes/ingerir", response_model=IngestaoTransacoesResponse)
+async def ingerir_transacoes(request: Request):
+    """
+    Grava um lote de transações (JSON, NDJSON ou Arrow, pelo Content-Type). Cada fatura
+    enviada substitui a gravada e reenviar o mesmo lote não altera nada; as linhas
+    rejeitadas voltam com os motivos
+    """
+    try:
+        tipo = ingestao.formato(request.headers.get("content-type"))
+        resultado = await asyncio.to_thread(ingestao.ingerir_corpo, await request.body(), tipo, MAX_TRANSACOES_INGERIR)
+        if resultado["alteracao_id"] is not None:
+            cache_respostas.invalidar()
+        resposta = {"status": "success", **resultado, "rejeicoes": Tabela(RejeicaoTransacao, **resultado["rejeicoes"])}
+        validar(resposta, IngestaoTransacoesResponse)
+        return RespostaJSON(resposta)
+    except Exception as e:
+        return IngestaoTransacoesResponse(
+            status="error", linhas_recebidas=0, linhas_aceitas=0, linhas_rejeitadas=0, faturas_novas=0,
+            faturas_alteradas=0, faturas_inalteradas=0, linhas_inseridas=0, linhas_removidas=0, rejeicoes=[]
         )
 
-        # Proporção de faturas únicas
-        total_faturas = db.query(func.count(Transaction.NumeroFatura)).scalar()
-        faturas_unicas = (
-            db.query(func.count(Transaction.NumeroFatura))
-            .filter(Transaction.FaturaUnica == True)
-            .scalar()
+@router.get("/admin/pool")
+def estado_pool_conexoes():
+    return {
+        "status": "success",
+        "pools": estado_pools(),
+        "metricas": metricas.resumo("db_pool")
+    }
+
+@router.get("/admin/modelos")
+def estado_modelos():
+    try:
+        return {"status": "success", "artefatos": registro_modelos.estatisticas()}
+    except Exception as e:
+        return {"status": "error", "message": f"Erro ao ler o registro de modelos: {str(e)}", "artefatos": []}
+
+@router.get("/admin/consultas-lentas")
+def get_consultas_lentas(
+    limite: int = Query(50, ge=1, le=1000),
+    duracao_minima_ms: float = Query(0, ge=0),
+    com_plano: bool = Query(True, description="Inclui o plano do EXPLAIN (ANALYZE, BUFFERS) quando capturado")
+):
+    try:
+        return {
+            "status": "success",
+            "limiar_ms": settings.SLOW_QUERY_LIMIAR_MS,
+            "amostra_explain": settings.SLOW_QUERY_AMOSTRA_EXPLAIN,
+            "consultas": consultas_lentas(limite, duracao_minima_ms, com_plano)
+        }
+    except Exception as e:
+        return {"status": "error", "message": f"Erro ao ler consultas lentas: {str(e)}", "consultas": []}
+
+@router.get("/admin/ingestao/alteracoes")
+def get_alteracoes_ingestao(
+    desde_id: int = Query(0, ge=0, description="Só os conjuntos de alterações com id maior"),
+    limite: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Conjuntos de alterações da ingestão incremental (app.etl.incremental), do mais antigo ao mais novo"""
+    try:
+        consulta = (
+            select(AlteracaoTransacoes)
+            .where(AlteracaoTransacoes.id > desde_id)
+            .order_by(AlteracaoTransacoes.id)
+            .limit(limite)
         )
-        proporcao = faturas_unicas / total_faturas if total_faturas > 0 else 0
-
-        # Evolução temporal
-        evolucao = (
-            db.query(
-                Transaction.DataFatura,
-                func.sum(Transaction.ValorTotalFatura).label('valor_total'),
-                func.count(Transaction.NumeroFatura).label('quantidade_faturas')
-            )
-            .group_by(Transaction.DataFatura)
-            .order_by(Transaction.DataFatura)
-            .all()
+        return {
+            "status": "success",
+            "alteracoes": [
+                {c.name: getattr(a, c.name) for c in AlteracaoTransacoes.__table__.columns}
+                for a in db.scalars(consulta)
+            ]
+        }
+    except Exception as e:
+        db.rollback()
+        return {"status": "error", "message": f"Erro ao ler alterações da ingestão: {str(e)}", "alteracoes": []}
+
+# Análises disponíveis no bundle: nome -> (função, resposta em caso de erro)
+ANALISES = {
+    'vendas-por-pais': (_analise_vendas_por_pais, lambda: AnaliseVendasPaisResponse(status="error", data=[], total_paises=0)),
+    'temporal': (_analise_temporal, lambda: AnaliseTemporalResponse(status="error", vendas_por_mes=[], vendas_por_dia_semana=[], vendas_por_semana=[])),
+    'produtos': (_analise_produtos, lambda: AnaliseProdutosResponse(status="error", top_produtos=[], categorias=[], distribuicao_preco={})),
+    'clientes': (_analise_clientes, lambda: AnaliseClientesResponse(status="error", top_clientes=[], distribuicao_por_pais={}, media_compras_por_cliente=0)),
+    'faturamento': (_analise_faturamento, lambda: AnaliseFaturamentoResponse(status="error", media_diaria=0, proporcao_faturas_unicas=0, evolucao_temporal=[])),
+}
+
+async def _analise_clientes_e_paises(db: AsyncSession, filtros: FiltrosAnalise):
+    """Clientes e vendas por país a partir de uma única leitura"""
+    resultados = await _consultar_clientes(db, filtros)
+    return _montar_clientes(resultados), _montar_vendas_por_pais(resultados)
+
+@router.get("/analise/bundle", response_model=AnaliseBundleResponse, response_model_exclude_none=True)
+async def get_analise_bundle(
+    analises: List[Literal['vendas-por-pais', 'temporal', 'produtos', 'clientes', 'faturamento']] = Query(list(ANALISES)),
+    filtros: FiltrosAnalise = Depends(filtros_analise)
+):
+    pedidas = list(dict.fromkeys(analises))
+
+    # vendas-por-pais sai do mesmo GROUPING SETS de clientes quando as duas são pedidas
+    tarefas = {}
+    if 'clientes' in pedidas and 'vendas-por-pais' in pedidas:
+        tarefas[('clientes', 'vendas-por-pais')] = _analise_clientes_e_paises
+    for nome in pedidas:
+        if not any(nome in chave for chave in tarefas):
+            tarefas[(nome,)] = ANALISES[nome][0]
+
+    def executar(nomes, funcao):
+        async def analise(db):
+            try:
+                resultado = await funcao(db, filtros)
+                return dict(zip(nomes, resultado if len(nomes) > 1 else (resultado,)))
+            except Exception as e:
+                # A sessão pode ser compartilhada com as próximas análises
+                await db.rollback()
+                return {nome: ANALISES[nome][1]().model_dump() for nome in nomes}
+        return analise
+
+    # As análises rodam ao mesmo tempo, em sessões próprias enquanto houver vaga
+    respostas = {}
+    async with AsyncSessionLocal() as db:
+        parciais = await em_paralelo(db, *(executar(n, f) for n, f in tarefas.items()))
+    for parcial in parciais:
+        respostas.update({nome.replace('-', '_'): resposta for nome, resposta in parcial.items()})
+
+    # Análises não pedidas ficam de fora (como no response_model_exclude_none)
+    resposta = {"status": "success" if all(r["status"] == "success" for r in respostas.values()) else "error"}
+    resposta.update({campo: respostas[campo] for campo in AnaliseBundleResponse.model_fields if campo in respostas})
+    validar(resposta, AnaliseBundleResponse)
+    return RespostaJSON(resposta)
+
+async def _transmitir_exportacao(formato: str, filtros: FiltrosAnalise, tamanho_lote: int):
+    # A sessão é aberta dentro do gerador para durar enquanto o corpo é enviado
+    async with AsyncSessionLocal() as db:
+        async for parte in exportacao.EXPORTADORES[formato](db, filtros, tamanho_lote):
+            yield parte
+
+@router.get("/transacoes/exportar")
+async def exportar_transacoes(
+    formato: Literal['csv', 'ndjson', 'parquet'] = Query('csv'),
+    tamanho_lote: int = Query(10000, ge=100, le=100000, description="Linhas lidas do cursor por vez"),
+    filtros: FiltrosAnalise = Depends(filtros_analise)
+):
+    if formato == 'parquet' and importlib.util.find_spec("pyarrow") is None:
+        return JSONResponse({"status": "error", "message": "Exportação em Parquet requer o pacote pyarrow"})
+
+    tipo, extensao = exportacao.FORMATOS[formato]
+    cabecalhos = {"Content-Disposition": f'attachment; filename="transacoes.{extensao}"'}
+    if formato == 'parquet':
+        # Parquet já vem comprimido: evita que o GZipMiddleware comprima de novo
+        cabecalhos["Content-Encoding"] = "identity"
+    return StreamingResponse(
+        _transmitir_exportacao(formato, filtros, tamanho_lote),
+        media_type=tipo,
+        headers=cabecalhos
+    )
+
+def _codificar_cursor(data_fatura: datetime, id_linha: int) -> str:
+    bruto = json.dumps([data_fatura.isoformat(), id_linha]).encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip("=")
+
+def _decodificar_cursor(cursor: str):
+    bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    data_fatura, id_linha = json.loads(bruto)
+    return datetime.fromisoformat(data_fatura), int(id_linha)
+
+# Colunas do detalhamento de transações (mais o id, que só vai para o cursor)
+COLUNAS_DETALHE = [
+    Transaction.id, Transaction.NumeroFatura, Transaction.DataFatura, Transaction.CodigoProduto,
+    Transaction.Descricao, Transaction.Quantidade, Transaction.PrecoUnitario, Transaction.ValorTotalFatura,
+    Transaction.IDCliente, Transaction.Pais, Transaction.CategoriaProduto, Transaction.CategoriaPreco,
+]
+
+@router.get("/transacoes", response_model=TransacoesPaginaResponse)
+async def get_transacoes(
+    codigo_produto: Optional[str] = Query(None, description="Código do produto"),
+    id_cliente: Optional[str] = Query(None, description="ID do cliente"),
+    cursor: Optional[str] = Query(None, description="proximo_cursor da página anterior"),
+    limite: int = Query(100, ge=1, le=1000),
+    ordem: Literal['asc', 'desc'] = Query('asc', description="Ordem por data da fatura"),
+    filtros: FiltrosAnalise = Depends(filtros_analise),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Linhas de transactions_sample ordenadas por (DataFatura, id), paginadas por chave: o cursor
+    guarda a última chave entregue e a próxima página começa logo depois dela pelo índice, então
+    o custo de cada página não depende de quantas vieram antes (sem OFFSET). A chave é única por
+    linha, então as linhas de uma fatura dividida entre duas páginas não se perdem
+    """
+    try:
+        chave = tuple_(Transaction.DataFatura, Transaction.id)
+        consulta = (
+            select(*COLUNAS_DETALHE)
+            .where(Transaction.DataFatura.isnot(None), *filtros.condicoes(BASE))
+            .order_by(*(
+                (Transaction.DataFatura, Transaction.id) if ordem == 'asc'
+                else (Transaction.DataFatura.desc(), Transaction.id.desc())
+            ))
+            .limit(limite + 1)
         )
+        if codigo_produto:
+            consulta = consulta.where(Transaction.CodigoProduto == codigo_produto)
+        if id_cliente:
+            consulta = consulta.where(Transaction.IDCliente == id_cliente)
+        if cursor:
+            ultima = _decodificar_cursor(cursor)
+            consulta = consulta.where(chave > tuple_(*ultima) if ordem == 'asc' else chave < tuple_(*ultima))
 
-        return AnaliseFaturamentoResponse(
-            status="success",
-            media_diaria=float(media_diaria),
-            proporcao_faturas_unicas=float(proporcao),
-            evolucao_temporal=[
-                FaturamentoDiario(
-                    data=e.DataFatura,
-                    valor_total=float(e.valor_total),
-                    quantidade_faturas=e.quantidade_faturas,
-                    ticket_medio=float(e.valor_total/e.quantidade_faturas)
-                ) for e in evolucao
-            ]
+        linhas = (await db.execute(consulta)).all()
+        pagina = linhas[:limite]
+        proximo_cursor = None
+        if len(linhas) > limite:
+            proximo_cursor = _codificar_cursor(pagina[-1].DataFatura, pagina[-1].id)
+
+        (numeros, datas, codigos, descricoes, quantidades, precos, valores,
+         clientes, paises, categorias, faixas) = colunas(
+            pagina, 'NumeroFatura', 'DataFatura', 'CodigoProduto', 'Descricao', 'Quantidade', 'PrecoUnitario',
+            'ValorTotalFatura', 'IDCliente', 'Pais', 'CategoriaProduto', 'CategoriaPreco'
         )
+        resposta = {
+            "status": "success",
+            "data": Tabela(
+                TransacaoDetalhe,
+                numero_fatura=numeros,
+                data_fatura=datas,
+                codigo_produto=codigos,
+                descricao=descricoes,
+                quantidade=quantidades,
+                preco_unitario=[float(p) if p is not None else None for p in precos],
+                valor_total=[float(v) if v is not None else None for v in valores],
+                id_cliente=clientes,
+                pais=paises,
+                categoria_produto=categorias,
+                categoria_preco=faixas
+            ),
+            "proximo_cursor": proximo_cursor
+        }
+        validar(resposta, TransacoesPaginaResponse)
+        return RespostaJSON(resposta)
     except Exception as e:
-        return AnaliseFaturamentoResponse(status="error", media_diaria=0, proporcao_faturas_unicas=0, evolucao_temporal=[])
+        return TransacoesPaginaResponse(status="error", data=[])
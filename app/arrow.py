@@ -0,0 +1,82 @@
+"""
+Respostas das rotas de análise em Arrow IPC (formato stream), negociadas pelo cabeçalho Accept.
+
+Cada resposta Arrow leva uma das listas da resposta (escolhida pelo parâmetro tabela; a
+primeira lista quando omitido) como tabela colunar, montada direto das colunas da Tabela.
+Os demais campos da resposta (status, totais e distribuições) vão em JSON nos metadados
+do schema, na chave "resposta".
+JSON continua sendo o formato padrão.
+"""
+import json
+from datetime import datetime
+from typing import Dict, Optional, Type
+
+from fastapi import Query, Request
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from app.serializacao import RespostaJSON, Tabela, validar
+
+MIDIA_ARROW = "application/vnd.apache.arrow.stream"
+
+
+def aceita_arrow(request: Request) -> bool:
+    return MIDIA_ARROW in request.headers.get("accept", "")
+
+
+def _schema(pa, item: Type[BaseModel]):
+    tipos = {str: pa.string(), int: pa.int64(), float: pa.float64(), bool: pa.bool_(), datetime: pa.timestamp("us")}
+    return pa.schema([pa.field(nome, tipos[campo.annotation]) for nome, campo in item.model_fields.items()])
+
+
+def resposta_arrow(resposta: Dict, tabela: Optional[str] = None) -> Response:
+    import pyarrow as pa
+
+    tabelas = {nome: valor for nome, valor in resposta.items() if isinstance(valor, Tabela)}
+    if tabela is None:
+        tabela = next(iter(tabelas))
+    elif tabela not in tabelas:
+        raise ValueError(f"Tabela '{tabela}' inexistente; disponíveis: {', '.join(tabelas)}")
+
+    metadados = {nome: valor for nome, valor in resposta.items() if nome not in tabelas}
+    escolhida = tabelas[tabela]
+    schema = _schema(pa, escolhida.modelo).with_metadata({
+        "tabela": tabela,
+        "resposta": json.dumps(metadados, ensure_ascii=False),
+    })
+    dados = pa.Table.from_pydict({nome: escolhida.colunas[nome] for nome in schema.names}, schema=schema)
+
+    saida = pa.BufferOutputStream()
+    with pa.ipc.new_stream(saida, schema) as escritor:
+        escritor.write_table(dados)
+    return Response(content=saida.getvalue().to_pybytes(), media_type=MIDIA_ARROW)
+
+
+class FormatoResposta:
+    """Formato pedido pelo cliente para a resposta de uma rota de análise"""
+
+    def __init__(self, arrow: bool, tabela: Optional[str]):
+        self.arrow = arrow
+        self.tabela = tabela
+
+    def responder(self, resposta, modelo: Type[BaseModel]):
+        """
+        Args:
+            resposta: Dict montado pela rota (com as listas como Tabela) ou, em caso de erro,
+                      o próprio modelo Pydantic, que segue em JSON pelo response_model
+            modelo: Schema da resposta, usado na validação do modo de depuração
+        """
+        if isinstance(resposta, BaseModel):
+            return resposta
+        validar(resposta, modelo)
+        if self.arrow:
+            return resposta_arrow(resposta, self.tabela)
+        return RespostaJSON(resposta)
+
+
+def formato_resposta(
+    request: Request,
+    tabela: Optional[str] = Query(None, description=f"Lista enviada quando Accept pede {MIDIA_ARROW}"),
+) -> FormatoResposta:
+    """Dependency que lê o formato da resposta (JSON ou Arrow) do cabeçalho Accept"""
+    return FormatoResposta(aceita_arrow(request), tabela)
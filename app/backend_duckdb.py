@@ -0,0 +1,107 @@
+"""
+Backend embarcado: DuckDB lendo arquivos Parquet, sem servidor de banco.
+
+transactions_sample vira uma view sobre os Parquet de DUCKDB_PARQUET. As rotas continuam
+montando as mesmas consultas SQLAlchemy, só que executadas pelo DuckDB, cuja execução
+colunar responde as agregações lendo apenas as colunas usadas. As colunas Numeric são
+convertidas para DECIMAL na view para que as somas sejam exatas como no Postgres.
+
+Os Parquet podem ser gerados pela própria API ligada ao Postgres:
+    curl -o dados/transactions_sample/transacoes.parquet \\
+        "$API_URL/api/v1/transacoes/exportar?formato=parquet"
+
+Rollups, migrações e o limite por comando são exclusivos do Postgres: aqui as rotas
+sempre leem a view e approx=true conta os clientes de forma exata, já que não há os
+esboços HyperLogLog (só nesse caso as respostas diferem das do Postgres). A paginação
+de /transacoes usa a coluna id, que só existe nos Parquet exportados pela API (a saída
+de python -m app.etl não tem id).
+"""
+import asyncio
+
+from sqlalchemy import Numeric, create_engine, event
+from sqlalchemy.pool import QueuePool
+
+from app import monitoramento
+
+# Casas decimais mantidas ao converter as colunas Numeric (gravadas como double no Parquet)
+ESCALA_DECIMAL = 10
+
+
+def _sql_view(parquet: str) -> str:
+    # Importado aqui: app.models depende de app.database, que importa este módulo
+    from app.models import Transaction
+
+    conversoes = ", ".join(
+        f'CAST("{c.name}" AS DECIMAL(38, {ESCALA_DECIMAL})) AS "{c.name}"'
+        for c in Transaction.__table__.columns if isinstance(c.type, Numeric)
+    )
+    origem = "read_parquet('" + parquet.replace("'", "''") + "', union_by_name = true)"
+    return f"CREATE OR REPLACE VIEW {Transaction.__tablename__} AS SELECT * REPLACE ({conversoes}) FROM {origem}"
+
+
+def criar_engine(parquet: str, pool_size: int):
+    """Engine DuckDB em memória; cada conexão do pool cria a view sobre os Parquet"""
+    engine = create_engine("duckdb:///:memory:", poolclass=QueuePool, pool_size=pool_size, max_overflow=0)
+
+    @event.listens_for(engine, "connect")
+    def _criar_view(conexao, registro):
+        cursor = conexao.cursor()
+        cursor.execute(_sql_view(parquet))
+        cursor.close()
+
+    return engine
+
+
+class _ResultadoStream:
+    """Equivalente ao AsyncResult.partitions() sobre um resultado síncrono"""
+
+    def __init__(self, resultado):
+        self._resultado = resultado
+
+    async def partitions(self, tamanho: int):
+        while True:
+            lote = await asyncio.to_thread(self._resultado.fetchmany, tamanho)
+            if not lote:
+                break
+            yield lote
+
+
+class SessaoDuckDB:
+    """
+    Oferece às rotas a mesma interface assíncrona da AsyncSession (execute, stream,
+    rollback, close) sobre uma Session síncrona, executada em threads para não
+    bloquear o event loop
+    """
+
+    def __init__(self, fabrica):
+        self._sessao = fabrica()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def execute(self, consulta, *args, **kwargs):
+        # O resultado é lido por completo na thread e devolvido já em memória
+        def executar():
+            resultado = self._sessao.execute(consulta, *args, **kwargs)
+            with monitoramento.fase("leitura"):
+                return resultado.freeze()
+
+        congelado = await asyncio.to_thread(executar)
+        monitoramento.contar_linhas(len(congelado.data))
+        return congelado()
+
+    async def stream(self, consulta, *args, **kwargs):
+        resultado = await asyncio.to_thread(self._sessao.execute, consulta, *args, **kwargs)
+        return _ResultadoStream(resultado)
+
+    async def commit(self):
+        await asyncio.to_thread(self._sessao.commit)
+
+    async def rollback(self):
+        await asyncio.to_thread(self._sessao.rollback)
+
+    async def close(self):
+        await asyncio.to_thread(self._sessao.close)
@@ -0,0 +1,150 @@
+"""
+Cache de respostas das rotas de análise.
+
+As respostas JSON das rotas GET em /api/v1/analise ficam em memória, com chave formada pela
+rota, pelos parâmetros de consulta e por um token de versão dos dados. O token combina uma
+geração local (incrementada em invalidar()) com o maior created_at de transactions_sample,
+relido a cada CACHE_VERSAO_TTL segundos para que novas cargas feitas por outros processos
+também invalidem as entradas. Cada resposta leva um ETag forte (hash do corpo), e pedidos
+com If-None-Match igual recebem 304 sem corpo. JSON e Arrow são guardados em entradas separadas.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from sqlalchemy import func, select
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.arrow import MIDIA_ARROW, aceita_arrow
+from app.config.settings import get_settings
+from app.database import AsyncSessionLocal
+from app.models import Transaction
+
+settings = get_settings()
+
+PREFIXO_CACHEAVEL = "/api/v1/analise"
+
+
+def gerar_etag(corpo: bytes) -> str:
+    return '"' + hashlib.sha256(corpo).hexdigest()[:32] + '"'
+
+
+class CacheRespostas:
+    """LRU limitado por número de entradas e por bytes, com expiração por TTL"""
+
+    def __init__(self, ttl: int, max_entradas: int, max_bytes: int):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.geracao = 0
+
+    def obter(self, chave: str) -> Optional[Tuple[bytes, str, str]]:
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return None
+            corpo, etag, media_type, expira_em = entrada
+            if time.monotonic() >= expira_em:
+                self._remover(chave)
+                return None
+            self._entradas.move_to_end(chave)
+            return corpo, etag, media_type
+
+    def guardar(self, chave: str, corpo: bytes, etag: str, media_type: str):
+        if len(corpo) > self.max_bytes:
+            return
+        with self._lock:
+            if chave in self._entradas:
+                self._remover(chave)
+            self._entradas[chave] = (corpo, etag, media_type, time.monotonic() + self.ttl)
+            self._bytes += len(corpo)
+            while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+                self._remover(next(iter(self._entradas)))
+
+    def _remover(self, chave: str):
+        corpo = self._entradas.pop(chave)[0]
+        self._bytes -= len(corpo)
+
+    def invalidar(self):
+        """Descarta todas as entradas; chamado quando novas transações são carregadas"""
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+            self.geracao += 1
+
+
+cache_respostas = CacheRespostas(settings.CACHE_TTL, settings.CACHE_MAX_ENTRADAS, settings.CACHE_MAX_BYTES)
+
+_versao_dados = {"expira_em": 0.0, "marca": ""}
+
+
+async def _ler_marca_dados() -> str:
+    async with AsyncSessionLocal() as db:
+        marca = (await db.execute(select(func.max(Transaction.created_at)))).scalar()
+    return marca.isoformat() if marca else ""
+
+
+async def versao_dados() -> str:
+    """Token de versão dos dados usado na chave do cache"""
+    agora = time.monotonic()
+    if agora >= _versao_dados["expira_em"]:
+        marca = await _ler_marca_dados()
+        if marca != _versao_dados["marca"]:
+            cache_respostas.invalidar()
+        _versao_dados.update(expira_em=agora + settings.CACHE_VERSAO_TTL, marca=marca)
+    return f"{cache_respostas.geracao}:{_versao_dados['marca']}"
+
+
+def _etag_confere(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in [e.strip() for e in if_none_match.split(",")]
+
+
+def _resposta(request: Request, corpo: bytes, etag: str, media_type: str, estado_cache: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept", "X-Cache": estado_cache}
+    if _etag_confere(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=corpo, media_type=media_type, headers=headers)
+
+
+class CacheRespostasMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        if request.method != "GET" or not request.url.path.startswith(PREFIXO_CACHEAVEL):
+            return await call_next(request)
+
+        try:
+            versao = await versao_dados()
+        except Exception:
+            # Sem acesso ao banco não há como versionar: a rota responde sem cache
+            return await call_next(request)
+
+        parametros = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+        representacao = "arrow" if aceita_arrow(request) else "json"
+        chave = f"{versao}|{representacao}|{request.url.path}?{parametros}"
+
+        encontrado = cache_respostas.obter(chave)
+        if encontrado is not None:
+            return _resposta(request, *encontrado, estado_cache="HIT")
+
+        response = await call_next(request)
+        if response.status_code != 200:
+            return response
+
+        corpo = b"".join([parte async for parte in response.body_iterator])
+        media_type = response.headers.get("content-type", "application/json")
+        etag = gerar_etag(corpo)
+
+        # As rotas devolvem HTTP 200 com status="error" (sempre em JSON) em falhas; essas respostas não são guardadas
+        if media_type.startswith(MIDIA_ARROW) or corpo.startswith(b'{"status":"success"'):
+            cache_respostas.guardar(chave, corpo, etag, media_type)
+
+        return _resposta(request, corpo, etag, media_type, estado_cache="MISS")
@@ -0,0 +1,228 @@
+"""
+Classificação de produtos novos em CategoriaProduto.
+
+A categoria foi criada no notebook de EDA agrupando as descrições limpas com TF-IDF
+(5.000 termos), TruncatedSVD (50 componentes) e MiniBatchKMeans (k=5), com um mapa
+cluster -> categoria escrito à mão. Aqui o mesmo pipeline é treinado com as descrições
+de transactions_sample e salvo versionado em CATEGORIAS_DIR
+(categorias_produtos_v0001.joblib, v0002, ...); o mapa cluster -> categoria sai da
+categoria mais frequente entre as descrições de cada cluster. A versão mais recente é
+carregada pelo registro de app.modelos.
+
+A limpeza segue o notebook (minúsculas, só letras, stopwords em inglês removidas pelo
+vetorizador) com operações vetorizadas do pandas; a lematização do NLTK fica de fora,
+já que o NLTK não é dependência da API. Cada chamada deduplica as descrições antes da
+inferência, e os clusters ficam em cache por hash da descrição limpa e versão do pipeline.
+
+Uso:
+    python -m app.categorias treinar   treina e salva uma nova versão
+    python -m app.categorias versoes   lista as versões salvas
+"""
+import glob
+import hashlib
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.config.settings import get_settings
+from app.modelos import registro_modelos
+from app.models import Transaction
+
+settings = get_settings()
+
+ARTEFATO = "categorias_produtos"
+_PADRAO_ARQUIVO = re.compile(r"categorias_produtos_v(\d+)\.joblib$")
+
+
+def _versoes() -> Dict[int, str]:
+    versoes = {}
+    for caminho in glob.glob(os.path.join(settings.CATEGORIAS_DIR, "categorias_produtos_v*.joblib")):
+        encontrado = _PADRAO_ARQUIVO.search(caminho)
+        if encontrado:
+            versoes[int(encontrado.group(1))] = caminho
+    return dict(sorted(versoes.items()))
+
+
+def _caminho_versao(versao: int) -> str:
+    return os.path.join(settings.CATEGORIAS_DIR, f"categorias_produtos_v{versao:04d}.joblib")
+
+
+def _registrar_versao_atual():
+    versoes = _versoes()
+    caminho = versoes[max(versoes)] if versoes else _caminho_versao(1)
+    registro_modelos.registrar(ARTEFATO, caminho, settings.MODELOS_MMAP)
+
+
+_registrar_versao_atual()
+
+
+def limpar_descricoes(descricoes: pd.Series) -> pd.Series:
+    """Minúsculas, só letras e espaços simples, aplicado à série inteira"""
+    return (
+        descricoes.fillna("")
+        .str.lower()
+        .str.replace(r"[^a-z\s]", "", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+    )
+
+
+class CacheCategorias:
+    """Clusters já inferidos por (versão, hash da descrição limpa), com descarte do menos usado"""
+
+    def __init__(self, max_entradas: int):
+        self.max_entradas = max_entradas
+        self._entradas: "OrderedDict[tuple, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter_varios(self, chaves: List[tuple]) -> List[Optional[int]]:
+        with self._lock:
+            valores = []
+            for chave in chaves:
+                valor = self._entradas.get(chave)
+                if valor is not None:
+                    self._entradas.move_to_end(chave)
+                valores.append(valor)
+            return valores
+
+    def guardar_varios(self, chaves: List[tuple], valores: List[int]):
+        with self._lock:
+            for chave, valor in zip(chaves, valores):
+                self._entradas[chave] = valor
+                self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+
+cache_categorias = CacheCategorias(settings.CATEGORIAS_CACHE_MAX)
+
+
+def _hash(texto: str) -> bytes:
+    return hashlib.blake2b(texto.encode(), digest_size=16).digest()
+
+
+def classificar(codigos: List[str], descricoes: List[Optional[str]]) -> Dict:
+    """
+    Categoria de cada produto pela versão atual do pipeline
+    Args:
+        codigos: CodigoProduto de cada produto
+        descricoes: Descricao de cada produto; sem descrição vale o código, como no notebook
+    Returns: Dict com a versão, os clusters e categorias na ordem de entrada e os contadores
+             de descrições únicas e acertos de cache
+    """
+    modelo = registro_modelos.obter(ARTEFATO)
+    versao = modelo["versao"]
+
+    brutas = pd.Series(descricoes, dtype=object).fillna(pd.Series(codigos, dtype=object))
+    # Descrições repetidas são limpas uma vez só; descrições que ficam iguais depois de limpas, inferidas uma vez
+    indice_brutas, brutas_unicas = pd.factorize(brutas)
+    limpas = limpar_descricoes(pd.Series(brutas_unicas, dtype=object))
+    indice_limpas, limpas_unicas = pd.factorize(limpas)
+    indice = indice_limpas[indice_brutas]
+
+    chaves = [(versao, _hash(t)) for t in limpas_unicas]
+    clusters = cache_categorias.obter_varios(chaves)
+    faltantes = [i for i, c in enumerate(clusters) if c is None]
+    if faltantes:
+        inferidos = modelo["pipeline"].predict([limpas_unicas[i] for i in faltantes]).tolist()
+        cache_categorias.guardar_varios([chaves[i] for i in faltantes], inferidos)
+        for i, c in zip(faltantes, inferidos):
+            clusters[i] = c
+
+    clusters = np.array(clusters, dtype=int)[indice]
+    mapa = modelo["categorias"]
+    return {
+        "versao": versao,
+        "clusters": clusters.tolist(),
+        "categorias": [mapa.get(c) for c in clusters.tolist()],
+        "descricoes_unicas": len(limpas_unicas),
+        "cache_acertos": len(limpas_unicas) - len(faltantes),
+    }
+
+
+def treinar(db: Session) -> Dict:
+    """
+    Treina o pipeline com as descrições de transactions_sample e salva como nova versão
+    Returns: Dict com a versão, o arquivo, o número de descrições e o mapa cluster -> categoria
+    """
+    import joblib
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.decomposition import TruncatedSVD
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.pipeline import Pipeline
+
+    linhas = db.execute(
+        select(Transaction.Descricao, Transaction.CategoriaProduto, func.count().label("linhas"))
+        .where(Transaction.Descricao.is_not(None))
+        .group_by(Transaction.Descricao, Transaction.CategoriaProduto)
+    ).all()
+    dados = pd.DataFrame(linhas, columns=["Descricao", "CategoriaProduto", "linhas"])
+    dados["DescricaoLimpa"] = limpar_descricoes(dados["Descricao"])
+
+    # Uma amostra por descrição limpa, com peso pelo número de linhas (o notebook usava cada linha)
+    descricoes = dados.groupby("DescricaoLimpa")["linhas"].sum()
+    if len(descricoes) < 5:
+        raise ValueError("Descrições distintas insuficientes para treinar o pipeline")
+
+    vetorizador = TfidfVectorizer(stop_words="english", max_features=5000)
+    termos = len(vetorizador.fit(descricoes.index).vocabulary_)
+    pipeline = Pipeline([
+        ("tfidf", vetorizador),
+        ("svd", TruncatedSVD(n_components=min(50, termos - 1), random_state=42)),
+        ("kmeans", MiniBatchKMeans(n_clusters=5, random_state=42, batch_size=1000)),
+    ])
+    pipeline.fit(descricoes.index, kmeans__sample_weight=descricoes.to_numpy(dtype=float))
+
+    # Categoria mais frequente (em linhas) entre as descrições de cada cluster
+    dados["Cluster"] = dados["DescricaoLimpa"].map(
+        dict(zip(descricoes.index, pipeline.predict(descricoes.index)))
+    )
+    rotuladas = dados.dropna(subset=["CategoriaProduto"])
+    totais = rotuladas.groupby(["Cluster", "CategoriaProduto"])["linhas"].sum()
+    categorias = {int(c): cat for (c, cat) in totais.groupby(level=0).idxmax()}
+
+    versoes = _versoes()
+    versao = max(versoes, default=0) + 1
+    caminho = _caminho_versao(versao)
+    os.makedirs(settings.CATEGORIAS_DIR, exist_ok=True)
+    # Sem compressão, para que os arrays possam ser mapeados em memória pelo registro
+    joblib.dump({
+        "versao": versao,
+        "treinado_em": datetime.now(timezone.utc).isoformat(),
+        "descricoes": len(descricoes),
+        "categorias": categorias,
+        "pipeline": pipeline,
+    }, caminho)
+
+    _registrar_versao_atual()
+    return {"versao": versao, "caminho": caminho, "descricoes": len(descricoes), "categorias": categorias}
+
+
+if __name__ == "__main__":
+    comando = sys.argv[1] if len(sys.argv) > 1 else "versoes"
+    if comando == "treinar":
+        from app.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            resultado = treinar(db)
+        finally:
+            db.close()
+        print(f"versão {resultado['versao']}: {resultado['caminho']} ({resultado['descricoes']} descrições)")
+        for cluster, categoria in sorted(resultado["categorias"].items()):
+            print(f"  cluster {cluster}: {categoria}")
+    else:
+        for versao, caminho in _versoes().items():
+            print(f"v{versao:04d} {caminho}")
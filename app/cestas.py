@@ -0,0 +1,286 @@
+"""
+Análise de cestas ("comprados juntos"): regras de associação entre produtos da mesma fatura.
+
+Cada fatura é uma linha de uma matriz esparsa fatura × produto (1 quando a fatura leva
+ao menos uma unidade do produto, como no notebook de experimentos). O produto XᵀX dessa
+matriz dá, na diagonal, em quantas faturas cada produto aparece e, fora dela, em quantas
+cada par aparece junto: são as contagens dos conjuntos frequentes de um e dois itens,
+guardadas em cesta_produtos e cesta_pares.
+
+As contagens são aditivas, então a atualização é incremental como nos rollups: só as
+faturas com linhas acima da marca d'água de created_at entram na matriz, que é montada
+duas vezes (com as linhas já contadas e com todas) para somar a diferença entre as duas.
+As faturas alteradas pela ingestão incremental entram do mesmo jeito, com as linhas
+removidas (transacoes_removidas) do lado das já contadas.
+O total de faturas contadas fica em rollup_estado.linhas.
+
+As regras A -> B (suporte, confiança e lift) saem dos pares com suporte mínimo e são
+pré-calculadas num índice em memória por CodigoProduto, então a consulta é uma busca em
+dict. O índice é remontado quando rollup_estado indica uma atualização nova.
+
+Uso: python -m app.cestas
+"""
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import case, delete, func, literal, null, or_, select, union, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config.settings import get_settings
+from app.database import Base
+from app.models import CestaPar, CestaProduto, RollupEstado, TransacaoRemovida, Transaction
+from app.rollups import CACHE_ESTADO_TTL, REMOVIDAS, bloquear_ingestao, removidas_na_janela
+
+settings = get_settings()
+
+ESTADO = "cestas"
+TAMANHO_LOTE_GRAVACAO = 10000
+
+
+def _select_itens(limite, marca):
+    """
+    Quantidade de cada produto em cada fatura afetada: já contada (até a marca) e total (até o limite).
+    As linhas removidas pela ingestão incremental depois da marca entram só na quantidade já contada
+    """
+    ate_limite = or_(Transaction.created_at.is_(None), Transaction.created_at <= limite)
+    if marca is None:
+        consulta = (
+            select(
+                Transaction.NumeroFatura,
+                Transaction.CodigoProduto,
+                literal(0).label("quantidade_antes"),
+                func.coalesce(func.sum(Transaction.Quantidade), 0).label("quantidade"),
+            )
+            .where(Transaction.NumeroFatura.is_not(None), Transaction.CodigoProduto.is_not(None))
+            .group_by(Transaction.NumeroFatura, Transaction.CodigoProduto)
+        )
+        return consulta.where(ate_limite) if limite is not None else consulta
+
+    afetadas = union(
+        select(Transaction.NumeroFatura).where(Transaction.created_at > marca, Transaction.created_at <= limite),
+        select(REMOVIDAS.NumeroFatura).where(*removidas_na_janela(marca, limite)),
+    )
+    ja_contadas = or_(Transaction.created_at.is_(None), Transaction.created_at <= marca)
+    itens = union_all(
+        select(
+            Transaction.NumeroFatura,
+            Transaction.CodigoProduto,
+            case((ja_contadas, Transaction.Quantidade)).label("antes"),
+            Transaction.Quantidade.label("depois"),
+        ).where(ate_limite, Transaction.NumeroFatura.in_(afetadas)),
+        select(
+            REMOVIDAS.NumeroFatura,
+            REMOVIDAS.CodigoProduto,
+            REMOVIDAS.Quantidade.label("antes"),
+            null().label("depois"),
+        ).where(*removidas_na_janela(marca, limite)),
+    ).subquery()
+    return (
+        select(
+            itens.c.NumeroFatura,
+            itens.c.CodigoProduto,
+            func.coalesce(func.sum(itens.c.antes), 0).label("quantidade_antes"),
+            func.coalesce(func.sum(itens.c.depois), 0).label("quantidade"),
+        )
+        .where(itens.c.NumeroFatura.is_not(None), itens.c.CodigoProduto.is_not(None))
+        .group_by(itens.c.NumeroFatura, itens.c.CodigoProduto)
+    )
+
+
+def _coocorrencias(faturas: np.ndarray, produtos: np.ndarray, forma, presente: np.ndarray):
+    """XᵀX da matriz fatura × produto com as linhas presentes, e quantas faturas têm algum produto"""
+    matriz = sparse.csr_matrix(
+        (np.ones(presente.sum(), dtype=np.int64), (faturas[presente], produtos[presente])), shape=forma
+    )
+    return matriz.T @ matriz, int((matriz.getnnz(axis=1) > 0).sum())
+
+
+def _diferencas(linhas: list):
+    """Variação das contagens de produtos e pares e do total de faturas para as faturas afetadas"""
+    numeros, codigos, antes, depois = zip(*linhas)
+    codigos_faturas, faturas = np.unique(np.array(numeros, dtype=object), return_inverse=True)
+    codigos_produtos, produtos = np.unique(np.array(codigos, dtype=object), return_inverse=True)
+    forma = (len(codigos_faturas), len(codigos_produtos))
+
+    novo, faturas_novo = _coocorrencias(faturas, produtos, forma, np.array(depois, dtype=float) >= 1)
+    antigo, faturas_antigo = _coocorrencias(faturas, produtos, forma, np.array(antes, dtype=float) >= 1)
+    diferenca = (novo - antigo).tocoo()
+
+    linha, coluna, valor = diferenca.row, diferenca.col, diferenca.data
+    mudou = valor != 0
+    linha, coluna, valor = linha[mudou], coluna[mudou], valor[mudou]
+
+    diagonal = linha == coluna
+    produtos_delta = [
+        {"CodigoProduto": codigos_produtos[p], "faturas": int(v)}
+        for p, v in zip(linha[diagonal], valor[diagonal])
+    ]
+    # np.unique ordena os códigos: linha < coluna é o par na ordem CodigoProdutoA < CodigoProdutoB
+    superior = linha < coluna
+    pares_delta = [
+        {"CodigoProdutoA": codigos_produtos[a], "CodigoProdutoB": codigos_produtos[b], "faturas": int(v)}
+        for a, b, v in zip(linha[superior], coluna[superior], valor[superior])
+    ]
+    return produtos_delta, pares_delta, faturas_novo - faturas_antigo
+
+
+def _somar_contagens(db: Session, modelo, linhas: List[Dict]):
+    tabela = modelo.__table__
+    stmt = pg_insert(tabela)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[c.name for c in tabela.primary_key],
+        set_={"faturas": tabela.c.faturas + stmt.excluded.faturas},
+    )
+    for inicio in range(0, len(linhas), TAMANHO_LOTE_GRAVACAO):
+        db.execute(stmt, linhas[inicio:inicio + TAMANHO_LOTE_GRAVACAO])
+    # Faturas alteradas podem perder produtos (devoluções)
+    db.execute(delete(tabela).where(tabela.c.faturas <= 0))
+
+
+def atualizar_cestas(db: Session) -> Dict:
+    """
+    Soma às contagens de produtos e pares as faturas com linhas novas desde a última execução.
+    Na primeira execução (sem marca d'água) a matriz inteira é montada.
+    Returns: Dict com as faturas processadas, o total de faturas, produtos e pares
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        raise RuntimeError("Análise de cestas só está disponível no backend postgres")
+
+    Base.metadata.create_all(
+        bind=db.get_bind(),
+        tables=[CestaProduto.__table__, CestaPar.__table__, RollupEstado.__table__, TransacaoRemovida.__table__],
+    )
+
+    bloquear_ingestao(db)
+    limite = db.query(func.max(Transaction.created_at)).scalar()
+    estado = db.get(RollupEstado, ESTADO)
+    marca = estado.ultimo_created_at if estado else None
+    total_faturas = estado.linhas if estado and marca is not None else 0
+
+    faturas_processadas = 0
+    if marca is None or (limite is not None and marca < limite):
+        if marca is None:
+            db.execute(delete(CestaProduto))
+            db.execute(delete(CestaPar))
+        linhas = db.execute(_select_itens(limite, marca)).all()
+        if linhas:
+            produtos_delta, pares_delta, faturas_delta = _diferencas(linhas)
+            _somar_contagens(db, CestaProduto, produtos_delta)
+            _somar_contagens(db, CestaPar, pares_delta)
+            total_faturas += faturas_delta
+            faturas_processadas = len({l.NumeroFatura for l in linhas})
+
+        db.merge(RollupEstado(
+            tabela=ESTADO,
+            ultimo_created_at=limite,
+            linhas=total_faturas,
+            atualizado_em=datetime.now(timezone.utc),
+        ))
+    db.commit()
+    _indice["expira_em"] = 0.0
+
+    return {
+        "faturas_processadas": faturas_processadas,
+        "total_faturas": total_faturas,
+        "produtos": db.query(func.count()).select_from(CestaProduto).scalar(),
+        "pares": db.query(func.count()).select_from(CestaPar).scalar(),
+    }
+
+
+def montar_regras(total_faturas: int, produtos: Dict[str, int], pares: list) -> Dict[str, List[Dict]]:
+    """
+    Regras A -> B nos dois sentidos de cada par frequente, as de maior lift primeiro
+    Args:
+        total_faturas: Faturas com ao menos um produto
+        produtos: CodigoProduto -> faturas com o produto
+        pares: (CodigoProdutoA, CodigoProdutoB, faturas) com suporte mínimo
+    Returns: Dict CodigoProduto -> até CESTAS_MAX_REGRAS regras com ele como antecedente
+    """
+    if not pares or not total_faturas:
+        return {}
+    a, b, juntos = zip(*pares)
+    antecedentes = np.array(a + b, dtype=object)
+    consequentes = np.array(b + a, dtype=object)
+    juntos = np.array(juntos + juntos, dtype=float)
+    com_antecedente = np.array([produtos[p] for p in antecedentes], dtype=float)
+    com_consequente = np.array([produtos[p] for p in consequentes], dtype=float)
+
+    suporte = juntos / total_faturas
+    confianca = juntos / com_antecedente
+    lift = confianca / (com_consequente / total_faturas)
+
+    validas = np.flatnonzero(confianca >= settings.CESTAS_CONFIANCA_MINIMA)
+    # Por antecedente e, dentro dele, lift decrescente
+    ordem = validas[np.lexsort((-lift[validas], antecedentes[validas].astype(str)))]
+
+    regras: Dict[str, List[Dict]] = {}
+    for i in ordem:
+        lista = regras.setdefault(antecedentes[i], [])
+        if len(lista) < settings.CESTAS_MAX_REGRAS:
+            lista.append({
+                "consequente": consequentes[i],
+                "faturas": int(juntos[i]),
+                "suporte": float(suporte[i]),
+                "confianca": float(confianca[i]),
+                "lift": float(lift[i]),
+            })
+    return regras
+
+
+_indice = {"expira_em": 0.0, "versao": None, "total_faturas": 0, "produtos": {}, "regras": {}}
+
+
+async def _indice_atual(db: AsyncSession) -> Dict:
+    """Índice de regras do processo, remontado quando as contagens mudam (verificado a cada CACHE_ESTADO_TTL)"""
+    if time.monotonic() < _indice["expira_em"]:
+        return _indice
+
+    estado = (await db.execute(
+        select(RollupEstado.atualizado_em, RollupEstado.linhas).where(RollupEstado.tabela == ESTADO)
+    )).one_or_none()
+    if estado is None:
+        raise RuntimeError("Análise de cestas ainda não calculada (POST /api/v1/admin/cestas/atualizar)")
+
+    if estado.atualizado_em != _indice["versao"]:
+        total_faturas = estado.linhas or 0
+        minimo = settings.CESTAS_SUPORTE_MINIMO * total_faturas
+        produtos = dict((await db.execute(
+            select(CestaProduto.CodigoProduto, CestaProduto.faturas).where(CestaProduto.faturas >= minimo)
+        )).all())
+        pares = (await db.execute(
+            select(CestaPar.CodigoProdutoA, CestaPar.CodigoProdutoB, CestaPar.faturas).where(CestaPar.faturas >= minimo)
+        )).all()
+        _indice.update(
+            versao=estado.atualizado_em,
+            total_faturas=total_faturas,
+            produtos=produtos,
+            regras=montar_regras(total_faturas, produtos, pares),
+        )
+    _indice["expira_em"] = time.monotonic() + CACHE_ESTADO_TTL
+    return _indice
+
+
+async def regras_do_produto(db: AsyncSession, codigo_produto: str, limite: int) -> Dict:
+    """Regras com o produto como antecedente (nenhuma quando ele não tem suporte mínimo)"""
+    indice = await _indice_atual(db)
+    return {
+        "faturas_produto": indice["produtos"].get(codigo_produto, 0),
+        "total_faturas": indice["total_faturas"],
+        "regras": indice["regras"].get(codigo_produto, [])[:limite],
+    }
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        for chave, valor in atualizar_cestas(db).items():
+            print(f"{chave}: {valor}")
+    finally:
+        db.close()
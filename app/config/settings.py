@@ -1,10 +1,62 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Literal
 
 class Settings(BaseSettings):
-    SUPABASE_URL: str
-    SUPABASE_KEY: str
-    DATABASE_URL: str
+    SUPABASE_URL: str = ""
+    SUPABASE_KEY: str = ""
+    DATABASE_URL: str = ""
+
+    # Backend de armazenamento: Postgres (DATABASE_URL) ou DuckDB embarcado lendo Parquet
+    BACKEND: Literal["postgres", "duckdb"] = "postgres"
+    DUCKDB_PARQUET: str = "dados/transactions_sample/*.parquet"
+
+    # Pool de conexões e limites por comando
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 30000
+    DB_APPLICATION_NAME: str = "retailsense-api"
+
+    # Registro de consultas lentas (app.consultas_lentas)
+    SLOW_QUERY_LIMIAR_MS: int = 500
+    SLOW_QUERY_AMOSTRA_EXPLAIN: float = 0.1
+    SLOW_QUERY_MAX_REGISTROS: int = 200
+
+    # Artefatos da segmentação de clientes (app.segmentacao)
+    MODEL_PATH: str = "models/trained/customer_segments.joblib"
+    SCALER_PATH: str = "models/artifacts/scaler.joblib"
+    MODEL_INFO_PATH: str = "models/artifacts/model_info.joblib"
+    SEGMENTACAO_TAMANHO_LOTE: int = 50000
+    # Arrays dos artefatos mapeados em memória e carga em segundo plano na inicialização (app.modelos)
+    MODELOS_MMAP: bool = True
+    MODELOS_AQUECER: bool = False
+
+    # Pipeline versionado de categorias de produto e cache de descrições já classificadas (app.categorias)
+    CATEGORIAS_DIR: str = "models/categorias"
+    CATEGORIAS_CACHE_MAX: int = 100000
+
+    # Linhas por lote do ETL do arquivo bruto (app.etl)
+    ETL_TAMANHO_LOTE: int = 100000
+    # Troca da tabela na carga completa com COPY (app.etl.carga): espera pelo lock a cada tentativa
+    CARGA_LOCK_TIMEOUT_MS: int = 5000
+    CARGA_TENTATIVAS_TROCA: int = 10
+
+    # Regras de associação da análise de cestas (app.cestas)
+    CESTAS_SUPORTE_MINIMO: float = 0.01
+    CESTAS_CONFIANCA_MINIMA: float = 0.1
+    CESTAS_MAX_REGRAS: int = 20
+
+    # Cache de respostas das rotas de análise
+    CACHE_TTL: int = 300
+    CACHE_MAX_ENTRADAS: int = 256
+    CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_VERSAO_TTL: int = 30
+
+    # Depuração: valida cada resposta das rotas pelo schema antes de serializá-la
+    VALIDAR_RESPOSTAS: bool = False
 
     class Config:
         env_file = ".env"
@@ -12,4 +64,3 @@ class Settings(BaseSettings):
 @lru_cache()
 def get_settings():
     return Settings()
-
@@ -0,0 +1,219 @@
+"""
+Registro de consultas lentas.
+
+Os eventos before/after_cursor_execute das engines medem cada comando; os que passam de
+SLOW_QUERY_LIMIAR_MS entram num buffer circular com o SQL, os parâmetros e a duração.
+Uma fração deles (SLOW_QUERY_AMOSTRA_EXPLAIN) tem o plano capturado com
+EXPLAIN (ANALYZE, BUFFERS) em segundo plano, numa conexão separada e dentro de uma
+transação desfeita em seguida. Só consultas de leitura (SELECT/WITH) no Postgres têm plano,
+e apenas um EXPLAIN roda por vez: EXPLAIN ANALYZE executa a consulta de novo, então a
+amostragem limita o custo extra para o banco. Comandos que alteram dados (como um WITH ...
+DELETE) ou pegam locks (FOR UPDATE, advisory locks) não são amostrados: executados de novo
+em outra conexão, esperariam os locks da transação original até o limite por comando.
+
+Os registros são lidos em GET /api/v1/admin/consultas-lentas.
+"""
+import asyncio
+import contextvars
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+from app.config.settings import get_settings
+
+settings = get_settings()
+
+# Opção de execução que marca os comandos do próprio registro (EXPLAIN), que não são medidos
+_OPCAO_IGNORAR = "consultas_lentas_ignorar"
+# Consultas que alteram dados ou pegam locks, mesmo começando por SELECT ou WITH
+_ESCRITA_OU_LOCK = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|NEXTVAL|SETVAL|PG_ADVISORY\w*|PG_TRY_ADVISORY\w*)\b"
+    r"|\bFOR\s+(NO\s+KEY\s+UPDATE|KEY\s+SHARE|UPDATE|SHARE)\b"
+)
+
+
+class RegistroConsultasLentas:
+    """Buffer circular com as consultas lentas mais recentes"""
+
+    def __init__(self, max_registros: int):
+        self._registros = deque(maxlen=max_registros)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def adicionar(self, registro: Dict) -> Dict:
+        with self._lock:
+            registro["id"] = next(self._ids)
+            self._registros.append(registro)
+        return registro
+
+    def listar(self, limite: int, duracao_minima_ms: float = 0) -> List[Dict]:
+        """Registros mais recentes primeiro"""
+        with self._lock:
+            registros = [r for r in reversed(self._registros) if r["duracao_ms"] >= duracao_minima_ms]
+        return [dict(r) for r in registros[:limite]]
+
+    def limpar(self):
+        with self._lock:
+            self._registros.clear()
+
+
+registro_consultas_lentas = RegistroConsultasLentas(settings.SLOW_QUERY_MAX_REGISTROS)
+
+# Livre quando nenhum EXPLAIN está em andamento
+_lock_explain = threading.Lock()
+_executor_explain = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+_tarefas_explain = set()
+
+
+def _serializavel(valor):
+    if isinstance(valor, dict):
+        return {str(k): _serializavel(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_serializavel(v) for v in valor]
+    if valor is None or isinstance(valor, (bool, int, float, str)):
+        return valor
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    return str(valor)
+
+
+def _somente_leitura(statement: str) -> bool:
+    """SELECT ou WITH sem escrita nem lock, que pode ser executado de novo pelo EXPLAIN ANALYZE"""
+    sql = statement.lstrip().upper()
+    return sql.startswith(("SELECT", "WITH")) and not _ESCRITA_OU_LOCK.search(sql)
+
+
+def _sql_explain(statement: str) -> str:
+    return f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}"
+
+
+def _sql_timeout() -> Optional[str]:
+    # O EXPLAIN ANALYZE executa a consulta: vale o mesmo limite por comando das sessões
+    if settings.DB_STATEMENT_TIMEOUT_MS > 0:
+        return f"SET LOCAL statement_timeout = {int(settings.DB_STATEMENT_TIMEOUT_MS)}"
+    return None
+
+
+def _guardar_plano(registro: Dict, plano):
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    registro["plano"] = plano[0]
+    registro["plano_status"] = "capturado"
+
+
+def _explicar_sync(engine, registro: Dict, statement: str, parameters):
+    try:
+        with engine.connect().execution_options(**{_OPCAO_IGNORAR: True}) as conn:
+            if _sql_timeout():
+                conn.exec_driver_sql(_sql_timeout())
+            plano = conn.exec_driver_sql(_sql_explain(statement), parameters).scalar()
+            conn.rollback()
+        _guardar_plano(registro, plano)
+    except Exception as e:
+        registro["plano_status"] = f"erro: {e}"
+    finally:
+        _lock_explain.release()
+
+
+async def _explicar_async(engine_async, registro: Dict, statement: str, parameters):
+    try:
+        async with engine_async.connect() as conn:
+            conn = await conn.execution_options(**{_OPCAO_IGNORAR: True})
+            if _sql_timeout():
+                await conn.exec_driver_sql(_sql_timeout())
+            plano = (await conn.exec_driver_sql(_sql_explain(statement), tuple(parameters))).scalar()
+            await conn.rollback()
+        _guardar_plano(registro, plano)
+    except Exception as e:
+        registro["plano_status"] = f"erro: {e}"
+    finally:
+        _lock_explain.release()
+
+
+def _agendar_explain(engine, engine_async, registro: Dict, statement: str, parameters):
+    if engine_async is None:
+        _executor_explain.submit(_explicar_sync, engine, registro, statement, parameters)
+        return
+    # O evento roda no greenlet da sessão assíncrona, dentro do event loop. A tarefa é criada
+    # num contexto vazio para que o EXPLAIN não conte nas métricas da rota que o disparou
+    tarefa = contextvars.Context().run(
+        asyncio.get_running_loop().create_task,
+        _explicar_async(engine_async, registro, statement, parameters),
+    )
+    _tarefas_explain.add(tarefa)
+    tarefa.add_done_callback(_tarefas_explain.discard)
+
+
+def instrumentar(engine, engine_async=None, rotulo: str = "sync"):
+    """
+    Registra os eventos que medem os comandos da engine
+    Args:
+        engine: Engine síncrona (para a assíncrona, async_engine.sync_engine)
+        engine_async: AsyncEngine correspondente, usada para rodar o EXPLAIN sem bloquear o loop
+        rotulo: Nome da engine nos registros
+    """
+    limiar = settings.SLOW_QUERY_LIMIAR_MS / 1000
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("inicio_consultas_lentas", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _depois(conn, cursor, statement, parameters, context, executemany):
+        pilha = conn.info.get("inicio_consultas_lentas")
+        if not pilha:
+            return
+        duracao = time.perf_counter() - pilha.pop()
+        if duracao < limiar or conn.get_execution_options().get(_OPCAO_IGNORAR):
+            return
+
+        consulta = _somente_leitura(statement)
+        linhas = getattr(cursor, "rowcount", None)
+        registro = registro_consultas_lentas.adicionar({
+            "momento": datetime.now(timezone.utc).isoformat(),
+            "engine": rotulo,
+            "duracao_ms": round(duracao * 1000, 3),
+            "sql": statement,
+            "parametros": _serializavel(parameters),
+            "linhas": linhas if linhas is not None and linhas >= 0 else None,
+            "plano": None,
+            "plano_status": "não amostrado",
+        })
+        if (
+            consulta
+            and conn.dialect.name == "postgresql"
+            and not executemany
+            and random.random() < settings.SLOW_QUERY_AMOSTRA_EXPLAIN
+            and _lock_explain.acquire(blocking=False)
+        ):
+            registro["plano_status"] = "pendente"
+            try:
+                _agendar_explain(engine, engine_async, registro, statement, parameters)
+            except Exception as e:
+                registro["plano_status"] = f"erro: {e}"
+                _lock_explain.release()
+
+    @event.listens_for(engine, "handle_error")
+    def _erro(contexto):
+        if contexto.connection is not None and contexto.connection.info.get("inicio_consultas_lentas"):
+            contexto.connection.info["inicio_consultas_lentas"].pop()
+
+
+def consultas_lentas(limite: int, duracao_minima_ms: float = 0, com_plano: bool = True) -> List[Dict]:
+    registros = registro_consultas_lentas.listar(limite, duracao_minima_ms)
+    if not com_plano:
+        for r in registros:
+            r.pop("plano")
+    return registros
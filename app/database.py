@@ -1,15 +1,125 @@
-from sqlalchemy import create_engine
+import asyncio
+import time
+import weakref
+from sqlalchemy import create_engine, event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.engine import CursorResult, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from app import consultas_lentas, metricas, monitoramento
 from app.config.settings import get_settings
 
 settings = get_settings()
 
-# Criar engine do SQLAlchemy
-engine = create_engine(settings.DATABASE_URL)
+POOL_ESPERA = metricas.histograma(
+    "db_pool_checkout_espera_segundos", "Tempo para obter uma conexão do pool"
+)
+POOL_ESGOTADO = metricas.contador(
+    "db_pool_esgotado_total", "Pedidos de conexão feitos com o pool no limite (pool_size + max_overflow)"
+)
+POOL_TIMEOUT = metricas.contador(
+    "db_pool_timeout_total", "Pedidos de conexão que desistiram após DB_POOL_TIMEOUT"
+)
 
-# Criar SessionLocal
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+class _PoolMedido:
+    """Mede a espera por conexão e conta quando o pool está esgotado"""
+    rotulo = ""
+
+    def _do_get(self):
+        if self._max_overflow > -1 and self.checkedout() >= self.size() + self._max_overflow:
+            POOL_ESGOTADO.inc(engine=self.rotulo)
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except sa_exc.TimeoutError:
+            POOL_TIMEOUT.inc(engine=self.rotulo)
+            raise
+        finally:
+            POOL_ESPERA.observar(time.perf_counter() - inicio, engine=self.rotulo)
+
+class PoolMedido(_PoolMedido, QueuePool):
+    rotulo = "sync"
+
+class PoolMedidoAsync(_PoolMedido, AsyncAdaptedQueuePool):
+    rotulo = "async"
+
+class SessaoAssincrona(AsyncSession):
+    """AsyncSession que mede a leitura das linhas de cada resultado (fase "leitura" das métricas)"""
+
+    async def execute(self, *args, **kwargs):
+        resultado = await super().execute(*args, **kwargs)
+        if isinstance(resultado, CursorResult) and not resultado.returns_rows:
+            return resultado
+        # As linhas são lidas aqui, de uma vez, e o resultado devolvido já está em memória
+        with monitoramento.fase("leitura"):
+            congelado = resultado.freeze()
+        monitoramento.contar_linhas(len(congelado.data))
+        return congelado()
+
+def _argumentos_pool():
+    return dict(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+
+def url_assincrona(url: str):
+    """Mesma URL de DATABASE_URL com o driver asyncpg (que usa 'ssl' no lugar de 'sslmode')"""
+    url = make_url(url).set(drivername="postgresql+asyncpg")
+    if "sslmode" in url.query:
+        url = url.update_query_dict({"ssl": url.query["sslmode"]}).difference_update_query(["sslmode"])
+    return url
+
+if settings.BACKEND == "duckdb":
+    # Backend embarcado (DuckDB sobre Parquet) com a mesma interface de sessões para as rotas
+    from app.backend_duckdb import SessaoDuckDB, criar_engine
+
+    engine = criar_engine(settings.DUCKDB_PARQUET, settings.DB_POOL_SIZE)
+    CAPACIDADE_POOL = settings.DB_POOL_SIZE
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    async_engine = None
+    AsyncSessionLocal = lambda: SessaoDuckDB(SessionLocal)
+else:
+    # Criar engine do SQLAlchemy
+    engine = create_engine(
+        settings.DATABASE_URL,
+        poolclass=PoolMedido,
+        connect_args={"application_name": settings.DB_APPLICATION_NAME},
+        **_argumentos_pool()
+    )
+
+    # Criar SessionLocal
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    # Engine e sessões assíncronas usadas pelas rotas de análise
+    async_engine = create_async_engine(
+        url_assincrona(settings.DATABASE_URL),
+        poolclass=PoolMedidoAsync,
+        connect_args={"server_settings": {"application_name": settings.DB_APPLICATION_NAME}},
+        **_argumentos_pool()
+    )
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=SessaoAssincrona, autoflush=False, expire_on_commit=False)
+    CAPACIDADE_POOL = settings.DB_POOL_SIZE + max(settings.DB_MAX_OVERFLOW, 0)
+
+# Conexões que as sessões extras de executar_em_paralelo podem ocupar no processo: metade
+# do pool, para que a outra metade fique com as sessões das próprias requisições
+SESSOES_PARALELAS = max(1, CAPACIDADE_POOL // 2)
+
+# Registro de consultas lentas (com EXPLAIN amostrado no Postgres)
+consultas_lentas.instrumentar(engine)
+if async_engine is not None:
+    consultas_lentas.instrumentar(async_engine.sync_engine, async_engine, rotulo="async")
+
+# O limite por comando é aplicado em cada transação (SET LOCAL), o que também funciona
+# atrás do pooler do Supabase em modo transação, onde parâmetros de conexão são descartados
+@event.listens_for(Session, "after_begin")
+def _aplicar_statement_timeout(session, transaction, connection):
+    if settings.DB_STATEMENT_TIMEOUT_MS > 0 and connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(settings.DB_STATEMENT_TIMEOUT_MS)}")
 
 # Criar Base para os modelos
 Base = declarative_base()
@@ -20,4 +130,65 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Dependency para obter a sessão assíncrona do banco
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Um semáforo por event loop (o TestClient, por exemplo, cria um loop por cliente)
+_vagas_paralelas = weakref.WeakKeyDictionary()
+
+def _vagas() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    if loop not in _vagas_paralelas:
+        _vagas_paralelas[loop] = asyncio.Semaphore(SESSOES_PARALELAS)
+    return _vagas_paralelas[loop]
+
+async def em_paralelo(db, *funcoes):
+    """
+    Executa funções assíncronas independentes, cada uma recebendo uma sessão. Enquanto houver
+    vaga em SESSOES_PARALELAS, as funções ganham sessões (e conexões) próprias e rodam ao mesmo
+    tempo; as demais rodam uma após a outra em db, a sessão de quem chamou. Nunca se espera por
+    vaga segurando db, então requisições simultâneas não esgotam o pool umas das outras
+    Returns: Lista com o resultado de cada função, na ordem recebida
+    """
+    vagas = _vagas()
+    proprias = 0
+    # Uma das funções sempre roda em db, que já está aberta
+    while proprias < len(funcoes) - 1 and not vagas.locked():
+        await vagas.acquire()
+        proprias += 1
+
+    async def em_sessao_propria(funcao):
+        try:
+            async with AsyncSessionLocal() as sessao:
+                return await funcao(sessao)
+        finally:
+            vagas.release()
+
+    async def em_sequencia(restantes):
+        return [await funcao(db) for funcao in restantes]
+
+    *resultados, sequenciais = await asyncio.gather(
+        *(em_sessao_propria(f) for f in funcoes[:proprias]), em_sequencia(funcoes[proprias:])
+    )
+    return resultados + sequenciais
+
+async def executar_em_paralelo(db, *consultas):
+    """
+    Executa consultas independentes ao mesmo tempo com em_paralelo
+    Returns: Lista com as linhas de cada consulta, na ordem recebida
+    """
+    def executar(consulta):
+        async def funcao(sessao):
+            return (await sessao.execute(consulta)).all()
+        return funcao
+
+    return await em_paralelo(db, *(executar(c) for c in consultas))
+
+def estado_pools() -> dict:
+    if async_engine is None:
+        return {"sync": engine.pool.status()}
+    return {"sync": engine.pool.status(), "async": async_engine.pool.status()}
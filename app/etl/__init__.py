@@ -0,0 +1,19 @@
+"""
+ETL do arquivo bruto do Online Retail para o esquema de transactions_sample.
+
+Substitui o caminho dos notebooks (read_excel, CSV e limpeza em memória): o arquivo é lido
+em lotes e cada transformação é vetorizada sobre o lote inteiro. Detalhes das passagens
+em app.etl.pipeline.
+
+A carga do resultado no Postgres (COPY numa tabela de staging e troca atômica) fica em
+app.etl.carga, e a ingestão incremental (só faturas novas ou alteradas, com o conjunto de
+alterações registrado) em app.etl.incremental.
+
+Uso:
+    python -m app.etl data/raw/Online_Retail.xlsx dados/transactions_sample/transacoes.parquet
+    python -m app.etl.carga data/raw/Online_Retail.xlsx
+    python -m app.etl.incremental novas_vendas.csv
+"""
+from app.etl.pipeline import PipelineETL, gravar
+
+__all__ = ["PipelineETL", "gravar"]
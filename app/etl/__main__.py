@@ -0,0 +1,22 @@
+import argparse
+import resource
+import time
+
+from app.etl.pipeline import PipelineETL, gravar
+
+parser = argparse.ArgumentParser(prog="python -m app.etl", description="Limpa o arquivo bruto em lotes")
+parser.add_argument("entrada", help="Arquivo bruto (.csv, .xlsx ou .parquet)")
+parser.add_argument("saida", help="Arquivo limpo (.parquet ou .csv)")
+parser.add_argument("--lote", type=int, help="Linhas por lote (padrão ETL_TAMANHO_LOTE)")
+parser.add_argument("--formato-data", help="Formato de InvoiceDate, ex.: %%m/%%d/%%Y %%H:%%M")
+parser.add_argument("--sem-categorias", action="store_true", help="Não classifica os produtos: CategoriaProduto fica 'Desconhecida'")
+args = parser.parse_args()
+
+inicio = time.perf_counter()
+pipeline = PipelineETL(args.entrada, args.lote, not args.sem_categorias, args.formato_data)
+gravar(pipeline.lotes(), args.saida)
+for chave, valor in pipeline.estatisticas.items():
+    print(f"{chave}: {valor}")
+print(f"tempo: {time.perf_counter() - inicio:.1f} s")
+# ru_maxrss em KiB no Linux
+print(f"pico de memória: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
@@ -0,0 +1,225 @@
+"""
+Carga completa de transactions_sample com COPY e troca atômica.
+
+Os lotes limpos (do pipeline de app.etl ou de um arquivo já limpo gerado por ele) são
+gravados numa tabela de staging com a mesma estrutura da atual, criada sem índices, com
+um COPY ... FROM STDIN por lote a partir de um buffer CSV em memória. Os índices da
+tabela atual (inclusive chave primária e restrições únicas) são recriados na staging
+depois da carga, que recebe ANALYZE e então toma o lugar de transactions_sample.
+
+Tudo roda numa única transação: a tabela atual continua servindo as rotas durante a
+carga e só é substituída no COMMIT; uma falha em qualquer etapa desfaz tudo. Escritas em
+transactions_sample esperam o fim da carga (lock EXCLUSIVE, que não bloqueia leituras),
+para que nada gravado durante a carga se perca na troca. A troca pede o lock ACCESS
+EXCLUSIVE com lock_timeout de CARGA_LOCK_TIMEOUT_MS, em até CARGA_TENTATIVAS_TROCA
+tentativas, para que as leituras da API não fiquem paradas atrás dele enquanto uma
+consulta longa termina.
+
+Todas as linhas carregadas recebem o mesmo created_at (início da carga), e as marcas
+d'água de rollup_estado são descartadas na mesma transação (app.rollups.descartar_marcas).
+Os hashes das faturas da ingestão incremental (app.etl.incremental) são recalculados a
+partir da staging, as linhas removidas guardadas até então são descartadas e a carga é
+registrada em alteracoes_transacoes como um conjunto de alterações sem chaves.
+
+Uso:
+    python -m app.etl.carga data/raw/Online_Retail.xlsx    roda o ETL e carrega o resultado
+    python -m app.etl.carga transacoes.parquet --limpo     carrega um arquivo já limpo (.parquet ou .csv)
+"""
+import io
+import re
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List
+
+import pandas as pd
+from sqlalchemy import Connection, String, inspect, text
+from sqlalchemy.exc import OperationalError
+
+from app.config.settings import get_settings
+from app.database import engine
+from app.models import Transaction
+from app.rollups import LOCK_INGESTAO, descartar_marcas
+
+settings = get_settings()
+
+TABELA = Transaction.__tablename__
+STAGING = f"{TABELA}_carga"
+# Representação de nulo no CSV do COPY, que não ocorre nos dados: um campo vazio sem aspas
+# continua sendo string vazia (com o NULL padrão do formato csv, viraria nulo)
+NULO = r"\N"
+# Código do Postgres para lock_timeout esgotado (lock_not_available)
+LOCK_INDISPONIVEL = "55P03"
+
+
+def lotes_limpos(caminho: str, tamanho_lote: int) -> Iterator[pd.DataFrame]:
+    """Lotes de um arquivo já limpo, com as colunas de transactions_sample"""
+    if caminho.lower().endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for lote in pq.ParquetFile(caminho).iter_batches(batch_size=tamanho_lote):
+            yield lote.to_pandas()
+    else:
+        # Como texto: o Postgres converte cada coluna no COPY. Campo vazio é string vazia nas
+        # colunas de texto (como no Parquet) e nulo nas demais
+        nulos = {c.name: [""] for c in Transaction.__table__.columns if not isinstance(c.type, String)}
+        with pd.read_csv(caminho, dtype=str, keep_default_na=False, na_values=nulos, chunksize=tamanho_lote) as leitor:
+            yield from leitor
+
+
+def _nome_staging(nome: str) -> str:
+    # Identificadores do Postgres têm até 63 caracteres
+    return f"{nome[:57]}_carga"
+
+
+def _indices(conexao: Connection) -> List:
+    """Nome, definição e tipo de restrição (p, u ou nulo) de cada índice da tabela atual"""
+    return conexao.execute(text("""
+        SELECT i.relname AS nome, pg_get_indexdef(i.oid) AS definicao, c.contype AS restricao
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        LEFT JOIN pg_constraint c ON c.conindid = x.indexrelid AND c.conrelid = x.indrelid AND c.contype IN ('p', 'u')
+        WHERE x.indrelid = CAST(:tabela AS regclass)
+    """), {"tabela": TABELA}).all()
+
+
+def criar_tabela(conexao: Connection):
+    """Primeira carga: a tabela é criada pelo modelo, com a chave primária em id (preenchido pelo banco)"""
+    Transaction.__table__.create(bind=conexao)
+
+
+def copiar(cursor, tabela: str, lote: pd.DataFrame):
+    """COPY do lote para a tabela a partir de um buffer CSV em memória"""
+    colunas = ", ".join(engine.dialect.identifier_preparer.quote(c) for c in lote.columns)
+    buffer = io.StringIO()
+    lote.to_csv(buffer, index=False, header=False, na_rep=NULO)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {tabela} ({colunas}) FROM STDIN WITH (FORMAT csv, NULL '{NULO}')", buffer)
+
+
+def _criar_indices(conexao: Connection, indices: List):
+    for indice in indices:
+        nome = _nome_staging(indice.nome)
+        conexao.exec_driver_sql(re.sub(
+            r"^CREATE (UNIQUE )?INDEX \S+ ON (ONLY )?\S+ ",
+            lambda m: f"CREATE {m.group(1) or ''}INDEX {nome} ON {STAGING} ",
+            indice.definicao,
+        ))
+        if indice.restricao:
+            tipo = "PRIMARY KEY" if indice.restricao == "p" else "UNIQUE"
+            conexao.exec_driver_sql(f"ALTER TABLE {STAGING} ADD CONSTRAINT {nome} {tipo} USING INDEX {nome}")
+
+
+def _trocar(conexao: Connection, indices: List):
+    """Substitui a tabela atual pela staging, com os índices nos nomes originais"""
+    for tentativa in range(1, settings.CARGA_TENTATIVAS_TROCA + 1):
+        ponto = conexao.begin_nested()
+        try:
+            conexao.exec_driver_sql(f"SET LOCAL lock_timeout = {int(settings.CARGA_LOCK_TIMEOUT_MS)}")
+            conexao.exec_driver_sql(f"LOCK TABLE {TABELA} IN ACCESS EXCLUSIVE MODE")
+            ponto.commit()
+            break
+        except OperationalError as e:
+            ponto.rollback()
+            if getattr(e.orig, "pgcode", None) != LOCK_INDISPONIVEL or tentativa == settings.CARGA_TENTATIVAS_TROCA:
+                raise
+
+    conexao.exec_driver_sql(f"DROP TABLE {TABELA}")
+    conexao.exec_driver_sql(f"ALTER TABLE {STAGING} RENAME TO {TABELA}")
+    # Renomear o índice de uma restrição também renomeia a restrição
+    for indice in indices:
+        conexao.exec_driver_sql(f"ALTER INDEX {_nome_staging(indice.nome)} RENAME TO {indice.nome}")
+
+
+def carregar(lotes: Iterable[pd.DataFrame]) -> Dict:
+    """
+    Substitui o conteúdo de transactions_sample pelos lotes
+    Args:
+        lotes: DataFrames com colunas de transactions_sample (created_at é preenchida aqui)
+    Returns: Dict com as linhas carregadas, os índices recriados e o tempo de cada etapa
+    """
+    if settings.BACKEND != "postgres":
+        raise RuntimeError("A carga com COPY só está disponível no backend postgres")
+
+    linhas = 0
+    segundos_copia = 0.0
+    inicio = time.perf_counter()
+
+    with engine.begin() as conexao:
+        # Cópia e criação de índices passam do limite por comando das rotas
+        conexao.exec_driver_sql("SET LOCAL statement_timeout = 0")
+        # Ingestões incrementais esperam a carga (e a carga espera as que estão em andamento)
+        conexao.execute(text("SELECT pg_advisory_xact_lock(:chave)"), {"chave": LOCK_INGESTAO})
+        criado_em = datetime.now(timezone.utc).isoformat()
+        if not inspect(conexao).has_table(TABELA):
+            criar_tabela(conexao)
+        colunas_tabela = {c["name"] for c in inspect(conexao).get_columns(TABELA)}
+
+        # Escritas esperam a troca; leituras continuam na tabela atual
+        conexao.exec_driver_sql(f"LOCK TABLE {TABELA} IN EXCLUSIVE MODE")
+        conexao.exec_driver_sql(f"DROP TABLE IF EXISTS {STAGING}")
+        conexao.exec_driver_sql(f"CREATE TABLE {STAGING} (LIKE {TABELA} INCLUDING ALL EXCLUDING INDEXES)")
+
+        cursor = conexao.connection.cursor()
+        for lote in lotes:
+            # id é atribuído pelo banco a cada carga (um arquivo exportado pela API traz o anterior)
+            lote = lote.drop(columns="id", errors="ignore").assign(created_at=criado_em)
+            desconhecidas = set(lote.columns) - colunas_tabela
+            if desconhecidas:
+                raise ValueError(f"Colunas que não existem em {TABELA}: {', '.join(sorted(desconhecidas))}")
+            inicio_copia = time.perf_counter()
+            copiar(cursor, STAGING, lote)
+            segundos_copia += time.perf_counter() - inicio_copia
+            linhas += len(lote)
+        fim_copia = time.perf_counter()
+
+        indices = _indices(conexao)
+        _criar_indices(conexao, indices)
+        conexao.exec_driver_sql(f"ANALYZE {STAGING}")
+        fim_indices = time.perf_counter()
+
+        # Hashes por fatura para a ingestão incremental (importado aqui: app.etl.incremental usa este módulo)
+        from app.etl.incremental import registrar_hashes
+
+        registrar_hashes(conexao, STAGING, criado_em)
+        _trocar(conexao, indices)
+        descartar_marcas(conexao)
+    fim = time.perf_counter()
+
+    return {
+        "linhas": linhas,
+        "indices": len(indices),
+        "created_at": criado_em,
+        # Só os comandos COPY; o restante de segundos_carga é a leitura (e o ETL) dos lotes
+        "segundos_copia": round(segundos_copia, 3),
+        "linhas_por_segundo_copia": round(linhas / segundos_copia) if segundos_copia else None,
+        "segundos_carga": round(fim_copia - inicio, 3),
+        "segundos_indices": round(fim_indices - fim_copia, 3),
+        "segundos_troca": round(fim - fim_indices, 3),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from app.etl.pipeline import PipelineETL
+
+    parser = argparse.ArgumentParser(prog="python -m app.etl.carga", description="Recarrega transactions_sample")
+    parser.add_argument("arquivo", help="Arquivo bruto ou, com --limpo, saída de python -m app.etl")
+    parser.add_argument("--limpo", action="store_true", help="O arquivo já está limpo: carrega sem rodar o ETL")
+    parser.add_argument("--lote", type=int, help="Linhas por lote e por COPY (padrão ETL_TAMANHO_LOTE)")
+    parser.add_argument("--formato-data", help="Formato de InvoiceDate no arquivo bruto")
+    parser.add_argument("--sem-categorias", action="store_true", help="Não classifica os produtos: CategoriaProduto fica 'Desconhecida'")
+    args = parser.parse_args()
+
+    if args.limpo:
+        pipeline = None
+        lotes = lotes_limpos(args.arquivo, args.lote or settings.ETL_TAMANHO_LOTE)
+    else:
+        pipeline = PipelineETL(args.arquivo, args.lote, not args.sem_categorias, args.formato_data)
+        lotes = pipeline.lotes()
+
+    resultado = carregar(lotes)
+    for chave, valor in (pipeline.estatisticas if pipeline else {}).items():
+        print(f"{chave}: {valor}")
+    for chave, valor in resultado.items():
+        print(f"{chave}: {valor}")
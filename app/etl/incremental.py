@@ -0,0 +1,373 @@
+"""
+Ingestão incremental em transactions_sample: só as faturas novas ou alteradas são gravadas.
+
+A unidade de alteração é a fatura. O conteúdo de cada fatura (CodigoProduto, Descricao,
+Quantidade, DataFatura, PrecoUnitario, IDCliente e Pais de todas as suas linhas) vira um
+hash md5 calculado no banco, guardado em ingestao_faturas. A cada ingestão os lotes vão
+por COPY para uma tabela temporária, os hashes são recalculados e comparados:
+
+- faturas com hash igual ao guardado são ignoradas, então reprocessar o mesmo arquivo não
+  muda nada (a ingestão é idempotente);
+- faturas alteradas têm as linhas atuais movidas para transacoes_removidas, com
+  removido_em, antes de as novas linhas serem inseridas;
+- FaturaUnica é recalculada para os clientes afetados: linhas antigas que mudam de valor
+  também são substituídas.
+
+Todas as linhas inseridas recebem o mesmo created_at e todas as removidas o mesmo
+removido_em: esse instante identifica o conjunto de alterações, registrado em
+alteracoes_transacoes com as contagens e as chaves afetadas (faturas, clientes, produtos,
+dias e países). Rollups, segmentos e cestas já avançam por marca d'água de created_at e
+descontam as linhas removidas depois da marca, então atualizam só o que mudou. Os rollups
+já construídos são atualizados ao fim de cada ingestão que muda alguma linha, para que as
+rotas não sirvam os agregados anteriores a ela; o cache de respostas muda de versão com o
+novo created_at. As ingestões são serializadas por um
+advisory lock, o que mantém os created_at crescentes; as atualizações de rollups,
+segmentos e cestas pegam o mesmo lock compartilhado (app.rollups.bloquear_ingestao).
+
+Marca d'água da origem (opcional): com --marca created_at só entram as faturas com alguma
+linha de created_at (da origem) acima do maior já visto; com --marca fatura, as de número
+(a parte numérica, sem o prefixo C das devoluções) acima do maior já visto. As marcas ficam
+no último registro de alteracoes_transacoes.
+
+O ETL (app.etl.pipeline) calcula os limites de outliers e FaturaUnica com os dados do
+arquivo recebido; FaturaUnica é corrigida aqui com a tabela inteira.
+
+Uso:
+    python -m app.etl.incremental novas_vendas.csv                 roda o ETL e ingere
+    python -m app.etl.incremental transacoes.parquet --limpo --marca fatura
+"""
+import time
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+from sqlalchemy import Connection, func, inspect, select, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.config.settings import get_settings
+from app.database import Base, SessionLocal, engine
+from app.etl.carga import copiar, criar_tabela
+from app.models import AlteracaoTransacoes, FaturaIngerida, TransacaoRemovida, Transaction
+from app.rollups import LOCK_INGESTAO, atualizar_rollups_construidos
+
+settings = get_settings()
+
+TABELA = Transaction.__tablename__
+LOTE = "ingestao_lote"
+ORIGEM_CARGA = "carga_completa"
+MARCAS = ("created_at", "fatura")
+
+# Colunas gravadas a partir dos lotes: id é preenchido pelo banco e created_at, pela ingestão
+COLUNAS = [c.name for c in Transaction.__table__.columns if c.name not in ("id", "created_at")]
+COLUNAS_CONTEUDO = ["CodigoProduto", "Descricao", "Quantidade", "DataFatura", "PrecoUnitario", "IDCliente", "Pais"]
+NUMERO_FATURA = "CAST(substring(\"NumeroFatura\" FROM '[0-9]+') AS BIGINT)"
+
+
+def _lista(colunas, prefixo: str = "") -> str:
+    return ", ".join(f'{prefixo}"{c}"' for c in colunas)
+
+
+def sql_hashes(tabela: str) -> str:
+    """Hash do conteúdo e número de linhas de cada fatura da tabela"""
+    linha = f"ROW({_lista(COLUNAS_CONTEUDO)})::text"
+    return (
+        f'SELECT "NumeroFatura", md5(string_agg({linha}, E\'\\n\' ORDER BY {linha})) AS hash, count(*) AS linhas '
+        f'FROM {tabela} WHERE "NumeroFatura" IS NOT NULL GROUP BY "NumeroFatura"'
+    )
+
+
+def criar_tabelas(conexao: Connection):
+    Base.metadata.create_all(
+        bind=conexao,
+        tables=[TransacaoRemovida.__table__, FaturaIngerida.__table__, AlteracaoTransacoes.__table__],
+    )
+
+
+def registrar_hashes(conexao: Connection, tabela: str, criado_em: str):
+    """
+    Recalcula ingestao_faturas com o conteúdo completo da tabela e descarta as linhas removidas
+    (usado pela carga completa, que substitui transactions_sample)
+    """
+    criar_tabelas(conexao)
+    conexao.execute(text(f"DELETE FROM {TransacaoRemovida.__tablename__}"))
+    conexao.execute(text(f"DELETE FROM {FaturaIngerida.__tablename__}"))
+    conexao.execute(text(
+        f'INSERT INTO {FaturaIngerida.__tablename__} ("NumeroFatura", hash, linhas, created_at) '
+        f"SELECT h.*, CAST(:criado_em AS timestamptz) FROM ({sql_hashes(tabela)}) h"
+    ), {"criado_em": criado_em})
+    # Conjunto de alterações sem chaves: tudo mudou. As marcas d'água da origem recomeçam
+    totais = conexao.execute(
+        select(func.count(), func.coalesce(func.sum(FaturaIngerida.linhas), 0))
+    ).one()
+    conexao.execute(AlteracaoTransacoes.__table__.insert(), {
+        "created_at": criado_em,
+        "origem": ORIGEM_CARGA,
+        "faturas_novas": totais[0],
+        "faturas_alteradas": 0,
+        "faturas_inalteradas": 0,
+        "linhas_inseridas": totais[1],
+        "linhas_removidas": None,
+        "marca_created_at": None,
+        "marca_fatura": None,
+        "chaves": None,
+    })
+
+
+def _aplicar_marca(conexao: Connection, marca: Optional[str], anterior) -> Dict:
+    """Descarta do lote as faturas já cobertas pela marca d'água e devolve as novas marcas"""
+    maximos = conexao.execute(text(
+        f"SELECT max(created_at) AS marca_created_at, max({NUMERO_FATURA}) AS marca_fatura FROM {LOTE}"
+    )).one()
+    marca_created_at = anterior.marca_created_at if anterior else None
+    marca_fatura = anterior.marca_fatura if anterior else None
+
+    if marca == "created_at":
+        if marca_created_at is not None:
+            # A fatura inteira entra quando qualquer linha dela é nova
+            conexao.execute(text(
+                f'DELETE FROM {LOTE} WHERE "NumeroFatura" NOT IN '
+                f'(SELECT "NumeroFatura" FROM {LOTE} WHERE created_at > :marca AND "NumeroFatura" IS NOT NULL)'
+            ), {"marca": marca_created_at})
+        marca_created_at = max(filter(None, [marca_created_at, maximos.marca_created_at]), default=None)
+    elif marca == "fatura":
+        if marca_fatura is not None:
+            conexao.execute(text(f"DELETE FROM {LOTE} WHERE {NUMERO_FATURA} <= :marca"), {"marca": marca_fatura})
+        marca_fatura = max(filter(lambda v: v is not None, [marca_fatura, maximos.marca_fatura]), default=None)
+    return {"marca_created_at": marca_created_at, "marca_fatura": marca_fatura}
+
+
+def _substituir_faturas(conexao: Connection, criado_em: str) -> Dict:
+    """
+    Move para transacoes_removidas as linhas atuais das faturas alteradas e insere as novas,
+    com FaturaUnica pelas faturas de cada cliente na tabela inteira (guardada em ingestao_clientes)
+    """
+    parametros = {"criado_em": criado_em}
+    removidas = conexao.execute(text(f"""
+        WITH removidas AS (
+            DELETE FROM {TABELA} t USING ingestao_alteradas a
+            WHERE t."NumeroFatura" = a."NumeroFatura"
+            RETURNING t.*
+        )
+        INSERT INTO {TransacaoRemovida.__tablename__} (removido_em, created_at, {_lista(COLUNAS)})
+        SELECT CAST(:criado_em AS timestamptz), created_at, {_lista(COLUNAS)} FROM removidas
+    """), parametros).rowcount
+
+    novas = f'{LOTE} l JOIN ingestao_alteradas a ON a."NumeroFatura" = l."NumeroFatura"'
+    conexao.execute(text(f"""
+        CREATE TEMPORARY TABLE ingestao_clientes ON COMMIT DROP AS
+        SELECT "IDCliente", count(DISTINCT "NumeroFatura") = 1 AS unica
+        FROM (
+            SELECT "IDCliente", "NumeroFatura" FROM {TABELA}
+            WHERE "IDCliente" IN (
+                SELECT l."IDCliente" FROM {novas}
+                UNION SELECT "IDCliente" FROM {TransacaoRemovida.__tablename__}
+                WHERE removido_em = CAST(:criado_em AS timestamptz)
+            )
+            UNION ALL
+            SELECT l."IDCliente", l."NumeroFatura" FROM {novas}
+        ) faturas
+        WHERE "IDCliente" IS NOT NULL
+        GROUP BY "IDCliente"
+    """), parametros)
+    conexao.exec_driver_sql("ANALYZE ingestao_clientes")
+
+    valores = ", ".join(
+        'COALESCE(c.unica, l."FaturaUnica")' if coluna == "FaturaUnica" else f'l."{coluna}"' for coluna in COLUNAS
+    )
+    inseridas = conexao.execute(text(f"""
+        INSERT INTO {TABELA} (created_at, {_lista(COLUNAS)})
+        SELECT CAST(:criado_em AS timestamptz), {valores}
+        FROM {novas} LEFT JOIN ingestao_clientes c ON c."IDCliente" = l."IDCliente"
+    """), parametros).rowcount
+    conexao.execute(text(f"""
+        INSERT INTO {FaturaIngerida.__tablename__} ("NumeroFatura", hash, linhas, created_at)
+        SELECT "NumeroFatura", hash, linhas, CAST(:criado_em AS timestamptz) FROM ingestao_alteradas
+        ON CONFLICT ("NumeroFatura") DO UPDATE
+        SET hash = excluded.hash, linhas = excluded.linhas, created_at = excluded.created_at
+    """), parametros)
+    return {"linhas_removidas": removidas, "linhas_inseridas": inseridas}
+
+
+def _corrigir_fatura_unica(conexao: Connection, criado_em: str) -> int:
+    """
+    Linhas anteriores dos clientes afetados cuja FaturaUnica mudou são substituídas como as
+    das faturas alteradas, para que quem já as contou as desconte. Returns: linhas substituídas
+    """
+    colunas = [c for c in COLUNAS if c != "FaturaUnica"]
+    return conexao.execute(text(f"""
+        WITH removidas AS (
+            DELETE FROM {TABELA} t USING ingestao_clientes c
+            WHERE t."IDCliente" = c."IDCliente" AND t.created_at IS DISTINCT FROM CAST(:criado_em AS timestamptz)
+              AND t."FaturaUnica" IS DISTINCT FROM c.unica
+            RETURNING t.*, c.unica
+        ),
+        lapides AS (
+            INSERT INTO {TransacaoRemovida.__tablename__} (removido_em, created_at, {_lista(COLUNAS)})
+            SELECT CAST(:criado_em AS timestamptz), created_at, {_lista(COLUNAS)} FROM removidas
+        )
+        INSERT INTO {TABELA} (created_at, "FaturaUnica", {_lista(colunas)})
+        SELECT CAST(:criado_em AS timestamptz), unica, {_lista(colunas)} FROM removidas
+    """), {"criado_em": criado_em}).rowcount
+
+
+def _chaves_afetadas(conexao: Connection, criado_em: str) -> Dict:
+    """Faturas, clientes, produtos, dias e países das linhas inseridas e removidas"""
+    colunas = '"NumeroFatura", "IDCliente", "CodigoProduto", CAST("DataFatura" AS DATE) AS dia, "Pais"'
+    linha = conexao.execute(text(f"""
+        SELECT
+            array_agg(DISTINCT "NumeroFatura") FILTER (WHERE "NumeroFatura" IS NOT NULL) AS faturas,
+            array_agg(DISTINCT "IDCliente") FILTER (WHERE "IDCliente" IS NOT NULL) AS clientes,
+            array_agg(DISTINCT "CodigoProduto") FILTER (WHERE "CodigoProduto" IS NOT NULL) AS produtos,
+            array_agg(DISTINCT dia) FILTER (WHERE dia IS NOT NULL) AS dias,
+            array_agg(DISTINCT "Pais") FILTER (WHERE "Pais" IS NOT NULL) AS paises
+        FROM (
+            SELECT {colunas} FROM {TABELA} WHERE created_at = CAST(:criado_em AS timestamptz)
+            UNION ALL
+            SELECT {colunas} FROM {TransacaoRemovida.__tablename__} WHERE removido_em = CAST(:criado_em AS timestamptz)
+        ) alteradas
+    """), {"criado_em": criado_em}).one()
+    return {
+        chave: [v.isoformat() if isinstance(v, date) else v for v in (valores or [])]
+        for chave, valores in linha._asdict().items()
+    }
+
+
+def _atualizar_rollups() -> Dict:
+    """
+    Leva a ingestão recém-gravada aos rollups, que as rotas leem no lugar da tabela base.
+    Roda depois do COMMIT: se falhar, as transações continuam gravadas e a próxima
+    atualização alcança a marca d'água
+    """
+    db = SessionLocal()
+    try:
+        return {"rollups": atualizar_rollups_construidos(db)}
+    except SQLAlchemyError as e:
+        db.rollback()
+        return {"rollups": None, "erro_rollups": str(e)}
+    finally:
+        db.close()
+
+
+def ingerir(lotes: Iterable[pd.DataFrame], origem: str, marca: Optional[str] = None) -> Dict:
+    """
+    Grava as faturas novas ou alteradas dos lotes e registra o conjunto de alterações
+    Args:
+        lotes: DataFrames com colunas de transactions_sample; created_at, se presente, é o da origem
+        origem: Descrição da origem (arquivo, rota), guardada no registro da alteração
+        marca: None, "created_at" ou "fatura": marca d'água da origem usada para descartar faturas já vistas
+    Returns: Dict com o id e o created_at da alteração (None quando nada mudou), as contagens,
+             as chaves afetadas e as linhas de cada rollup atualizado
+    """
+    if settings.BACKEND != "postgres":
+        raise RuntimeError("A ingestão incremental só está disponível no backend postgres")
+    if marca is not None and marca not in MARCAS:
+        raise ValueError(f"Marca desconhecida: {marca} (use {' ou '.join(MARCAS)})")
+
+    inicio = time.perf_counter()
+    with engine.begin() as conexao:
+        conexao.exec_driver_sql("SET LOCAL statement_timeout = 0")
+        conexao.execute(text("SELECT pg_advisory_xact_lock(:chave)"), {"chave": LOCK_INGESTAO})
+        if not inspect(conexao).has_table(TABELA):
+            criar_tabela(conexao)
+        criar_tabelas(conexao)
+        anterior = conexao.execute(
+            select(AlteracaoTransacoes).order_by(AlteracaoTransacoes.id.desc()).limit(1)
+        ).one_or_none()
+        # Depois do lock: cada ingestão tem created_at maior que o das anteriores
+        criado_em = datetime.now(timezone.utc).isoformat()
+
+        conexao.exec_driver_sql(f"CREATE TEMPORARY TABLE {LOTE} (LIKE {TABELA} INCLUDING DEFAULTS INCLUDING IDENTITY) ON COMMIT DROP")
+        cursor = conexao.connection.cursor()
+        recebidas = 0
+        for lote in lotes:
+            copiar(cursor, LOTE, lote)
+            recebidas += len(lote)
+        sem_fatura = conexao.execute(text(f'DELETE FROM {LOTE} WHERE "NumeroFatura" IS NULL')).rowcount
+        # Tabelas temporárias não passam pelo autovacuum: sem estatísticas o planejador erra os joins
+        conexao.exec_driver_sql(f"ANALYZE {LOTE}")
+        marcas = _aplicar_marca(conexao, marca, anterior)
+
+        conexao.execute(text(f"CREATE TEMPORARY TABLE ingestao_hashes ON COMMIT DROP AS {sql_hashes(LOTE)}"))
+        conexao.execute(text(f"""
+            CREATE TEMPORARY TABLE ingestao_alteradas ON COMMIT DROP AS
+            SELECT h.* FROM ingestao_hashes h
+            LEFT JOIN {FaturaIngerida.__tablename__} f ON f."NumeroFatura" = h."NumeroFatura"
+            WHERE f.hash IS DISTINCT FROM h.hash
+        """))
+        conexao.exec_driver_sql("ANALYZE ingestao_alteradas")
+        faturas = conexao.execute(text("SELECT count(*) FROM ingestao_hashes")).scalar()
+
+        resumo = {"origem": origem, "linhas_recebidas": recebidas, "linhas_sem_fatura": sem_fatura, **marcas}
+        resumo.update(_substituir_faturas(conexao, criado_em))
+        resumo["linhas_fatura_unica"] = _corrigir_fatura_unica(conexao, criado_em) if resumo["linhas_inseridas"] else 0
+
+        alteradas = conexao.execute(text(
+            f'SELECT count(DISTINCT "NumeroFatura") FROM {TransacaoRemovida.__tablename__} '
+            f"WHERE removido_em = CAST(:criado_em AS timestamptz) AND \"NumeroFatura\" IN "
+            f'(SELECT "NumeroFatura" FROM ingestao_alteradas)'
+        ), {"criado_em": criado_em}).scalar()
+        total_alteradas = conexao.execute(text("SELECT count(*) FROM ingestao_alteradas")).scalar()
+        resumo.update(
+            faturas_novas=total_alteradas - alteradas,
+            faturas_alteradas=alteradas,
+            faturas_inalteradas=faturas - total_alteradas,
+        )
+
+        mudou = resumo["linhas_inseridas"] or resumo["linhas_removidas"]
+        marcas_mudaram = anterior is None or (
+            (marcas["marca_created_at"], marcas["marca_fatura"]) != (anterior.marca_created_at, anterior.marca_fatura)
+        )
+        if mudou or (marca and marcas_mudaram):
+            chaves = _chaves_afetadas(conexao, criado_em) if mudou else {}
+            resumo["id"] = conexao.execute(
+                AlteracaoTransacoes.__table__.insert().returning(AlteracaoTransacoes.id),
+                {
+                    "created_at": criado_em,
+                    "origem": origem,
+                    "faturas_novas": resumo["faturas_novas"],
+                    "faturas_alteradas": resumo["faturas_alteradas"],
+                    "faturas_inalteradas": resumo["faturas_inalteradas"],
+                    "linhas_inseridas": resumo["linhas_inseridas"] + resumo["linhas_fatura_unica"],
+                    "linhas_removidas": resumo["linhas_removidas"] + resumo["linhas_fatura_unica"],
+                    **marcas,
+                    "chaves": chaves,
+                },
+            ).scalar()
+            resumo["created_at"] = criado_em
+            resumo["chaves"] = chaves
+        else:
+            resumo.update(id=None, created_at=None, chaves={})
+
+    if resumo["linhas_inseridas"] or resumo["linhas_removidas"]:
+        resumo.update(_atualizar_rollups())
+    resumo["segundos"] = round(time.perf_counter() - inicio, 3)
+    return resumo
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    from app.etl.carga import lotes_limpos
+    from app.etl.pipeline import PipelineETL
+
+    parser = argparse.ArgumentParser(prog="python -m app.etl.incremental", description="Ingere faturas novas ou alteradas")
+    parser.add_argument("arquivo", help="Arquivo bruto ou, com --limpo, já limpo (.parquet ou .csv)")
+    parser.add_argument("--limpo", action="store_true", help="O arquivo já está limpo: ingere sem rodar o ETL")
+    parser.add_argument("--marca", choices=MARCAS, help="Marca d'água da origem para pular faturas já vistas")
+    parser.add_argument("--lote", type=int, help="Linhas por lote e por COPY (padrão ETL_TAMANHO_LOTE)")
+    parser.add_argument("--formato-data", help="Formato de InvoiceDate no arquivo bruto")
+    parser.add_argument("--sem-categorias", action="store_true", help="Não classifica os produtos: CategoriaProduto fica 'Desconhecida'")
+    args = parser.parse_args()
+
+    if args.limpo:
+        lotes = lotes_limpos(args.arquivo, args.lote or settings.ETL_TAMANHO_LOTE)
+    else:
+        lotes = PipelineETL(args.arquivo, args.lote, not args.sem_categorias, args.formato_data).lotes()
+
+    resultado = ingerir(lotes, os.path.basename(args.arquivo), args.marca)
+    chaves = resultado.pop("chaves")
+    for chave, valor in resultado.items():
+        print(f"{chave}: {valor}")
+    for chave, valores in chaves.items():
+        print(f"{chave} afetados: {len(valores)}")
@@ -0,0 +1,89 @@
+"""
+Leitura do arquivo bruto (Online Retail) em lotes de linhas: CSV, Excel (.xlsx, lido em
+modo streaming pelo openpyxl) ou Parquet. Cada lote sai com as colunas renomeadas para o
+português e com tipos fixos, para que lotes diferentes tenham a mesma representação (e os
+mesmos hashes) para os mesmos valores.
+"""
+import itertools
+import os
+from typing import Iterator, Optional
+
+import pandas as pd
+
+# Colunas do arquivo original -> colunas de transactions_sample
+COLUNAS_ORIGEM = {
+    "InvoiceNo": "NumeroFatura",
+    "StockCode": "CodigoProduto",
+    "Description": "Descricao",
+    "Quantity": "Quantidade",
+    "InvoiceDate": "DataFatura",
+    "UnitPrice": "PrecoUnitario",
+    "CustomerID": "IDCliente",
+    "Country": "Pais",
+}
+COLUNAS_BRUTAS = list(COLUNAS_ORIGEM.values())
+COLUNAS_TEXTO = ["NumeroFatura", "CodigoProduto", "Descricao", "IDCliente", "Pais"]
+
+
+def _ler_csv(caminho: str, tamanho_lote: int) -> Iterator[pd.DataFrame]:
+    # Tudo como texto: os tipos são definidos em normalizar, iguais para todos os lotes
+    with pd.read_csv(caminho, encoding="ISO-8859-1", dtype=str, chunksize=tamanho_lote) as leitor:
+        yield from leitor
+
+
+def _ler_xlsx(caminho: str, tamanho_lote: int) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+
+    livro = load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        linhas = livro.active.iter_rows(values_only=True)
+        cabecalho = next(linhas, None)
+        while cabecalho:
+            bloco = list(itertools.islice(linhas, tamanho_lote))
+            if not bloco:
+                break
+            yield pd.DataFrame(bloco, columns=cabecalho)
+    finally:
+        livro.close()
+
+
+def _ler_parquet(caminho: str, tamanho_lote: int) -> Iterator[pd.DataFrame]:
+    import pyarrow.parquet as pq
+
+    for lote in pq.ParquetFile(caminho).iter_batches(batch_size=tamanho_lote):
+        yield lote.to_pandas()
+
+
+def ler_em_lotes(caminho: str, tamanho_lote: int) -> Iterator[pd.DataFrame]:
+    """Lotes de até tamanho_lote linhas do arquivo, pelo formato da extensão"""
+    nome = caminho.lower()
+    if nome.endswith((".xlsx", ".xlsm")):
+        return _ler_xlsx(caminho, tamanho_lote)
+    if nome.endswith(".parquet"):
+        return _ler_parquet(caminho, tamanho_lote)
+    if nome.endswith((".csv", ".csv.gz", ".txt")):
+        return _ler_csv(caminho, tamanho_lote)
+    raise ValueError(f"Formato não suportado: {os.path.basename(caminho)} (use .csv, .xlsx ou .parquet)")
+
+
+def normalizar(lote: pd.DataFrame, formato_data: Optional[str] = None) -> pd.DataFrame:
+    """
+    Colunas renomeadas e tipadas: textos como string (números viram seu texto, sem o ".0" dos
+    IDs lidos como float), Quantidade e PrecoUnitario numéricos e DataFatura datetime; valores
+    inválidos viram nulos
+    """
+    lote = lote.rename(columns=COLUNAS_ORIGEM)
+    faltantes = [c for c in COLUNAS_BRUTAS if c not in lote.columns]
+    if faltantes:
+        raise ValueError(f"Colunas ausentes no arquivo: {', '.join(faltantes)}")
+
+    saida = pd.DataFrame(index=lote.index)
+    for coluna in COLUNAS_BRUTAS:
+        if coluna in COLUNAS_TEXTO:
+            saida[coluna] = lote[coluna].astype("string")
+        elif coluna == "DataFatura":
+            saida[coluna] = pd.to_datetime(lote[coluna], format=formato_data, errors="coerce")
+        else:
+            saida[coluna] = pd.to_numeric(lote[coluna], errors="coerce").astype(float)
+    saida["IDCliente"] = saida["IDCliente"].str.replace(r"\.0$", "", regex=True)
+    return saida
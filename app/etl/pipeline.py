@@ -0,0 +1,181 @@
+"""
+Pipeline de limpeza do arquivo bruto em três passagens, com memória limitada pelo tamanho
+do lote e não pelo tamanho do arquivo:
+
+1. lê o arquivo bruto em lotes, descarta as linhas repetidas (inclusive entre lotes, pelo
+   conjunto de hashes), preenche IDCliente e Descricao, aplica o filtro de quantidade e
+   preço mínimos e alimenta os sketches de quantis: um de Quantidade e um de
+   PrecoUnitario para cada quantidade. As linhas que sobram vão para um Parquet
+   temporário, então o arquivo bruto (lento de ler quando é Excel) é lido uma só vez;
+2. com os limites do IQR da quantidade, os sketches de preço das quantidades dentro dos
+   limites são combinados para os limites do preço (o notebook calcula o IQR do preço
+   depois de remover os outliers de quantidade). O Parquet temporário é relido para
+   contar as faturas distintas de cada cliente nas linhas que passam nos filtros;
+3. o Parquet temporário é relido mais uma vez, filtrado e completado com as colunas
+   derivadas, em lotes com as colunas de transactions_sample.
+
+A memória que cresce com o arquivo é a dos hashes das linhas distintas (8 bytes por
+linha), dos sketches (limitados por max_valores) e da contagem de faturas por cliente.
+"""
+import os
+import shutil
+import tempfile
+from typing import Dict, Iterable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.config.settings import get_settings
+from app.etl.deduplicacao import ConjuntoHashes, hash_linhas
+from app.etl.leitura import ler_em_lotes, normalizar
+from app.etl.quantis import SketchQuantis
+from app.etl.transformacoes import (
+    ESQUEMA_BRUTO, ESQUEMA_SAIDA, derivar_colunas, filtro_base, filtro_outliers, limites_iqr, preencher,
+)
+
+settings = get_settings()
+
+
+class PipelineETL:
+    def __init__(
+        self,
+        entrada: str,
+        tamanho_lote: Optional[int] = None,
+        categorias: bool = True,
+        formato_data: Optional[str] = None,
+    ):
+        """
+        Args:
+            entrada: Arquivo bruto (.csv, .xlsx ou .parquet) com as colunas do Online Retail
+            tamanho_lote: Linhas por lote (padrão ETL_TAMANHO_LOTE)
+            categorias: Preenche CategoriaProduto com a versão atual de app.categorias, se houver
+            formato_data: Formato de InvoiceDate (strftime); sem ele o formato é inferido
+        """
+        self.entrada = entrada
+        self.tamanho_lote = tamanho_lote or settings.ETL_TAMANHO_LOTE
+        self.categorias = categorias
+        self.formato_data = formato_data
+        self.estatisticas: Dict = {}
+
+    def lotes(self) -> Iterator[pd.DataFrame]:
+        """Lotes limpos com as colunas de transactions_sample (sem created_at)"""
+        diretorio = tempfile.mkdtemp(prefix="etl_")
+        intermediario = os.path.join(diretorio, "limpas.parquet")
+        try:
+            sketch_quantidade, sketches_preco = self._limpar(intermediario)
+            self._calcular_limites(sketch_quantidade, sketches_preco)
+            faturas_por_cliente = self._contar_faturas(intermediario)
+            yield from self._derivar(intermediario, faturas_por_cliente)
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+    def _limpar(self, intermediario: str):
+        """Primeira passagem: deduplicação, preenchimento, filtro base e sketches"""
+        vistas = ConjuntoHashes()
+        sketch_quantidade = SketchQuantis()
+        sketches_preco: Dict[float, SketchQuantis] = {}
+        lidas = filtradas = 0
+
+        with pq.ParquetWriter(intermediario, ESQUEMA_BRUTO) as escritor:
+            for bruto in ler_em_lotes(self.entrada, self.tamanho_lote):
+                lidas += len(bruto)
+                lote = normalizar(bruto, self.formato_data)
+                lote = lote[vistas.novos(hash_linhas(lote))]
+                lote = preencher(lote)
+                lote = lote[filtro_base(lote)]
+                filtradas += len(lote)
+
+                quantidades = lote["Quantidade"].to_numpy()
+                sketch_quantidade.adicionar(quantidades)
+                # Um sketch de preço por quantidade: um grupo de linhas por valor distinto, não por linha
+                precos = lote["PrecoUnitario"].to_numpy()
+                ordem = np.argsort(quantidades, kind="stable")
+                valores, inicios = np.unique(quantidades[ordem], return_index=True)
+                for valor, grupo in zip(valores, np.split(precos[ordem], inicios[1:])):
+                    sketches_preco.setdefault(valor, SketchQuantis()).adicionar(grupo)
+
+                escritor.write_table(pa.Table.from_pandas(lote, schema=ESQUEMA_BRUTO, preserve_index=False))
+
+        self.estatisticas.update(
+            linhas_lidas=lidas,
+            linhas_duplicadas=lidas - len(vistas),
+            linhas_filtro_base=len(vistas) - filtradas,
+        )
+        return sketch_quantidade, sketches_preco
+
+    def _calcular_limites(self, sketch_quantidade: SketchQuantis, sketches_preco: Dict[float, SketchQuantis]):
+        self.limites_quantidade = limites_iqr(sketch_quantidade)
+        sketch_preco = SketchQuantis()
+        inferior, superior = self.limites_quantidade
+        for quantidade, sketch in sketches_preco.items():
+            if inferior <= quantidade <= superior:
+                sketch_preco.mesclar(sketch)
+        self.limites_preco = limites_iqr(sketch_preco)
+        self.estatisticas.update(
+            limites_quantidade=self.limites_quantidade,
+            limites_preco=self.limites_preco,
+            quantis_exatos=sketch_quantidade.exato and sketch_preco.exato,
+        )
+
+    def _reler(self, intermediario: str) -> Iterator[pd.DataFrame]:
+        for lote in pq.ParquetFile(intermediario).iter_batches(batch_size=self.tamanho_lote):
+            lote = lote.to_pandas()
+            yield lote[filtro_outliers(lote, self.limites_quantidade, self.limites_preco)]
+
+    def _contar_faturas(self, intermediario: str) -> pd.Series:
+        """Segunda passagem: faturas distintas por cliente nas linhas que ficam"""
+        pares_vistos = ConjuntoHashes()
+        faturas_por_cliente = pd.Series(dtype=float)
+        for lote in self._reler(intermediario):
+            pares = lote.loc[lote["NumeroFatura"].notna(), ["IDCliente", "NumeroFatura"]]
+            novos = pares["IDCliente"][pares_vistos.novos(hash_linhas(pares))]
+            faturas_por_cliente = faturas_por_cliente.add(novos.value_counts(), fill_value=0)
+        self.estatisticas["clientes"] = len(faturas_por_cliente)
+        return faturas_por_cliente
+
+    def _categorizar(self, lote: pd.DataFrame):
+        if not self.categorias:
+            return None
+        from app import categorias
+
+        try:
+            resultado = categorias.classificar(lote["CodigoProduto"].tolist(), lote["Descricao"].tolist())
+        except FileNotFoundError:
+            # Sem pipeline treinado: CategoriaProduto recebe CATEGORIA_DESCONHECIDA
+            self.categorias = False
+            self.estatisticas["versao_categorias"] = None
+            return None
+        self.estatisticas["versao_categorias"] = resultado["versao"]
+        return resultado["categorias"]
+
+    def _derivar(self, intermediario: str, faturas_por_cliente: pd.Series) -> Iterator[pd.DataFrame]:
+        """Terceira passagem: filtros de outliers e colunas derivadas"""
+        saida = 0
+        for lote in self._reler(intermediario):
+            if lote.empty:
+                continue
+            saida += len(lote)
+            yield derivar_colunas(lote, faturas_por_cliente, self._categorizar(lote))
+        self.estatisticas["linhas_outliers"] = (
+            self.estatisticas["linhas_lidas"] - self.estatisticas["linhas_duplicadas"]
+            - self.estatisticas["linhas_filtro_base"] - saida
+        )
+        self.estatisticas["linhas_saida"] = saida
+
+
+def gravar(lotes: Iterable[pd.DataFrame], caminho: str) -> int:
+    """Grava os lotes em Parquet ou CSV (pela extensão) à medida que são gerados; devolve as linhas gravadas"""
+    linhas = 0
+    if caminho.lower().endswith(".parquet"):
+        with pq.ParquetWriter(caminho, ESQUEMA_SAIDA) as escritor:
+            for lote in lotes:
+                escritor.write_table(pa.Table.from_pandas(lote, schema=ESQUEMA_SAIDA, preserve_index=False))
+                linhas += len(lote)
+    else:
+        with open(caminho, "w", newline="", encoding="utf-8") as arquivo:
+            for lote in lotes:
+                lote.to_csv(arquivo, index=False, header=linhas == 0)
+                linhas += len(lote)
+    return linhas
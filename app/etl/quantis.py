@@ -0,0 +1,86 @@
+"""
+Quantis de uma coluna lida em lotes, sem guardar os valores.
+
+Enquanto a coluna tem até max_valores valores distintos (quantidades inteiras e preços com
+duas casas, no caso das transações) o sketch é um histograma exato e os quantis são os
+mesmos de pandas.Series.quantile (interpolação linear). Acima disso os valores passam a
+ser agrupados em faixas logarítmicas de largura relativa erro_relativo, como no DDSketch:
+a memória fica limitada pela amplitude dos valores e cada quantil tem erro relativo de no
+máximo erro_relativo.
+
+Sketches da mesma coluna se combinam com mesclar, o que permite guardar um por grupo e
+calcular depois o quantil de qualquer união de grupos.
+"""
+import math
+from typing import Iterable
+
+import numpy as np
+
+
+class SketchQuantis:
+    def __init__(self, max_valores: int = 10000, erro_relativo: float = 0.005):
+        self.max_valores = max_valores
+        self.erro_relativo = erro_relativo
+        self._log_gama = math.log((1 + erro_relativo) / (1 - erro_relativo))
+        self.exato = True
+        self._valores = np.empty(0, dtype=float)
+        self._contagens = np.empty(0, dtype=np.int64)
+
+    @property
+    def total(self) -> int:
+        return int(self._contagens.sum())
+
+    def _agrupar(self, valores: np.ndarray) -> np.ndarray:
+        """Representante da faixa logarítmica de cada valor (o centro da faixa; zero fica exato)"""
+        modulo = np.abs(valores)
+        representantes = np.zeros_like(valores, dtype=float)
+        positivos = modulo > 0
+        faixa = np.ceil(np.log(modulo[positivos]) / self._log_gama)
+        gama = math.exp(self._log_gama)
+        representantes[positivos] = np.sign(valores[positivos]) * 2 * np.exp(faixa * self._log_gama) / (gama + 1)
+        return representantes
+
+    def _somar(self, valores: np.ndarray, contagens: np.ndarray):
+        unicos, posicoes = np.unique(np.concatenate([self._valores, valores]), return_inverse=True)
+        self._contagens = np.bincount(
+            posicoes, weights=np.concatenate([self._contagens, contagens]), minlength=len(unicos)
+        ).astype(np.int64)
+        self._valores = unicos
+        if self.exato and len(self._valores) > self.max_valores:
+            self._compactar()
+
+    def _compactar(self):
+        self.exato = False
+        valores, contagens = self._valores, self._contagens
+        self._valores = np.empty(0, dtype=float)
+        self._contagens = np.empty(0, dtype=np.int64)
+        self._somar(self._agrupar(valores), contagens)
+
+    def adicionar(self, valores: Iterable[float]):
+        valores = np.asarray(valores, dtype=float)
+        valores = valores[~np.isnan(valores)]
+        if not len(valores):
+            return
+        if not self.exato:
+            valores = self._agrupar(valores)
+        unicos, contagens = np.unique(valores, return_counts=True)
+        self._somar(unicos, contagens)
+
+    def mesclar(self, outro: "SketchQuantis"):
+        valores, contagens = outro._valores, outro._contagens
+        if not outro.exato and self.exato:
+            self._compactar()
+        elif outro.exato and not self.exato:
+            valores = self._agrupar(valores)
+        self._somar(valores, contagens)
+
+    def quantil(self, q: float) -> float:
+        """Quantil q (0 a 1) com interpolação linear entre as estatísticas de ordem vizinhas"""
+        total = self.total
+        if not total:
+            return float("nan")
+        posicao = q * (total - 1)
+        anterior, seguinte = math.floor(posicao), math.ceil(posicao)
+        acumuladas = np.cumsum(self._contagens)
+        v_anterior, v_seguinte = self._valores[np.searchsorted(acumuladas, [anterior, seguinte], side="right")]
+        return float(v_anterior + (v_seguinte - v_anterior) * (posicao - anterior))
@@ -0,0 +1,122 @@
+"""
+Transformações do notebook de EDA aplicadas a um lote inteiro por vez, com operações
+vetorizadas do pandas/numpy (sem apply por linha).
+"""
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from app.etl.quantis import SketchQuantis
+
+QUARTIS = (0.25, 0.75)
+FATOR_IQR = 1.5
+QUANTIDADE_MINIMA = 1
+PRECO_MINIMO = 0.10
+# CategoriaProduto das linhas sem categoria (sem pipeline treinado ou com --sem-categorias):
+# a coluna faz parte da chave de rollup_vendas_diarias e não pode ficar nula
+CATEGORIA_DESCONHECIDA = "Desconhecida"
+
+# Lotes já limpos guardados entre as passagens (colunas do arquivo bruto)
+ESQUEMA_BRUTO = pa.schema([
+    ("NumeroFatura", pa.string()),
+    ("CodigoProduto", pa.string()),
+    ("Descricao", pa.string()),
+    ("Quantidade", pa.float64()),
+    ("DataFatura", pa.timestamp("us")),
+    ("PrecoUnitario", pa.float64()),
+    ("IDCliente", pa.string()),
+    ("Pais", pa.string()),
+])
+
+# Colunas de transactions_sample (sem created_at, preenchida na carga); Numeric como double,
+# como nos Parquet lidos pelo backend DuckDB
+ESQUEMA_SAIDA = pa.schema([
+    ("NumeroFatura", pa.string()),
+    ("CodigoProduto", pa.string()),
+    ("Descricao", pa.string()),
+    ("Quantidade", pa.int64()),
+    ("DataFatura", pa.timestamp("us")),
+    ("PrecoUnitario", pa.float64()),
+    ("IDCliente", pa.string()),
+    ("Pais", pa.string()),
+    ("CategoriaProduto", pa.string()),
+    ("CategoriaPreco", pa.string()),
+    ("ValorTotalFatura", pa.float64()),
+    ("FaturaUnica", pa.bool_()),
+    ("Ano", pa.int64()),
+    ("Mes", pa.int64()),
+    ("Dia", pa.int64()),
+    ("DiaSemana", pa.int64()),
+    ("SemanaAno", pa.int64()),
+])
+COLUNAS_SAIDA = ESQUEMA_SAIDA.names
+
+
+def preencher(lote: pd.DataFrame) -> pd.DataFrame:
+    """IDCliente nulo vira 'Desconhecido' e Descricao nula, o CodigoProduto"""
+    return lote.assign(
+        IDCliente=lote["IDCliente"].fillna("Desconhecido"),
+        Descricao=lote["Descricao"].fillna(lote["CodigoProduto"]),
+    )
+
+
+def filtro_base(lote: pd.DataFrame) -> pd.Series:
+    """Linhas com ao menos uma unidade e preço acima de PRECO_MINIMO"""
+    return (lote["Quantidade"] >= QUANTIDADE_MINIMA) & (lote["PrecoUnitario"] > PRECO_MINIMO)
+
+
+def limites_iqr(sketch: SketchQuantis) -> Tuple[float, float]:
+    """Q1 - 1,5·IQR e Q3 + 1,5·IQR pelos quartis do sketch"""
+    q1, q3 = (sketch.quantil(q) for q in QUARTIS)
+    iqr = q3 - q1
+    return q1 - FATOR_IQR * iqr, q3 + FATOR_IQR * iqr
+
+
+def filtro_outliers(
+    lote: pd.DataFrame, limites_quantidade: Tuple[float, float], limites_preco: Tuple[float, float]
+) -> pd.Series:
+    """Quantidade e preço dentro dos limites do IQR (Q1 - 1,5·IQR a Q3 + 1,5·IQR), nas linhas que passaram por filtro_base"""
+    return lote["Quantidade"].between(*limites_quantidade) & lote["PrecoUnitario"].between(*limites_preco)
+
+
+def categorizar_preco(precos: pd.Series) -> pd.Series:
+    """Barato até 5, Moderado até 20 e Caro acima (ou sem preço)"""
+    return pd.Series(
+        np.select([precos <= 5, precos <= 20], ["Barato", "Moderado"], "Caro"),
+        index=precos.index,
+    )
+
+
+def derivar_colunas(
+    lote: pd.DataFrame, faturas_por_cliente: pd.Series, categorias: Optional[Sequence[Optional[str]]] = None
+) -> pd.DataFrame:
+    """
+    Colunas de transactions_sample a partir de um lote limpo
+    Args:
+        lote: Linhas já filtradas, com as colunas do arquivo bruto
+        faturas_por_cliente: Faturas distintas de cada IDCliente na base inteira (para FaturaUnica)
+        categorias: CategoriaProduto de cada linha, quando há pipeline de categorias; as que
+                    faltam (e todas, sem categorias) recebem CATEGORIA_DESCONHECIDA
+    """
+    datas = lote["DataFatura"]
+    # A faixa de preço usa o preço antes do arredondamento, como no notebook
+    preco = lote["PrecoUnitario"]
+    saida = lote.assign(
+        Quantidade=lote["Quantidade"].astype("Int64"),
+        PrecoUnitario=preco.fillna(0).round(2),
+        CategoriaProduto=(
+            pd.Series(categorias, index=lote.index, dtype=object).fillna(CATEGORIA_DESCONHECIDA)
+            if categorias is not None else CATEGORIA_DESCONHECIDA
+        ),
+        CategoriaPreco=categorizar_preco(preco),
+        FaturaUnica=lote["IDCliente"].map(faturas_por_cliente).eq(1),
+        Ano=datas.dt.year.astype("Int64"),
+        Mes=datas.dt.month.astype("Int64"),
+        Dia=datas.dt.day.astype("Int64"),
+        DiaSemana=datas.dt.weekday.astype("Int64"),
+        SemanaAno=datas.dt.isocalendar().week.astype("Int64"),
+    )
+    saida["ValorTotalFatura"] = (saida["Quantidade"].astype(float) * saida["PrecoUnitario"]).round(2)
+    return saida[COLUNAS_SAIDA]
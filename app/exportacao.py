@@ -0,0 +1,145 @@
+"""
+Exportação em streaming das linhas de transactions_sample (CSV, NDJSON ou Parquet).
+
+As linhas são lidas por um cursor do lado do servidor em lotes de tamanho fixo e cada
+lote é convertido e enviado antes do próximo ser lido, então a memória usada depende
+do tamanho do lote e não do total exportado. No Parquet cada lote vira um row group.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import AsyncIterator, List
+
+from sqlalchemy import BigInteger, Boolean, DateTime, Numeric, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.filtros import FiltrosAnalise
+from app.models import Transaction
+from app.rollups import BASE
+
+FORMATOS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+COLUNAS = list(Transaction.__table__.columns)
+
+
+def _valor_json(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+async def _lotes(db: AsyncSession, filtros: FiltrosAnalise, tamanho_lote: int) -> AsyncIterator[List]:
+    consulta = (
+        select(*COLUNAS)
+        .where(*filtros.condicoes(BASE))
+        .execution_options(yield_per=tamanho_lote)
+    )
+    resultado = await db.stream(consulta)
+    async for lote in resultado.partitions(tamanho_lote):
+        yield lote
+
+
+async def exportar_csv(db: AsyncSession, filtros: FiltrosAnalise, tamanho_lote: int) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow([c.name for c in COLUNAS])
+    async for lote in _lotes(db, filtros, tamanho_lote):
+        escritor.writerows(lote)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def exportar_ndjson(db: AsyncSession, filtros: FiltrosAnalise, tamanho_lote: int) -> AsyncIterator[bytes]:
+    nomes = [c.name for c in COLUNAS]
+    async for lote in _lotes(db, filtros, tamanho_lote):
+        yield "".join(
+            json.dumps(dict(zip(nomes, map(_valor_json, linha))), ensure_ascii=False) + "\n"
+            for linha in lote
+        ).encode("utf-8")
+
+
+class _SaidaIncremental:
+    """Arquivo só de escrita que entrega os bytes já gravados pelo ParquetWriter a cada lote"""
+
+    def __init__(self):
+        self._partes = []
+        self._posicao = 0
+        self.closed = False
+
+    def write(self, dados) -> int:
+        dados = bytes(dados)
+        self._partes.append(dados)
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self) -> int:
+        return self._posicao
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def retirar(self) -> bytes:
+        dados = b"".join(self._partes)
+        self._partes = []
+        return dados
+
+
+def _schema_arrow(pa):
+    tipos = []
+    for coluna in COLUNAS:
+        if isinstance(coluna.type, BigInteger):
+            tipo = pa.int64()
+        elif isinstance(coluna.type, Numeric):
+            tipo = pa.float64()
+        elif isinstance(coluna.type, Boolean):
+            tipo = pa.bool_()
+        elif isinstance(coluna.type, DateTime):
+            tipo = pa.timestamp("us", tz="UTC" if coluna.type.timezone else None)
+        else:
+            tipo = pa.string()
+        tipos.append(pa.field(coluna.name, tipo))
+    return pa.schema(tipos)
+
+
+async def exportar_parquet(db: AsyncSession, filtros: FiltrosAnalise, tamanho_lote: int) -> AsyncIterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _schema_arrow(pa)
+    saida = _SaidaIncremental()
+    escritor = pq.ParquetWriter(saida, schema, compression="snappy")
+    async for lote in _lotes(db, filtros, tamanho_lote):
+        colunas = list(zip(*lote))
+        tabela = pa.Table.from_arrays(
+            [
+                pa.array([float(v) if v is not None else None for v in valores], type=campo.type)
+                if pa.types.is_floating(campo.type) else pa.array(valores, type=campo.type)
+                for valores, campo in zip(colunas, schema)
+            ],
+            schema=schema,
+        )
+        escritor.write_table(tabela)
+        yield saida.retirar()
+    escritor.close()
+    yield saida.retirar()
+
+
+EXPORTADORES = {
+    "csv": exportar_csv,
+    "ndjson": exportar_ndjson,
+    "parquet": exportar_parquet,
+}
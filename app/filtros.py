@@ -0,0 +1,91 @@
+"""
+Filtros comuns às rotas de análise (período, países, categoria de produto e faixa de preço).
+
+Os predicados são aplicados diretamente nas colunas indexadas, sem funções sobre elas:
+o período vira um intervalo semiaberto em DataFatura (ou em Dia, nos rollups diários).
+"""
+from datetime import date, datetime, time, timedelta
+from typing import List, Literal, Optional
+
+from fastapi import Query
+
+
+class FiltrosAnalise:
+    def __init__(
+        self,
+        data_inicio: Optional[date] = None,
+        data_fim: Optional[date] = None,
+        paises: Optional[List[str]] = None,
+        categorias: Optional[List[str]] = None,
+        faixas_preco: Optional[List[str]] = None,
+        aproximado: bool = False,
+        granularidade: str = 'day',
+    ):
+        self.data_inicio = data_inicio
+        self.data_fim = data_fim
+        self.paises = paises or []
+        self.categorias = categorias or []
+        self.faixas_preco = faixas_preco or []
+        # Contagens de clientes distintos por esboços HyperLogLog (ver app.hll)
+        self.aproximado = aproximado
+        # Tamanho dos intervalos das séries temporais: hour, day, week ou month
+        self.granularidade = granularidade
+
+    def dimensoes(self) -> List[str]:
+        """Dimensões que a fonte precisa ter para aplicar estes filtros"""
+        dimensoes = []
+        if self.data_inicio or self.data_fim:
+            dimensoes.append('Dia')
+        if self.paises:
+            dimensoes.append('Pais')
+        if self.categorias:
+            dimensoes.append('CategoriaProduto')
+        if self.faixas_preco:
+            dimensoes.append('CategoriaPreco')
+        return dimensoes
+
+    def condicoes(self, fonte) -> list:
+        """Predicados sobre as colunas da fonte escolhida"""
+        condicoes = []
+        if self.data_inicio or self.data_fim:
+            if 'DataFatura' in fonte.dimensoes:
+                coluna = fonte.dimensao('DataFatura')
+                if self.data_inicio:
+                    condicoes.append(coluna >= datetime.combine(self.data_inicio, time.min))
+                if self.data_fim:
+                    condicoes.append(coluna < datetime.combine(self.data_fim + timedelta(days=1), time.min))
+            else:
+                coluna = fonte.dimensao('Dia')
+                if self.data_inicio:
+                    condicoes.append(coluna >= self.data_inicio)
+                if self.data_fim:
+                    condicoes.append(coluna <= self.data_fim)
+        if self.paises:
+            condicoes.append(fonte.dimensao('Pais').in_(self.paises))
+        if self.categorias:
+            condicoes.append(fonte.dimensao('CategoriaProduto').in_(self.categorias))
+        if self.faixas_preco:
+            condicoes.append(fonte.dimensao('CategoriaPreco').in_(self.faixas_preco))
+        return condicoes
+
+
+def filtros_analise(
+    data_inicio: Optional[date] = Query(None, description="Data inicial (YYYY-MM-DD), inclusiva"),
+    data_fim: Optional[date] = Query(None, description="Data final (YYYY-MM-DD), inclusiva"),
+    pais: Optional[List[str]] = Query(None, description="Um ou mais países"),
+    categoria: Optional[List[str]] = Query(None, description="Uma ou mais categorias de produto"),
+    faixa_preco: Optional[List[str]] = Query(None, description="Uma ou mais categorias de preço"),
+    approx: bool = Query(
+        False,
+        description="Clientes distintos estimados por HyperLogLog (erro padrão de ~1,6%); "
+                    "vale para filtros de período e país, nas rotas que contam clientes. "
+                    "No backend duckdb a contagem é sempre exata",
+    ),
+    granularity: Literal['hour', 'day', 'week', 'month'] = Query(
+        'day',
+        description="Intervalo da série de faturamento, truncado no banco; "
+                    "day, week e month são lidos do rollup diário",
+    ),
+) -> FiltrosAnalise:
+    """Dependency que lê os filtros da query string"""
+    return FiltrosAnalise(data_inicio, data_fim, pais, categoria, faixa_preco, approx, granularity)
@@ -0,0 +1,57 @@
+"""
+HyperLogLog para contagens aproximadas de clientes distintos.
+
+Cada cliente é levado por um hash de 64 bits a um de M = 2^P registradores; o registrador
+guarda o maior "posto" (posição do primeiro bit 1 no restante do hash) visto. Esboços de
+dias e países diferentes se combinam pelo máximo de cada registrador, então a contagem de
+qualquer período ou conjunto de países sai da combinação dos esboços diários, sem reler
+as transações.
+
+Limites de erro com P = 12 (4096 registradores):
+- erro padrão relativo de 1,04 / sqrt(M) ≈ 1,6%: ~68% das estimativas ficam a até 1,6% do
+  valor exato, ~95% a até 3,3% e ~99,7% a até 4,9%;
+- até 2,5 * M (10.240) clientes é usada a contagem linear (M * ln(M / registradores
+  vazios)). Ela erra menos em contagens pequenas, mas não é exata: dois clientes cujos
+  hashes caem no mesmo registrador contam como um. Com 23 clientes a chance de alguma
+  colisão é de ~6% (23² / 2M), e a estimativa sai 22.
+"""
+import math
+
+from sqlalchemy import BigInteger, Integer, Text, case, cast, func, literal
+from sqlalchemy.dialects.postgresql import BIT
+
+P = 12
+M = 1 << P
+ERRO_PADRAO_RELATIVO = 1.04 / math.sqrt(M)
+
+_ALFA = 0.7213 / (1 + 1.079 / M)
+
+
+def _hash(coluna):
+    return func.hashtextextended(coluna, literal(0, BigInteger))
+
+
+def registrador(coluna):
+    """Índice do registrador: os P bits mais altos do hash"""
+    return cast(_hash(coluna).op(">>")(64 - P).op("&")(M - 1), Integer)
+
+
+def posto(coluna):
+    """Posição (a partir de 1) do primeiro bit 1 nos 64 - P bits restantes do hash"""
+    bits = cast(cast(_hash(coluna).op("<<")(P), BIT(64)), Text)
+    posicao = func.strpos(bits, "1")
+    return case((posicao == 0, 64 - P + 1), else_=posicao)
+
+
+def estimar(ocupados: int, soma_ocupados: float) -> int:
+    """
+    Estimativa de cardinalidade a partir dos registradores combinados
+    Args:
+        ocupados: Número de registradores com valor > 0
+        soma_ocupados: Soma de 2^-valor sobre os registradores ocupados
+    """
+    vazios = M - ocupados
+    estimativa = _ALFA * M * M / (soma_ocupados + vazios)
+    if estimativa <= 2.5 * M and vazios > 0:
+        estimativa = M * math.log(M / vazios)
+    return round(estimativa)
@@ -0,0 +1,211 @@
+"""
+Ingestão de transações enviadas pela API (POST /transacoes/ingerir) em JSON, NDJSON ou Arrow.
+
+O corpo vira um DataFrame de uma vez: JSON e NDJSON são decodificados pelo orjson numa
+única chamada (NDJSON como um array com as linhas) e Arrow IPC é lido direto pelo pyarrow.
+As colunas aceitas são as de transactions_sample ou as do arquivo original (InvoiceNo,
+StockCode...).
+
+A validação é feita por coluna, com máscaras do pandas/numpy para cada motivo de rejeição,
+sem um objeto por linha; os motivos só são montados para as linhas rejeitadas. As linhas
+válidas passam pelas mesmas transformações do ETL (app.etl.transformacoes): preenchimento
+de IDCliente e Descricao, CategoriaPreco, ValorTotalFatura e Ano/Mes/Dia/DiaSemana/SemanaAno
+calculados para o lote inteiro. O filtro de outliers do ETL depende do arquivo inteiro e
+não se aplica aqui.
+
+A gravação usa a ingestão incremental (app.etl.incremental): cada fatura enviada substitui a
+gravada, então a requisição deve trazer todas as linhas de cada fatura, e reenviar a mesma
+requisição não altera nada. Uma fatura com alguma linha inválida é rejeitada inteira, para
+não substituir a gravada por uma parte dela; linhas abaixo da quantidade ou do preço mínimo
+e linhas repetidas são descartadas como no ETL, sem rejeitar a fatura.
+"""
+import io
+from typing import Dict, List, Optional
+
+import numpy as np
+import orjson
+import pandas as pd
+
+from app.arrow import MIDIA_ARROW
+from app.etl.deduplicacao import ConjuntoHashes, hash_linhas
+from app.etl.leitura import COLUNAS_BRUTAS, COLUNAS_ORIGEM, normalizar
+from app.etl.transformacoes import PRECO_MINIMO, QUANTIDADE_MINIMA, derivar_colunas, preencher
+
+FORMATOS = {
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    MIDIA_ARROW: "arrow",
+}
+OBRIGATORIAS = ["NumeroFatura", "CodigoProduto", "Quantidade", "DataFatura", "PrecoUnitario", "Pais"]
+
+# Motivos que invalidam a linha e rejeitam a fatura inteira
+MOTIVOS_FATURA = [
+    "codigo_produto_ausente",
+    "pais_ausente",
+    "quantidade_invalida",
+    "preco_invalido",
+    "data_invalida",
+]
+FATURA_REJEITADA = "fatura_com_linha_invalida"
+
+
+def formato(content_type: Optional[str]) -> str:
+    """Formato do corpo pelo Content-Type (JSON quando ausente)"""
+    midia = (content_type or "application/json").split(";")[0].strip().lower()
+    if midia not in FORMATOS:
+        raise ValueError(f"Content-Type não suportado: {midia} (use {', '.join(FORMATOS)})")
+    return FORMATOS[midia]
+
+
+def ler_corpo(corpo: bytes, tipo: str) -> pd.DataFrame:
+    """
+    Args:
+        corpo: JSON (lista de linhas, objeto {"transacoes": [...]} ou objeto de colunas),
+               NDJSON (uma linha por transação) ou Arrow IPC em formato stream
+        tipo: "json", "ndjson" ou "arrow"
+    """
+    if tipo == "arrow":
+        import pyarrow as pa
+
+        return pa.ipc.open_stream(io.BytesIO(corpo)).read_all().to_pandas()
+    if tipo == "ndjson":
+        dados = orjson.loads(b"[" + b",".join(l for l in corpo.splitlines() if l.strip()) + b"]")
+    else:
+        dados = orjson.loads(corpo)
+        if isinstance(dados, dict) and "transacoes" in dados:
+            dados = dados["transacoes"]
+    return pd.DataFrame(dados)
+
+
+def _preparar(bruto: pd.DataFrame) -> pd.DataFrame:
+    """Colunas do arquivo original renomeadas, opcionais ausentes nulas e tipos do ETL"""
+    bruto = bruto.rename(columns=COLUNAS_ORIGEM)
+    faltantes = [c for c in OBRIGATORIAS if c not in bruto.columns]
+    if faltantes:
+        raise ValueError(f"Colunas obrigatórias ausentes: {', '.join(faltantes)}")
+    bruto = bruto.assign(**{c: None for c in COLUNAS_BRUTAS if c not in bruto.columns}).reset_index(drop=True)
+    # ISO 8601; datas com fuso são convertidas para UTC e gravadas sem o fuso, como DataFatura
+    bruto["DataFatura"] = pd.to_datetime(bruto["DataFatura"], format="ISO8601", utc=True, errors="coerce").dt.tz_localize(None)
+    lote = normalizar(bruto)
+    if "CategoriaProduto" in bruto.columns:
+        # Categoria em branco conta como não enviada
+        categorias = bruto["CategoriaProduto"].astype("string").str.strip()
+        lote["CategoriaProduto"] = categorias.mask(categorias == "").to_numpy()
+    return lote
+
+
+def _ausente(coluna: pd.Series) -> np.ndarray:
+    return (coluna.isna() | (coluna.str.strip() == "")).to_numpy(dtype=bool, na_value=True)
+
+
+def validar(lote: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Máscara das linhas rejeitadas por cada motivo"""
+    quantidade = lote["Quantidade"].to_numpy(dtype=float, na_value=np.nan)
+    preco = lote["PrecoUnitario"].to_numpy(dtype=float, na_value=np.nan)
+    numero_ausente = _ausente(lote["NumeroFatura"])
+    motivos = {
+        "numero_fatura_ausente": numero_ausente,
+        "codigo_produto_ausente": _ausente(lote["CodigoProduto"]),
+        "pais_ausente": _ausente(lote["Pais"]),
+        "quantidade_invalida": ~np.isfinite(quantidade) | (np.round(quantidade) != quantidade),
+        "preco_invalido": ~np.isfinite(preco) | (preco < 0),
+        "data_invalida": lote["DataFatura"].isna().to_numpy(),
+    }
+    invalidas = np.logical_or.reduce([motivos[m] for m in MOTIVOS_FATURA])
+    faturas_invalidas = lote["NumeroFatura"][invalidas & ~numero_ausente].unique()
+    motivos[FATURA_REJEITADA] = lote["NumeroFatura"].isin(faturas_invalidas).to_numpy(dtype=bool, na_value=False) & ~invalidas
+
+    # Filtros do ETL: descartam a linha sem invalidar a fatura
+    motivos["quantidade_abaixo_minima"] = quantidade < QUANTIDADE_MINIMA
+    motivos["preco_abaixo_minimo"] = preco <= PRECO_MINIMO
+    motivos["linha_duplicada"] = ~ConjuntoHashes().novos(hash_linhas(lote[COLUNAS_BRUTAS]))
+    return motivos
+
+
+def rejeicoes(lote: pd.DataFrame, motivos: Dict[str, np.ndarray]) -> Dict[str, list]:
+    """Linha (posição no corpo), NumeroFatura e motivos de cada linha rejeitada, por coluna"""
+    nomes = list(motivos)
+    matriz = np.column_stack([motivos[m] for m in nomes])
+    linhas = np.flatnonzero(matriz.any(axis=1))
+    # Cada combinação de motivos vira um código de bits; a lista de nomes é montada uma vez por combinação
+    codigos = matriz[linhas] @ (1 << np.arange(len(nomes), dtype=np.int64))
+    combinacoes = {int(c): [n for j, n in enumerate(nomes) if c >> j & 1] for c in np.unique(codigos)}
+    return {
+        "linha": linhas.tolist(),
+        "numero_fatura": lote["NumeroFatura"].to_numpy(dtype=object, na_value=None)[linhas].tolist(),
+        "motivos": [combinacoes[c] for c in codigos.tolist()],
+    }
+
+
+def _categorias(lote: pd.DataFrame) -> Optional[List[Optional[str]]]:
+    """
+    CategoriaProduto enviada ou, para as que faltam, a do pipeline de app.categorias (se treinado);
+    as que continuam faltando recebem CATEGORIA_DESCONHECIDA em derivar_colunas
+    """
+    from app import categorias
+
+    enviadas = lote["CategoriaProduto"] if "CategoriaProduto" in lote.columns else pd.Series(pd.NA, index=lote.index, dtype="string")
+    faltantes = enviadas.isna().to_numpy()
+    if faltantes.any():
+        try:
+            resultado = categorias.classificar(
+                lote["CodigoProduto"][faltantes].tolist(), lote["Descricao"][faltantes].tolist()
+            )
+        except FileNotFoundError:
+            # Sem pipeline treinado: só as enviadas; as demais ficam com CATEGORIA_DESCONHECIDA
+            return None if faltantes.all() else enviadas.to_numpy(dtype=object, na_value=None).tolist()
+        enviadas = enviadas.astype(object)
+        enviadas[faltantes] = resultado["categorias"]
+    return enviadas.to_numpy(dtype=object, na_value=None).tolist()
+
+
+def preparar_lote(bruto: pd.DataFrame, categorias: bool = True):
+    """
+    Valida e transforma as linhas recebidas
+    Returns: (linhas aceitas com as colunas de transactions_sample, rejeições por coluna)
+    """
+    lote = _preparar(bruto)
+    motivos = validar(lote)
+    rejeitadas = rejeicoes(lote, motivos)
+    aceitas = preencher(lote.drop(index=rejeitadas["linha"]))
+    if aceitas.empty:
+        return aceitas, rejeitadas
+
+    # FaturaUnica pelo lote; app.etl.incremental corrige com a tabela inteira
+    faturas_por_cliente = aceitas.groupby("IDCliente")["NumeroFatura"].nunique()
+    return derivar_colunas(aceitas, faturas_por_cliente, _categorias(aceitas) if categorias else None), rejeitadas
+
+
+def ingerir_corpo(corpo: bytes, tipo: str, max_linhas: int) -> Dict:
+    """
+    Lê, valida e grava as transações do corpo de uma requisição
+    Returns: Dict com as contagens de linhas, o resultado da ingestão e as rejeições por coluna
+    """
+    from app.etl.incremental import ingerir
+
+    bruto = ler_corpo(corpo, tipo)
+    if len(bruto) > max_linhas:
+        raise ValueError(f"No máximo {max_linhas} transações por chamada")
+    aceitas, rejeitadas = preparar_lote(bruto)
+
+    resultado = {
+        "linhas_recebidas": len(bruto),
+        "linhas_aceitas": len(aceitas),
+        "linhas_rejeitadas": len(rejeitadas["linha"]),
+    }
+    if aceitas.empty:
+        resultado.update(faturas_novas=0, faturas_alteradas=0, faturas_inalteradas=0,
+                         linhas_inseridas=0, linhas_removidas=0, alteracao_id=None, created_at=None)
+    else:
+        gravado = ingerir([aceitas], f"api:{tipo}")
+        resultado.update(
+            faturas_novas=gravado["faturas_novas"],
+            faturas_alteradas=gravado["faturas_alteradas"],
+            faturas_inalteradas=gravado["faturas_inalteradas"],
+            linhas_inseridas=gravado["linhas_inseridas"],
+            linhas_removidas=gravado["linhas_removidas"],
+            alteracao_id=gravado["id"],
+            created_at=gravado["created_at"],
+        )
+    resultado["rejeicoes"] = rejeitadas
+    return resultado
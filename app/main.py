@@ -1,12 +1,36 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
 from app.api.routes import router
+from app.cache import CacheRespostasMiddleware
+from app.monitoramento import MetricasMiddleware
+from app import metricas
+from app.config.settings import get_settings
+from app.modelos import registro_modelos
 from sqlalchemy.orm import Session
 from fastapi import Depends
 from app.database import get_db
 from sqlalchemy import text
 
-app = FastAPI()
+settings = get_settings()
+
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    # Carga dos artefatos de modelo em segundo plano: a API já atende enquanto eles são lidos
+    if settings.MODELOS_AQUECER:
+        app.state.aquecimento_modelos = asyncio.create_task(asyncio.to_thread(registro_modelos.aquecer))
+    yield
+
+app = FastAPI(lifespan=ciclo_de_vida)
+
+# Adicionado antes do CORS para que respostas vindas do cache também recebam os cabeçalhos CORS
+app.add_middleware(CacheRespostasMiddleware)
+
+# Compressão das respostas maiores (o bundle e as séries de faturamento)
+app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,6 +40,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Por último para ficar por fora de todos: mede também respostas do cache e a compressão
+app.add_middleware(MetricasMiddleware)
+
 app.include_router(router, prefix="/api/v1")
 
 @app.get("/test")
@@ -32,6 +59,10 @@ def test_connection(db: Session = Depends(get_db)):
             "status": "error",
             "message": f"Erro na conexão: {str(e)}"
         }
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(metricas.formato_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     return {
@@ -43,7 +74,11 @@ async def root():
             "Análise Temporal": "/api/v1/analise/temporal",
             "Análise de Produtos": "/api/v1/analise/produtos",
             "Análise de Clientes": "/api/v1/analise/clientes",
-            "Análise de Faturamento": "/api/v1/analise/faturamento"
+            "Análise de Faturamento": "/api/v1/analise/faturamento",
+            "Bundle de Análises": "/api/v1/analise/bundle",
+            "Segmentos de Clientes": "/api/v1/segmentos",
+            "Produtos Comprados Juntos": "/api/v1/cestas/regras",
+            "Métricas (Prometheus)": "/metrics"
         },
         "documentação": {
             "Swagger UI": "/docs",
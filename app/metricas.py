@@ -0,0 +1,137 @@
+"""
+Registro de métricas em memória do processo (contadores e histogramas com rótulos).
+
+Os nomes seguem a convenção do Prometheus (snake_case, sufixos _total e _segundos), e
+formato_prometheus() gera o texto servido em /metrics.
+"""
+import threading
+from typing import Dict, Tuple
+
+BUCKETS_PADRAO = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+REGISTRO: Dict[str, "Metrica"] = {}
+
+
+def _chave(rotulos: Dict[str, str]) -> Tuple:
+    return tuple(sorted(rotulos.items()))
+
+
+class Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, descricao: str):
+        self.nome = nome
+        self.descricao = descricao
+
+
+class Contador(Metrica):
+    tipo = "counter"
+
+    def __init__(self, nome: str, descricao: str):
+        super().__init__(nome, descricao)
+        self.valores: Dict[Tuple, float] = {}
+
+    def inc(self, valor: float = 1.0, **rotulos):
+        chave = _chave(rotulos)
+        with _lock:
+            self.valores[chave] = self.valores.get(chave, 0.0) + valor
+
+    def resumo(self) -> list:
+        with _lock:
+            return [{"rotulos": dict(chave), "valor": valor} for chave, valor in self.valores.items()]
+
+
+class Histograma(Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome: str, descricao: str, buckets: Tuple[float, ...] = BUCKETS_PADRAO):
+        super().__init__(nome, descricao)
+        self.buckets = buckets
+        # chave -> [contagem por bucket..., contagem total, soma, máximo]
+        self.valores: Dict[Tuple, list] = {}
+
+    def observar(self, valor: float, **rotulos):
+        chave = _chave(rotulos)
+        with _lock:
+            serie = self.valores.get(chave)
+            if serie is None:
+                serie = self.valores[chave] = [0] * len(self.buckets) + [0, 0.0, 0.0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[i] += 1
+            n = len(self.buckets)
+            serie[n] += 1
+            serie[n + 1] += valor
+            serie[n + 2] = max(serie[n + 2], valor)
+
+    def resumo(self) -> list:
+        n = len(self.buckets)
+        with _lock:
+            return [
+                {
+                    "rotulos": dict(chave),
+                    "buckets": dict(zip(self.buckets, serie[:n])),
+                    "contagem": serie[n],
+                    "soma": serie[n + 1],
+                    "maximo": serie[n + 2],
+                }
+                for chave, serie in self.valores.items()
+            ]
+
+
+def _registrar(metrica: Metrica) -> Metrica:
+    with _lock:
+        existente = REGISTRO.get(metrica.nome)
+        if existente is not None:
+            return existente
+        REGISTRO[metrica.nome] = metrica
+        return metrica
+
+
+def contador(nome: str, descricao: str) -> Contador:
+    return _registrar(Contador(nome, descricao))
+
+
+def histograma(nome: str, descricao: str, buckets: Tuple[float, ...] = BUCKETS_PADRAO) -> Histograma:
+    return _registrar(Histograma(nome, descricao, buckets))
+
+
+def resumo(prefixo: str = "") -> Dict[str, list]:
+    """Snapshot das métricas registradas cujo nome começa com o prefixo"""
+    return {nome: m.resumo() for nome, m in sorted(REGISTRO.items()) if nome.startswith(prefixo)}
+
+
+def _formatar_rotulos(rotulos: Dict[str, str]) -> str:
+    if not rotulos:
+        return ""
+    pares = []
+    for nome, valor in sorted(rotulos.items()):
+        valor = str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pares.append(f'{nome}="{valor}"')
+    return "{" + ",".join(pares) + "}"
+
+
+def _numero(valor: float) -> str:
+    return repr(float(valor)) if valor != int(valor) else str(int(valor))
+
+
+def formato_prometheus() -> str:
+    """Todas as métricas registradas no formato texto de exposição do Prometheus (versão 0.0.4)"""
+    linhas = []
+    for nome, metrica in sorted(REGISTRO.items()):
+        ajuda = metrica.descricao.replace("\\", "\\\\").replace("\n", "\\n")
+        linhas.append(f"# HELP {nome} {ajuda}")
+        linhas.append(f"# TYPE {nome} {metrica.tipo}")
+        for serie in metrica.resumo():
+            rotulos = serie["rotulos"]
+            if metrica.tipo == "counter":
+                linhas.append(f"{nome}{_formatar_rotulos(rotulos)} {_numero(serie['valor'])}")
+                continue
+            # Os buckets já são cumulativos (cada observação conta em todos os limites >= valor)
+            for limite, contagem in serie["buckets"].items():
+                linhas.append(f"{nome}_bucket{_formatar_rotulos({**rotulos, 'le': repr(float(limite))})} {contagem}")
+            linhas.append(f"{nome}_bucket{_formatar_rotulos({**rotulos, 'le': '+Inf'})} {serie['contagem']}")
+            linhas.append(f"{nome}_sum{_formatar_rotulos(rotulos)} {repr(float(serie['soma']))}")
+            linhas.append(f"{nome}_count{_formatar_rotulos(rotulos)} {serie['contagem']}")
+    return "\n".join(linhas) + "\n"
@@ -0,0 +1,267 @@
+"""
+Migrações versionadas do esquema de transactions_sample.
+
+Cada migração tem um número de versão, um nome e uma lista de comandos SQL. As versões
+aplicadas ficam em schema_migracoes; cada pendente roda em sua própria transação, sob um
+advisory lock, para que dois processos não apliquem a mesma migração. Depois de aplicar
+alguma, as estatísticas da tabela são atualizadas (ANALYZE). Os índices criados aqui
+são os mesmos declarados em app.models.
+
+CREATE INDEX bloqueia escritas em transactions_sample enquanto o índice é construído:
+rode as migrações fora do horário de carga.
+
+"verificar" executa as consultas de cada rota, roda EXPLAIN em cada comando e lista os
+que ainda leem alguma tabela com Seq Scan. Em tabelas pequenas o planejador prefere
+Seq Scan mesmo havendo índice, por isso o relatório também mostra se o Seq Scan continua
+com enable_seqscan desligado, ou seja, quando nenhum índice atende a consulta.
+
+Uso:
+    python -m app.migracoes             aplica as migrações pendentes
+    python -m app.migracoes status      lista as migrações e quais já foram aplicadas
+    python -m app.migracoes verificar   EXPLAIN das consultas de cada rota
+"""
+import asyncio
+import json
+import sys
+from contextlib import nullcontext
+from datetime import date, datetime, timezone
+from typing import Dict, List
+
+from sqlalchemy import event, select, text
+
+from app.config.settings import get_settings
+from app.database import AsyncSessionLocal, SessionLocal, async_engine
+from app.models import SchemaMigracao, Transaction
+
+settings = get_settings()
+
+# Chave do advisory lock que serializa a aplicação das migrações
+LOCK_MIGRACOES = 727_001
+
+
+class Migracao:
+    def __init__(self, versao: int, nome: str, comandos: List[str]):
+        self.versao = versao
+        self.nome = nome
+        self.comandos = comandos
+
+
+MIGRACOES = [
+    # Índices dos filtros das rotas de análise (antes criados por app.indices)
+    Migracao(1, "indices_filtros", [
+        'CREATE INDEX IF NOT EXISTS ix_transactions_sample_datafatura '
+        'ON transactions_sample ("DataFatura")',
+        'CREATE INDEX IF NOT EXISTS ix_transactions_sample_pais_datafatura '
+        'ON transactions_sample ("Pais", "DataFatura")',
+        'CREATE INDEX IF NOT EXISTS ix_transactions_sample_categoria_datafatura '
+        'ON transactions_sample ("CategoriaProduto", "DataFatura")',
+        'CREATE INDEX IF NOT EXISTS ix_transactions_sample_faixa_preco_datafatura '
+        'ON transactions_sample ("CategoriaPreco", "DataFatura")',
+    ]),
+    # Paginação por chave (DataFatura, id) do detalhamento de transações. id identifica
+    # cada linha (NumeroFatura se repete entre as linhas de uma fatura) e vira a chave
+    # primária; a coluna é preenchida para as linhas existentes (reescreve a tabela)
+    Migracao(2, "indices_paginacao", [
+        'ALTER TABLE transactions_sample ADD COLUMN IF NOT EXISTS id BIGINT GENERATED BY DEFAULT AS IDENTITY',
+        'ALTER TABLE transactions_sample DROP CONSTRAINT IF EXISTS transactions_sample_pkey',
+        'ALTER TABLE transactions_sample ADD CONSTRAINT transactions_sample_pkey PRIMARY KEY (id)',
+        'CREATE INDEX IF NOT EXISTS ix_transactions_sample_datafatura_id '
+        'ON transactions_sample ("DataFatura", id)',
+        'CREATE INDEX IF NOT EXISTS ix_transactions_sample_produto_datafatura_id '
+        'ON transactions_sample ("CodigoProduto", "DataFatura", id)',
+        'CREATE INDEX IF NOT EXISTS ix_transactions_sample_cliente_datafatura_id '
+        'ON transactions_sample ("IDCliente", "DataFatura", id)',
+        'DROP INDEX IF EXISTS ix_transactions_sample_datafatura',
+    ]),
+    # Índices de cobertura para as agregações que leem a tabela base (sem rollup ou com
+    # filtro de período): as colunas somadas entram no INCLUDE e a consulta é respondida
+    # só pelo índice. Os índices de filtro sem INCLUDE são substituídos pelas versões
+    # de cobertura, que atendem os mesmos predicados.
+    Migracao(3, "indices_cobertura", [
+        'CREATE INDEX IF NOT EXISTS ix_transactions_sample_datafatura_id_cobertura '
+        'ON transactions_sample ("DataFatura", id) INCLUDE ("ValorTotalFatura", "FaturaUnica", "NumeroFatura")',
+        'DROP INDEX IF EXISTS ix_transactions_sample_datafatura_id',
+        'CREATE INDEX IF NOT EXISTS ix_transactions_sample_pais_datafatura_cobertura '
+        'ON transactions_sample ("Pais", "DataFatura") INCLUDE ("IDCliente", "ValorTotalFatura")',
+        'DROP INDEX IF EXISTS ix_transactions_sample_pais_datafatura',
+        'CREATE INDEX IF NOT EXISTS ix_transactions_sample_categoria_datafatura_cobertura '
+        'ON transactions_sample ("CategoriaProduto", "DataFatura") '
+        'INCLUDE ("CategoriaPreco", "ValorTotalFatura", "Quantidade")',
+        'DROP INDEX IF EXISTS ix_transactions_sample_categoria_datafatura',
+        'CREATE INDEX IF NOT EXISTS ix_transactions_sample_faixa_preco_datafatura_cobertura '
+        'ON transactions_sample ("CategoriaPreco", "DataFatura") INCLUDE ("ValorTotalFatura")',
+        'DROP INDEX IF EXISTS ix_transactions_sample_faixa_preco_datafatura',
+        'CREATE INDEX IF NOT EXISTS ix_transactions_sample_cliente_pais_cobertura '
+        'ON transactions_sample ("IDCliente", "Pais") INCLUDE ("ValorTotalFatura", "NumeroFatura")',
+        'CREATE INDEX IF NOT EXISTS ix_transactions_sample_produto_descricao_cobertura '
+        'ON transactions_sample ("CodigoProduto", "Descricao") INCLUDE ("Quantidade", "ValorTotalFatura")',
+        'CREATE INDEX IF NOT EXISTS ix_transactions_sample_mes_diasemana_semanaano_cobertura '
+        'ON transactions_sample ("Mes", "DiaSemana", "SemanaAno") INCLUDE ("ValorTotalFatura", "NumeroFatura")',
+    ]),
+    # Busca das linhas de uma fatura na ingestão incremental, que substitui faturas alteradas
+    Migracao(4, "indice_numerofatura", [
+        'CREATE INDEX IF NOT EXISTS ix_transactions_sample_numerofatura '
+        'ON transactions_sample ("NumeroFatura")',
+    ]),
+]
+
+
+def versoes_aplicadas(db) -> Dict[int, SchemaMigracao]:
+    SchemaMigracao.__table__.create(bind=db.connection(), checkfirst=True)
+    return {m.versao: m for m in db.execute(select(SchemaMigracao)).scalars()}
+
+
+def aplicar_migracoes() -> List[str]:
+    """Aplica, em ordem, as migrações ainda não registradas em schema_migracoes"""
+    aplicadas = []
+    db = SessionLocal()
+    try:
+        for migracao in MIGRACOES:
+            db.execute(text("SELECT pg_advisory_xact_lock(:chave)"), {"chave": LOCK_MIGRACOES})
+            if migracao.versao in versoes_aplicadas(db):
+                db.commit()
+                continue
+            for comando in migracao.comandos:
+                db.execute(text(comando))
+            db.add(SchemaMigracao(
+                versao=migracao.versao,
+                nome=migracao.nome,
+                aplicada_em=datetime.now(timezone.utc),
+            ))
+            db.commit()
+            aplicadas.append(f"{migracao.versao:04d}_{migracao.nome}")
+
+        if aplicadas:
+            db.execute(text(f"ANALYZE {Transaction.__tablename__}"))
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return aplicadas
+
+
+def _consultas_rotas():
+    """(rota, função que executa as consultas da rota numa AsyncSession)"""
+    from app.api import routes
+    from app.filtros import FiltrosAnalise
+
+    periodo = FiltrosAnalise(data_inicio=date(2011, 3, 1), data_fim=date(2011, 3, 31))
+    pais = FiltrosAnalise(paises=["United Kingdom"])
+
+    def analise(funcao, filtros):
+        return lambda db: funcao(db, filtros)
+
+    def transacoes(**parametros):
+        argumentos = dict(codigo_produto=None, id_cliente=None, cursor=None, limite=100, ordem="asc",
+                          filtros=FiltrosAnalise())
+        argumentos.update(parametros)
+        return lambda db: routes.get_transacoes(db=db, **argumentos)
+
+    consultas = []
+    for nome, (funcao, _) in routes.ANALISES.items():
+        consultas += [
+            (f"/analise/{nome}", analise(funcao, FiltrosAnalise())),
+            (f"/analise/{nome} (período)", analise(funcao, periodo)),
+            (f"/analise/{nome} (país)", analise(funcao, pais)),
+        ]
+    consultas += [
+        ("/transacoes", transacoes()),
+        ("/transacoes (produto)", transacoes(codigo_produto="85123A")),
+        ("/transacoes (cliente)", transacoes(id_cliente="17850")),
+    ]
+    return consultas
+
+
+def _seq_scans(plano) -> List[str]:
+    """Tabelas lidas por nós Seq Scan no plano"""
+    tabelas = [plano["Relation Name"]] if plano.get("Node Type") == "Seq Scan" else []
+    for filho in plano.get("Plans", []):
+        tabelas += _seq_scans(filho)
+    return tabelas
+
+
+async def _explicar(statement, parameters, sem_seqscan: bool) -> List[str]:
+    async with async_engine.connect() as conn:
+        if sem_seqscan:
+            await conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        plano = (await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", tuple(parameters))).scalar()
+        await conn.rollback()
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    return _seq_scans(plano[0]["Plan"])
+
+
+async def verificar_planos() -> List[Dict]:
+    """
+    Executa as consultas de cada rota (com rollups e só com a tabela base) e roda EXPLAIN
+    em cada comando. Returns: Lista com rota, modo e tabelas lidas por Seq Scan
+    """
+    from app.rollups import somente_tabela_base
+
+    relatorio = []
+    for rota, executar in _consultas_rotas():
+        for modo in ("rollups", "base"):
+            comandos = []
+
+            def capturar(conn, cursor, statement, parameters, context, executemany):
+                if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+                    comandos.append((statement, parameters))
+
+            event.listen(async_engine.sync_engine, "before_cursor_execute", capturar)
+            try:
+                with somente_tabela_base() if modo == "base" else nullcontext():
+                    async with AsyncSessionLocal() as db:
+                        await executar(db)
+            except Exception:
+                # Interessa só o plano dos comandos: a montagem da resposta pode falhar sem dados
+                pass
+            finally:
+                event.remove(async_engine.sync_engine, "before_cursor_execute", capturar)
+
+            # A leitura de rollup_estado feita para escolher a fonte não é uma consulta da rota
+            comandos = [c for c in comandos if "rollup_estado" not in c[0]]
+            seq_scans, sem_indice = [], []
+            for statement, parameters in comandos:
+                seq_scans += await _explicar(statement, parameters, sem_seqscan=False)
+                sem_indice += await _explicar(statement, parameters, sem_seqscan=True)
+            relatorio.append({
+                "rota": rota,
+                "modo": modo,
+                "comandos": len(comandos),
+                "seq_scans": sorted(set(seq_scans)),
+                "sem_indice": sorted(set(sem_indice)),
+            })
+    return relatorio
+
+
+def _imprimir_verificacao(relatorio: List[Dict]):
+    print(f"{'rota':<34} {'modo':<8} {'comandos':>8}  {'Seq Scan':<28} sem índice")
+    for r in relatorio:
+        print(f"{r['rota']:<34} {r['modo']:<8} {r['comandos']:>8}  "
+              f"{', '.join(r['seq_scans']) or '-':<28} {', '.join(r['sem_indice']) or '-'}")
+
+
+if __name__ == "__main__":
+    if settings.BACKEND != "postgres":
+        sys.exit("As migrações só se aplicam ao backend postgres")
+    comando = sys.argv[1] if len(sys.argv) > 1 else "aplicar"
+    if comando == "aplicar":
+        aplicadas = aplicar_migracoes()
+        print("\n".join(aplicadas) if aplicadas else "Nenhuma migração pendente")
+    elif comando == "status":
+        db = SessionLocal()
+        try:
+            feitas = versoes_aplicadas(db)
+            for m in MIGRACOES:
+                aplicada = feitas.get(m.versao)
+                situacao = aplicada.aplicada_em.isoformat() if aplicada else "pendente"
+                print(f"{m.versao:04d}_{m.nome:<24} {situacao}")
+            db.commit()
+        finally:
+            db.close()
+    elif comando == "verificar":
+        _imprimir_verificacao(asyncio.run(verificar_planos()))
+    else:
+        sys.exit(f"Comando desconhecido: {comando} (use aplicar, status ou verificar)")
@@ -0,0 +1,147 @@
+"""
+Registro dos artefatos de modelo (arquivos joblib em models/).
+
+Nada é carregado na importação: cada artefato é lido na primeira vez que é pedido, uma
+única vez por processo mesmo com pedidos simultâneos. Com MODELOS_MMAP os arrays numpy
+dos artefatos são mapeados em memória (joblib.load com mmap_mode="r") em vez de copiados,
+então os workers do uvicorn que leem o mesmo arquivo compartilham as páginas pelo cache
+do sistema operacional; só os objetos Python ao redor dos arrays ficam em cada processo.
+O mapeamento exige artefatos salvos sem compressão; os comprimidos são lidos em memória.
+
+Com MODELOS_AQUECER os artefatos são carregados em segundo plano na inicialização da API,
+para que a primeira requisição não pague o custo da leitura.
+
+Tempo de carga e memória de cada artefato em GET /api/v1/admin/modelos.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from app import metricas
+from app.config.settings import get_settings
+
+settings = get_settings()
+
+MODELO_CARGA = metricas.histograma("modelo_carga_segundos", "Tempo de carga de cada artefato de modelo")
+
+
+def _memoria_mapeada(caminho: str) -> Optional[int]:
+    """Bytes residentes dos mapeamentos do arquivo no processo (Linux, /proc/self/smaps)"""
+    try:
+        with open("/proc/self/smaps") as smaps:
+            total, do_arquivo = 0, False
+            for linha in smaps:
+                campos = linha.split()
+                if not campos[0].endswith(":"):
+                    # Cabeçalho de um mapeamento: endereços, permissões, offset, dispositivo, inode e caminho
+                    do_arquivo = len(campos) >= 6 and campos[5] == caminho
+                elif do_arquivo and campos[0] == "Rss:":
+                    total += int(campos[1]) * 1024
+            return total
+    except OSError:
+        return None
+
+
+def _memoria_processo() -> Optional[int]:
+    """Memória residente do processo (Linux, /proc/self/statm)"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class Artefato:
+    """Um arquivo joblib carregado sob demanda"""
+
+    def __init__(self, nome: str, caminho: str, mmap: bool):
+        self.nome = nome
+        self.caminho = os.path.abspath(caminho)
+        self.mmap = mmap
+        self._objeto = None
+        self._carregado = False
+        self._lock = threading.Lock()
+        self.tempo_carga: Optional[float] = None
+        self.memoria_carga: Optional[int] = None
+        self.carregado_em: Optional[datetime] = None
+        self.erro: Optional[str] = None
+
+    def obter(self):
+        if self._carregado:
+            return self._objeto
+        with self._lock:
+            if not self._carregado:
+                self._carregar()
+        return self._objeto
+
+    def _carregar(self):
+        import joblib
+
+        memoria_antes = _memoria_processo()
+        inicio = time.perf_counter()
+        try:
+            self._objeto = joblib.load(self.caminho, mmap_mode="r" if self.mmap else None)
+        except Exception as e:
+            self.erro = str(e)
+            raise
+        self.tempo_carga = time.perf_counter() - inicio
+        memoria_depois = _memoria_processo()
+        if memoria_antes is not None and memoria_depois is not None:
+            self.memoria_carga = max(memoria_depois - memoria_antes, 0)
+        self.carregado_em = datetime.now(timezone.utc)
+        self.erro = None
+        self._carregado = True
+        MODELO_CARGA.observar(self.tempo_carga, artefato=self.nome)
+
+    def estatisticas(self) -> Dict:
+        try:
+            tamanho_arquivo = os.path.getsize(self.caminho)
+        except OSError:
+            tamanho_arquivo = None
+        return {
+            "nome": self.nome,
+            "caminho": self.caminho,
+            "carregado": self._carregado,
+            "mmap": self.mmap,
+            "carregado_em": self.carregado_em.isoformat() if self.carregado_em else None,
+            "tempo_carga_ms": round(self.tempo_carga * 1000, 3) if self.tempo_carga is not None else None,
+            "tamanho_arquivo_bytes": tamanho_arquivo,
+            # Crescimento da memória do processo durante a carga (objetos Python, arrays copiados e,
+            # no primeiro artefato de uma biblioteca, a importação dela)
+            "memoria_carga_bytes": self.memoria_carga,
+            # Páginas do arquivo mapeadas e residentes agora, compartilhadas entre os workers
+            "memoria_mapeada_bytes": _memoria_mapeada(self.caminho) if self._carregado and self.mmap else 0,
+            "erro": self.erro,
+        }
+
+
+class RegistroModelos:
+    def __init__(self):
+        self._artefatos: Dict[str, Artefato] = {}
+
+    def registrar(self, nome: str, caminho: str, mmap: bool = True):
+        self._artefatos[nome] = Artefato(nome, caminho, mmap)
+
+    def obter(self, nome: str):
+        return self._artefatos[nome].obter()
+
+    def aquecer(self) -> Dict[str, Optional[str]]:
+        """Carrega todos os artefatos; erros ficam registrados no artefato em vez de interromper"""
+        erros = {}
+        for nome, artefato in self._artefatos.items():
+            try:
+                artefato.obter()
+            except Exception as e:
+                erros[nome] = str(e)
+        return erros
+
+    def estatisticas(self) -> List[Dict]:
+        return [a.estatisticas() for a in self._artefatos.values()]
+
+
+registro_modelos = RegistroModelos()
+registro_modelos.registrar("segmentos_clientes", settings.MODEL_PATH, settings.MODELOS_MMAP)
+registro_modelos.registrar("scaler", settings.SCALER_PATH, settings.MODELOS_MMAP)
+registro_modelos.registrar("model_info", settings.MODEL_INFO_PATH, settings.MODELOS_MMAP)
@@ -1,11 +1,13 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, BigInteger, Numeric, Text
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean, BigInteger, Numeric, Text, Index, JSON, Identity
 from app.database import Base
 
 class Transaction(Base):
     __tablename__ = "transactions_sample"
 
+    # Identificador da linha: NumeroFatura se repete entre as linhas de uma fatura
+    id = Column(BigInteger, Identity(), primary_key=True)
     created_at = Column(DateTime(timezone=True))
-    NumeroFatura = Column(String, primary_key=True)
+    NumeroFatura = Column(String)
     CodigoProduto = Column(String)
     Descricao = Column(Text)
     Quantidade = Column(BigInteger)
@@ -22,3 +24,179 @@ class Transaction(Base):
     Dia = Column(BigInteger)
     DiaSemana = Column(BigInteger)
     SemanaAno = Column(BigInteger)
+
+    # Índices criados pelas migrações em app.migracoes: filtros das rotas de análise (período, país,
+    # categoria e faixa de preço), paginação por chave (DataFatura, id) do detalhamento
+    # de transações e cobertura das agregações que leem a tabela base
+    __table_args__ = (
+        Index("ix_transactions_sample_datafatura_id_cobertura", "DataFatura", "id",
+              postgresql_include=["ValorTotalFatura", "FaturaUnica", "NumeroFatura"]),
+        Index("ix_transactions_sample_pais_datafatura_cobertura", "Pais", "DataFatura",
+              postgresql_include=["IDCliente", "ValorTotalFatura"]),
+        Index("ix_transactions_sample_categoria_datafatura_cobertura", "CategoriaProduto", "DataFatura",
+              postgresql_include=["CategoriaPreco", "ValorTotalFatura", "Quantidade"]),
+        Index("ix_transactions_sample_faixa_preco_datafatura_cobertura", "CategoriaPreco", "DataFatura",
+              postgresql_include=["ValorTotalFatura"]),
+        Index("ix_transactions_sample_produto_datafatura_id", "CodigoProduto", "DataFatura", "id"),
+        Index("ix_transactions_sample_cliente_datafatura_id", "IDCliente", "DataFatura", "id"),
+        Index("ix_transactions_sample_cliente_pais_cobertura", "IDCliente", "Pais",
+              postgresql_include=["ValorTotalFatura", "NumeroFatura"]),
+        Index("ix_transactions_sample_produto_descricao_cobertura", "CodigoProduto", "Descricao",
+              postgresql_include=["Quantidade", "ValorTotalFatura"]),
+        Index("ix_transactions_sample_mes_diasemana_semanaano_cobertura", "Mes", "DiaSemana", "SemanaAno",
+              postgresql_include=["ValorTotalFatura", "NumeroFatura"]),
+        Index("ix_transactions_sample_numerofatura", "NumeroFatura"),
+    )
+
+
+# Tabelas de rollup (agregados pré-calculados a partir de transactions_sample)
+class RollupVendasDiarias(Base):
+    __tablename__ = "rollup_vendas_diarias"
+
+    Dia = Column(Date, primary_key=True)
+    Pais = Column(String, primary_key=True)
+    CategoriaProduto = Column(String, primary_key=True)
+    CategoriaPreco = Column(String, primary_key=True)
+    Ano = Column(BigInteger)
+    Mes = Column(BigInteger)
+    DiaSemana = Column(BigInteger)
+    SemanaAno = Column(BigInteger)
+    total_vendas = Column(Numeric)
+    quantidade_vendas = Column(BigInteger)
+    quantidade_itens = Column(BigInteger)
+    faturas_unicas = Column(BigInteger)
+
+class RollupClientes(Base):
+    __tablename__ = "rollup_clientes"
+
+    IDCliente = Column(String, primary_key=True)
+    Pais = Column(String, primary_key=True)
+    total_compras = Column(Numeric)
+    frequencia_compras = Column(BigInteger)
+
+class RollupProdutos(Base):
+    __tablename__ = "rollup_produtos"
+
+    CodigoProduto = Column(String, primary_key=True)
+    Descricao = Column(Text, primary_key=True)
+    quantidade_vendida = Column(BigInteger)
+    valor_total = Column(Numeric)
+
+class RollupClientesHLL(Base):
+    """Esboços HyperLogLog (formato esparso) dos clientes de cada dia × país; ver app.hll"""
+    __tablename__ = "rollup_clientes_hll"
+
+    Dia = Column(Date, primary_key=True)
+    Pais = Column(String, primary_key=True)
+    registrador = Column(Integer, primary_key=True)
+    valor = Column(Integer)
+
+class RollupEstado(Base):
+    __tablename__ = "rollup_estado"
+
+    tabela = Column(String, primary_key=True)
+    ultimo_created_at = Column(DateTime(timezone=True))
+    linhas = Column(BigInteger)
+    atualizado_em = Column(DateTime(timezone=True))
+
+class SegmentoCliente(Base):
+    """Atributos RFM e segmento de cada cliente, calculados por app.segmentacao"""
+    __tablename__ = "segmentos_clientes"
+
+    IDCliente = Column(String, primary_key=True)
+    UltimaCompra = Column(DateTime)
+    Recencia = Column(Integer)
+    Frequencia = Column(BigInteger)
+    ValorMonetario = Column(Numeric)
+    Cluster = Column(Integer)
+    Segmento = Column(String)
+    atualizado_em = Column(DateTime(timezone=True))
+
+    # Agregados por segmento lidos só do índice
+    __table_args__ = (
+        Index("ix_segmentos_clientes_segmento_cobertura", "Segmento",
+              postgresql_include=["Recencia", "Frequencia", "ValorMonetario"]),
+    )
+
+# Contagens da matriz fatura × produto da análise de cestas (app.cestas)
+class CestaProduto(Base):
+    """Faturas que contêm cada produto"""
+    __tablename__ = "cesta_produtos"
+
+    CodigoProduto = Column(String, primary_key=True)
+    faturas = Column(BigInteger)
+
+class CestaPar(Base):
+    """Faturas que contêm os dois produtos do par (CodigoProdutoA < CodigoProdutoB)"""
+    __tablename__ = "cesta_pares"
+
+    CodigoProdutoA = Column(String, primary_key=True)
+    CodigoProdutoB = Column(String, primary_key=True)
+    faturas = Column(BigInteger)
+
+class SchemaMigracao(Base):
+    __tablename__ = "schema_migracoes"
+
+    versao = Column(Integer, primary_key=True)
+    nome = Column(String)
+    aplicada_em = Column(DateTime(timezone=True))
+
+# Ingestão incremental (app.etl.incremental)
+class TransacaoRemovida(Base):
+    """
+    Linhas de transactions_sample substituídas por uma nova versão da fatura, com o momento
+    da remoção; rollups, segmentos e cestas descontam as que já tinham contado
+    """
+    __tablename__ = "transacoes_removidas"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    removido_em = Column(DateTime(timezone=True), index=True)
+    created_at = Column(DateTime(timezone=True))
+    NumeroFatura = Column(String)
+    CodigoProduto = Column(String)
+    Descricao = Column(Text)
+    Quantidade = Column(BigInteger)
+    DataFatura = Column(DateTime)
+    PrecoUnitario = Column(Numeric)
+    IDCliente = Column(String)
+    Pais = Column(String)
+    CategoriaProduto = Column(String)
+    CategoriaPreco = Column(String)
+    ValorTotalFatura = Column(Numeric)
+    FaturaUnica = Column(Boolean)
+    Ano = Column(BigInteger)
+    Mes = Column(BigInteger)
+    Dia = Column(BigInteger)
+    DiaSemana = Column(BigInteger)
+    SemanaAno = Column(BigInteger)
+
+class FaturaIngerida(Base):
+    """Hash do conteúdo de cada fatura gravada, para reconhecer faturas novas ou alteradas"""
+    __tablename__ = "ingestao_faturas"
+
+    NumeroFatura = Column(String, primary_key=True)
+    hash = Column(String)
+    linhas = Column(Integer)
+    created_at = Column(DateTime(timezone=True))
+
+class AlteracaoTransacoes(Base):
+    """
+    Conjunto de alterações de uma ingestão: as linhas inseridas têm created_at igual ao
+    desta alteração e as removidas, removido_em igual a ele. Numa carga completa
+    (origem carga_completa) chaves é nula: a tabela inteira mudou
+    """
+    __tablename__ = "alteracoes_transacoes"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    created_at = Column(DateTime(timezone=True), unique=True)
+    origem = Column(String)
+    faturas_novas = Column(Integer)
+    faturas_alteradas = Column(Integer)
+    faturas_inalteradas = Column(Integer)
+    linhas_inseridas = Column(BigInteger)
+    linhas_removidas = Column(BigInteger)
+    # Marcas d'água da origem depois desta ingestão
+    marca_created_at = Column(DateTime(timezone=True))
+    marca_fatura = Column(BigInteger)
+    # Chaves afetadas: faturas, clientes, produtos, dias e países
+    chaves = Column(JSON)
@@ -0,0 +1,230 @@
+"""
+Métricas de latência por rota, expostas em /metrics no formato texto do Prometheus.
+
+MetricasMiddleware mede cada requisição HTTP de ponta a ponta (inclusive respostas do cache
+e o envio do corpo) e conta as respostas por código. As rotas da API usam RotaMedida, que
+divide o tempo de cada chamada em fases:
+- banco: execução dos comandos SQL (eventos before/after_cursor_execute);
+- leitura: busca das linhas do resultado (SessaoAssincrona e SessaoDuckDB);
+- construcao: restante do tempo da função da rota, em que são montados os modelos Pydantic;
+- serializacao: validação pelo response_model e geração do corpo da resposta.
+Também são contadas as respostas com status="error" (que saem com HTTP 200) e as linhas
+lidas do banco. Quando a rota executa consultas ao mesmo tempo, "banco" é a soma do tempo
+de cada comando e pode passar da duração da rota.
+"""
+import asyncio
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import metricas
+
+HTTP_REQUISICOES = metricas.contador(
+    "http_requisicoes_total", "Requisições HTTP atendidas, por método, rota e código de resposta"
+)
+HTTP_DURACAO = metricas.histograma(
+    "http_requisicao_duracao_segundos", "Duração das requisições HTTP, do recebimento ao fim do corpo"
+)
+ROTA_FASE = metricas.histograma(
+    "rota_fase_duracao_segundos", "Tempo de cada fase (banco, leitura, construcao, serializacao) por chamada da rota"
+)
+ROTA_ERROS = metricas.contador(
+    "rota_respostas_erro_total", "Respostas com status=\"error\" devolvidas pela rota"
+)
+ROTA_LINHAS = metricas.contador(
+    "rota_linhas_retornadas_total", "Linhas lidas do banco pelas consultas da rota"
+)
+ROTA_COMANDOS = metricas.contador(
+    "rota_comandos_sql_total", "Comandos SQL executados pela rota"
+)
+
+
+class Medicao:
+    """Tempos acumulados durante uma chamada de rota (compartilhada com as threads do DuckDB)"""
+
+    def __init__(self):
+        self.fases = {"banco": 0.0, "leitura": 0.0}
+        self.linhas = 0
+        self.comandos = 0
+        # Preenchidos quando a função da rota termina
+        self.duracao_rota: Optional[float] = None
+        self.erro = False
+        self._lock = threading.Lock()
+
+    def somar(self, fase: str, segundos: float):
+        with self._lock:
+            self.fases[fase] += segundos
+
+    def contar(self, linhas: int = 0, comandos: int = 0):
+        with self._lock:
+            self.linhas += linhas
+            self.comandos += comandos
+
+
+_medicao_atual: ContextVar[Optional[Medicao]] = ContextVar("medicao_atual", default=None)
+
+
+@contextmanager
+def fase(nome: str):
+    """Soma a duração do bloco à fase da chamada de rota em andamento (se houver)"""
+    medicao = _medicao_atual.get()
+    if medicao is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicao.somar(nome, time.perf_counter() - inicio)
+
+
+def contar_linhas(linhas: int):
+    medicao = _medicao_atual.get()
+    if medicao is not None:
+        medicao.contar(linhas=linhas)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _antes_comando(conn, cursor, statement, parameters, context, executemany):
+    if _medicao_atual.get() is not None:
+        conn.info.setdefault("inicio_comandos", []).append(time.perf_counter())
+
+
+def _fim_comando(conn):
+    medicao = _medicao_atual.get()
+    pilha = conn.info.get("inicio_comandos")
+    if medicao is not None and pilha:
+        medicao.somar("banco", time.perf_counter() - pilha.pop())
+        medicao.contar(comandos=1)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _depois_comando(conn, cursor, statement, parameters, context, executemany):
+    _fim_comando(conn)
+
+
+@event.listens_for(Engine, "handle_error")
+def _erro_comando(contexto):
+    if contexto.connection is not None:
+        _fim_comando(contexto.connection)
+
+
+def _status_erro(retorno) -> bool:
+    """status="error" na resposta ou em alguma das análises de um bundle"""
+    if isinstance(retorno, dict):
+        return retorno.get("status") == "error"
+    if getattr(retorno, "status", None) == "error":
+        return True
+    return any(getattr(v, "status", None) == "error" for v in getattr(retorno, "__dict__", {}).values())
+
+
+def _medir_endpoint(endpoint):
+    """Envolve a função da rota para medir sua duração e detectar respostas de erro"""
+    if getattr(endpoint, "_medido", False):
+        return endpoint
+
+    def registrar(retorno, inicio):
+        medicao = _medicao_atual.get()
+        if medicao is not None:
+            medicao.duracao_rota = time.perf_counter() - inicio
+            medicao.erro = _status_erro(retorno)
+
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def medido(*args, **kwargs):
+            inicio = time.perf_counter()
+            retorno = await endpoint(*args, **kwargs)
+            registrar(retorno, inicio)
+            return retorno
+    else:
+        @functools.wraps(endpoint)
+        def medido(*args, **kwargs):
+            inicio = time.perf_counter()
+            retorno = endpoint(*args, **kwargs)
+            registrar(retorno, inicio)
+            return retorno
+
+    medido._medido = True
+    return medido
+
+
+class RotaMedida(APIRoute):
+    """APIRoute que registra as fases de cada chamada (usada como route_class do router)"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _medir_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        executar = super().get_route_handler()
+
+        async def handler(request):
+            medicao = Medicao()
+            token = _medicao_atual.set(medicao)
+            inicio = time.perf_counter()
+            try:
+                return await executar(request)
+            finally:
+                total = time.perf_counter() - inicio
+                _medicao_atual.reset(token)
+                _registrar_medicao(_rota(request.scope), medicao, total)
+
+        return handler
+
+
+def _registrar_medicao(rota: str, medicao: Medicao, total: float):
+    fases = dict(medicao.fases)
+    if medicao.duracao_rota is not None:
+        # O que sobra da função da rota é montagem da resposta; o que sobra do total, serialização
+        fases["construcao"] = max(0.0, medicao.duracao_rota - fases["banco"] - fases["leitura"])
+        fases["serializacao"] = max(0.0, total - medicao.duracao_rota)
+    for nome, segundos in fases.items():
+        ROTA_FASE.observar(segundos, rota=rota, fase=nome)
+    if medicao.erro:
+        ROTA_ERROS.inc(rota=rota)
+    ROTA_LINHAS.inc(medicao.linhas, rota=rota)
+    ROTA_COMANDOS.inc(medicao.comandos, rota=rota)
+
+
+def _rota(scope) -> str:
+    """
+    Rótulo da rota: as rotas da API não têm parâmetros no caminho, então o caminho da
+    requisição identifica a rota (inclusive nas respostas do cache, que não passam pelo roteador)
+    """
+    caminho, raiz = scope["path"], scope.get("root_path", "")
+    return caminho[len(raiz):] if raiz and caminho.startswith(raiz) else caminho
+
+
+class MetricasMiddleware:
+    """Middleware ASGI que mede a duração e conta as requisições HTTP por rota"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        codigo = 500
+        inicio = time.perf_counter()
+
+        async def enviar(mensagem):
+            nonlocal codigo
+            if mensagem["type"] == "http.response.start":
+                codigo = mensagem["status"]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            # Caminhos sem rota ficam num único rótulo para não multiplicar as séries
+            rota = _rota(scope) if codigo != 404 else "desconhecida"
+            HTTP_DURACAO.observar(time.perf_counter() - inicio, metodo=scope["method"], rota=rota)
+            HTTP_REQUISICOES.inc(metodo=scope["method"], rota=rota, codigo=str(codigo))
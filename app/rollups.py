@@ -0,0 +1,468 @@
+"""
+Rollups: tabelas de agregados pré-calculados a partir de transactions_sample.
+
+Cada rollup guarda somas e contagens aditivas (ou esboços HyperLogLog, combinados pelo
+máximo), então pode ser atualizado de forma incremental apenas com as linhas novas
+(created_at acima da marca d'água salva em rollup_estado). As linhas substituídas pela
+ingestão incremental (app.etl.incremental) vão para transacoes_removidas e são
+descontadas na atualização seguinte. A ingestão atualiza os rollups já construídos logo
+depois de gravar (atualizar_rollups_construidos); a primeira construção, depois de cada
+carga completa, fica com POST /admin/rollups/atualizar ou com esta CLI. As rotas pedem
+uma Fonte com as dimensões e medidas de que precisam e recebem o menor rollup capaz de
+respondê-las, ou a tabela base quando nenhum serve.
+
+Uso: python -m app.rollups
+"""
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import Connection, Date, and_, cast, delete, distinct, func, inspect, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
+
+from app import hll
+from app.database import Base
+from app.models import (
+    RollupClientes,
+    RollupClientesHLL,
+    RollupEstado,
+    RollupProdutos,
+    RollupVendasDiarias,
+    TransacaoRemovida,
+    Transaction,
+)
+
+# Tempo (s) que a contagem de linhas dos rollups fica em memória antes de ser relida
+CACHE_ESTADO_TTL = 60
+# Chave do advisory lock da ingestão incremental (exclusivo na ingestão, compartilhado nas atualizações)
+LOCK_INGESTAO = 727_002
+
+
+class Fonte:
+    """Tabela que pode responder uma consulta: mapeia dimensões e medidas para expressões SQL"""
+
+    def __init__(self, nome: str, dimensoes: Dict, medidas: Dict):
+        self.nome = nome
+        self.dimensoes = dimensoes
+        self.medidas = medidas
+
+    def atende(self, dimensoes: List[str], medidas: List[str]) -> bool:
+        return all(d in self.dimensoes for d in dimensoes) and all(m in self.medidas for m in medidas)
+
+    def dimensao(self, nome: str):
+        return self.dimensoes[nome]
+
+    def medida(self, nome: str):
+        return self.medidas[nome]
+
+
+BASE = Fonte(
+    Transaction.__tablename__,
+    dimensoes={
+        "Dia": cast(Transaction.DataFatura, Date),
+        "DataFatura": Transaction.DataFatura,
+        "Pais": Transaction.Pais,
+        "CategoriaProduto": Transaction.CategoriaProduto,
+        "CategoriaPreco": Transaction.CategoriaPreco,
+        "Ano": Transaction.Ano,
+        "Mes": Transaction.Mes,
+        "DiaSemana": Transaction.DiaSemana,
+        "SemanaAno": Transaction.SemanaAno,
+        "IDCliente": Transaction.IDCliente,
+        "CodigoProduto": Transaction.CodigoProduto,
+        "Descricao": Transaction.Descricao,
+    },
+    medidas={
+        "total_vendas": func.sum(Transaction.ValorTotalFatura),
+        "quantidade_vendas": func.count(Transaction.NumeroFatura),
+        "quantidade_itens": func.sum(Transaction.Quantidade),
+        "faturas_unicas": func.count(Transaction.NumeroFatura).filter(Transaction.FaturaUnica == True),
+        "numero_clientes": func.count(distinct(Transaction.IDCliente)),
+    },
+)
+
+FONTES_ROLLUP = [
+    Fonte(
+        RollupVendasDiarias.__tablename__,
+        dimensoes={
+            "Dia": RollupVendasDiarias.Dia,
+            "Pais": RollupVendasDiarias.Pais,
+            "CategoriaProduto": RollupVendasDiarias.CategoriaProduto,
+            "CategoriaPreco": RollupVendasDiarias.CategoriaPreco,
+            "Ano": RollupVendasDiarias.Ano,
+            "Mes": RollupVendasDiarias.Mes,
+            "DiaSemana": RollupVendasDiarias.DiaSemana,
+            "SemanaAno": RollupVendasDiarias.SemanaAno,
+        },
+        medidas={
+            "total_vendas": func.sum(RollupVendasDiarias.total_vendas),
+            "quantidade_vendas": func.sum(RollupVendasDiarias.quantidade_vendas),
+            "quantidade_itens": func.sum(RollupVendasDiarias.quantidade_itens),
+            "faturas_unicas": func.sum(RollupVendasDiarias.faturas_unicas),
+        },
+    ),
+    Fonte(
+        RollupClientes.__tablename__,
+        dimensoes={
+            "IDCliente": RollupClientes.IDCliente,
+            "Pais": RollupClientes.Pais,
+        },
+        medidas={
+            "total_vendas": func.sum(RollupClientes.total_compras),
+            "quantidade_vendas": func.sum(RollupClientes.frequencia_compras),
+            "numero_clientes": func.count(distinct(RollupClientes.IDCliente)),
+        },
+    ),
+    Fonte(
+        RollupProdutos.__tablename__,
+        dimensoes={
+            "CodigoProduto": RollupProdutos.CodigoProduto,
+            "Descricao": RollupProdutos.Descricao,
+        },
+        medidas={
+            "total_vendas": func.sum(RollupProdutos.valor_total),
+            "quantidade_itens": func.sum(RollupProdutos.quantidade_vendida),
+        },
+    ),
+]
+
+
+# Linhas removidas pela ingestão incremental, com as colunas de Transaction
+REMOVIDAS = aliased(Transaction, TransacaoRemovida.__table__, adapt_on_names=True)
+
+
+def bloquear_ingestao(db: Session):
+    """
+    Impede que uma ingestão incremental termine até o fim da transação: o limite lido
+    no início continua valendo para as linhas inseridas e removidas
+    """
+    db.execute(select(func.pg_advisory_xact_lock_shared(LOCK_INGESTAO)))
+
+
+def removidas_na_janela(marca, limite):
+    """
+    Linhas já contadas até a marca (created_at <= marca) e removidas depois dela, até o
+    limite: são descontadas na atualização incremental
+    """
+    return (
+        or_(REMOVIDAS.created_at.is_(None), REMOVIDAS.created_at <= marca),
+        TransacaoRemovida.removido_em > marca,
+        TransacaoRemovida.removido_em <= limite,
+    )
+
+
+# Definição de como cada rollup é calculado a partir da tabela base (ou das linhas removidas, em t)
+def _select_vendas_diarias(t=Transaction):
+    dia = cast(t.DataFatura, Date)
+    return (
+        select(
+            dia.label("Dia"),
+            t.Pais,
+            t.CategoriaProduto,
+            t.CategoriaPreco,
+            func.max(t.Ano).label("Ano"),
+            func.max(t.Mes).label("Mes"),
+            func.max(t.DiaSemana).label("DiaSemana"),
+            func.max(t.SemanaAno).label("SemanaAno"),
+            func.sum(t.ValorTotalFatura).label("total_vendas"),
+            func.count(t.NumeroFatura).label("quantidade_vendas"),
+            func.sum(t.Quantidade).label("quantidade_itens"),
+            func.count(t.NumeroFatura).filter(t.FaturaUnica == True).label("faturas_unicas"),
+        )
+        .group_by(dia, t.Pais, t.CategoriaProduto, t.CategoriaPreco)
+    )
+
+def _select_clientes(t=Transaction):
+    return (
+        select(
+            t.IDCliente,
+            t.Pais,
+            func.sum(t.ValorTotalFatura).label("total_compras"),
+            func.count(t.NumeroFatura).label("frequencia_compras"),
+        )
+        .group_by(t.IDCliente, t.Pais)
+    )
+
+def _select_produtos(t=Transaction):
+    return (
+        select(
+            t.CodigoProduto,
+            t.Descricao,
+            func.sum(t.Quantidade).label("quantidade_vendida"),
+            func.sum(t.ValorTotalFatura).label("valor_total"),
+        )
+        .group_by(t.CodigoProduto, t.Descricao)
+    )
+
+def _select_clientes_hll(t=Transaction):
+    dia = cast(t.DataFatura, Date)
+    registrador = hll.registrador(t.IDCliente)
+    return (
+        select(
+            dia.label("Dia"),
+            t.Pais,
+            registrador.label("registrador"),
+            func.max(hll.posto(t.IDCliente)).label("valor"),
+        )
+        .where(t.IDCliente.isnot(None))
+        .group_by(dia, t.Pais, registrador)
+    )
+
+def _somar(atual, novo):
+    return atual + novo
+
+# (modelo, consulta, colunas combinadas no upsert com o valor já existente)
+ROLLUPS = [
+    (RollupVendasDiarias, _select_vendas_diarias,
+     {c: _somar for c in ["total_vendas", "quantidade_vendas", "quantidade_itens", "faturas_unicas"]}),
+    (RollupClientes, _select_clientes, {c: _somar for c in ["total_compras", "frequencia_compras"]}),
+    (RollupProdutos, _select_produtos, {c: _somar for c in ["quantidade_vendida", "valor_total"]}),
+    (RollupClientesHLL, _select_clientes_hll, {"valor": func.greatest}),
+]
+
+# Linhas que ficam sem nenhuma transação depois de descontar as removidas. Os esboços
+# HyperLogLog não têm como descontar um cliente: superestimam até a próxima reconstrução
+VAZIAS = {
+    RollupVendasDiarias: RollupVendasDiarias.quantidade_vendas <= 0,
+    RollupClientes: RollupClientes.frequencia_compras <= 0,
+    RollupProdutos: and_(RollupProdutos.quantidade_vendida == 0, RollupProdutos.valor_total == 0),
+}
+
+# Esboços de clientes distintos: atendem filtros de período e país
+FONTE_CLIENTES_HLL = Fonte(
+    RollupClientesHLL.__tablename__,
+    dimensoes={"Dia": RollupClientesHLL.Dia, "Pais": RollupClientesHLL.Pais},
+    medidas={},
+)
+
+_cache_estado = {"expira_em": 0.0, "linhas": {}}
+
+
+def _linhas_em_cache():
+    if time.monotonic() < _cache_estado["expira_em"]:
+        return _cache_estado["linhas"]
+    return None
+
+
+def _guardar_linhas(linhas: Dict[str, int]) -> Dict[str, int]:
+    _cache_estado.update(expira_em=time.monotonic() + CACHE_ESTADO_TTL, linhas=linhas)
+    return linhas
+
+
+_consulta_estado = select(RollupEstado.tabela, RollupEstado.linhas)
+
+
+def _linhas_por_rollup(db: Session) -> Dict[str, int]:
+    """Número de linhas de cada rollup já construído (cache em memória por CACHE_ESTADO_TTL)"""
+    linhas = _linhas_em_cache()
+    if linhas is not None:
+        return linhas
+
+    try:
+        linhas = {e.tabela: e.linhas for e in db.execute(_consulta_estado).all() if e.linhas}
+    except SQLAlchemyError:
+        # Rollups ainda não criados: a sessão precisa ser liberada para as próximas consultas
+        db.rollback()
+        linhas = {}
+    return _guardar_linhas(linhas)
+
+
+async def _linhas_por_rollup_async(db: AsyncSession) -> Dict[str, int]:
+    """Versão assíncrona de _linhas_por_rollup"""
+    linhas = _linhas_em_cache()
+    if linhas is not None:
+        return linhas
+
+    try:
+        linhas = {e.tabela: e.linhas for e in (await db.execute(_consulta_estado)).all() if e.linhas}
+    except SQLAlchemyError:
+        await db.rollback()
+        linhas = {}
+    return _guardar_linhas(linhas)
+
+
+def invalidar_cache_estado():
+    _cache_estado["expira_em"] = 0.0
+
+
+def descartar_marcas(conexao: Connection):
+    """
+    Para depois de uma recarga completa de transactions_sample, na mesma transação: zera as
+    marcas d'água, para que rollups, segmentos e cestas sejam reconstruídos do zero na
+    próxima atualização, e zera as linhas dos rollups, para que as rotas leiam a tabela
+    base até lá em vez de agregados da carga anterior
+    """
+    if not inspect(conexao).has_table(RollupEstado.__tablename__):
+        return
+    conexao.execute(update(RollupEstado).values(ultimo_created_at=None))
+    conexao.execute(
+        update(RollupEstado)
+        .where(RollupEstado.tabela.in_([modelo.__tablename__ for modelo, _, _ in ROLLUPS]))
+        .values(linhas=0)
+    )
+
+
+@contextmanager
+def somente_tabela_base():
+    """Faz as rotas ignorarem os rollups dentro do bloco (usado em benchmarks e diagnósticos)"""
+    anterior = dict(_cache_estado)
+    _cache_estado.update(expira_em=float("inf"), linhas={})
+    try:
+        yield
+    finally:
+        _cache_estado.update(anterior)
+
+
+def _menor_fonte(linhas: Dict[str, int], dimensoes: List[str], medidas: List[str]) -> Fonte:
+    candidatas = [
+        f for f in FONTES_ROLLUP
+        if f.nome in linhas and f.atende(dimensoes, medidas)
+    ]
+    if not candidatas:
+        return BASE
+    return min(candidatas, key=lambda f: linhas[f.nome])
+
+
+def escolher_fonte(db: Session, dimensoes: List[str], medidas: List[str]) -> Fonte:
+    """Retorna o menor rollup que cobre as dimensões e medidas pedidas, ou a tabela base"""
+    return _menor_fonte(_linhas_por_rollup(db), dimensoes, medidas)
+
+
+async def escolher_fonte_async(db: AsyncSession, dimensoes: List[str], medidas: List[str]) -> Fonte:
+    """Versão assíncrona de escolher_fonte, para as rotas que usam AsyncSession"""
+    return _menor_fonte(await _linhas_por_rollup_async(db), dimensoes, medidas)
+
+
+async def clientes_distintos_aprox(db: AsyncSession, condicoes, dimensoes: List[str], por_pais: bool) -> Optional[Dict]:
+    """
+    Clientes distintos estimados pela combinação dos esboços HyperLogLog diários
+    Args:
+        condicoes: Função que recebe a Fonte e devolve os predicados (FiltrosAnalise.condicoes)
+        dimensoes: Dimensões exigidas pelos filtros (FiltrosAnalise.dimensoes())
+        por_pais: Uma estimativa por país em vez de uma única para o conjunto
+    Returns: Dict país -> estimativa (chave None quando por_pais=False), ou None quando
+             os esboços não existem ou não atendem os filtros
+    """
+    linhas = await _linhas_por_rollup_async(db)
+    fonte = FONTE_CLIENTES_HLL
+    if fonte.nome not in linhas or not fonte.atende(dimensoes, []):
+        return None
+
+    grupos = [RollupClientesHLL.Pais] if por_pais else []
+    # Combina os esboços (máximo por registrador) e já soma 2^-valor no banco: uma linha por grupo
+    registradores = (
+        select(*grupos, RollupClientesHLL.registrador, func.max(RollupClientesHLL.valor).label("valor"))
+        .where(*condicoes(fonte))
+        .group_by(*grupos, RollupClientesHLL.registrador)
+        .subquery()
+    )
+    consulta = select(
+        *([registradores.c.Pais] if por_pais else []),
+        func.count().label("ocupados"),
+        func.sum(func.power(2.0, -registradores.c.valor)).label("soma"),
+    ).group_by(*([registradores.c.Pais] if por_pais else []))
+
+    return {
+        (r.Pais if por_pais else None): hll.estimar(r.ocupados, float(r.soma or 0))
+        for r in (await db.execute(consulta)).all()
+    }
+
+
+def _upsert(db: Session, tabela, consulta, combinar: Dict):
+    colunas = [c.name for c in consulta.selected_columns]
+    stmt = pg_insert(tabela).from_select(colunas, consulta)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[c.name for c in tabela.primary_key],
+        set_={c: funcao(tabela.c[c], stmt.excluded[c]) for c, funcao in combinar.items()},
+    )
+    db.execute(stmt)
+
+
+def atualizar_rollups(db: Session) -> Dict[str, int]:
+    """
+    Atualiza todos os rollups com as transações inseridas desde a última execução.
+    Na primeira execução (sem marca d'água) o rollup é reconstruído por completo.
+    Returns: Dict com o número de linhas de cada rollup
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        # No backend DuckDB cada conexão tem seu próprio catálogo em memória e as rotas leem a view
+        raise RuntimeError("Rollups só estão disponíveis no backend postgres")
+
+    Base.metadata.create_all(
+        bind=db.get_bind(),
+        tables=[modelo.__table__ for modelo, _, _ in ROLLUPS] + [RollupEstado.__table__, TransacaoRemovida.__table__],
+    )
+
+    # Limite superior fixo para que linhas inseridas durante a atualização fiquem para a próxima
+    bloquear_ingestao(db)
+    limite = db.query(func.max(Transaction.created_at)).scalar()
+    resultado = {}
+
+    for modelo, consulta_rollup, combinar in ROLLUPS:
+        tabela = modelo.__table__
+        estado = db.get(RollupEstado, tabela.name)
+        marca = estado.ultimo_created_at if estado else None
+
+        if marca is not None and (limite is None or marca >= limite):
+            resultado[tabela.name] = estado.linhas
+            continue
+
+        consulta = consulta_rollup()
+        if marca is None:
+            db.execute(delete(tabela))
+            if limite is not None:
+                consulta = consulta.where(or_(Transaction.created_at.is_(None), Transaction.created_at <= limite))
+        else:
+            consulta = consulta.where(Transaction.created_at > marca, Transaction.created_at <= limite)
+
+        _upsert(db, tabela, consulta, combinar)
+        if marca is not None and modelo in VAZIAS:
+            # Desconta as linhas contadas antes e removidas pela ingestão incremental
+            removidas = consulta_rollup(REMOVIDAS).where(*removidas_na_janela(marca, limite)).subquery()
+            negadas = select(*[
+                (-c).label(c.name) if c.name in combinar else c
+                for c in removidas.columns
+            ])
+            _upsert(db, tabela, negadas, combinar)
+            db.execute(delete(tabela).where(VAZIAS[modelo]))
+
+        linhas = db.query(func.count()).select_from(tabela).scalar()
+        db.merge(RollupEstado(
+            tabela=tabela.name,
+            ultimo_created_at=limite,
+            linhas=linhas,
+            atualizado_em=datetime.now(timezone.utc),
+        ))
+        resultado[tabela.name] = linhas
+
+    db.commit()
+    invalidar_cache_estado()
+    return resultado
+
+
+def atualizar_rollups_construidos(db: Session) -> Optional[Dict[str, int]]:
+    """
+    atualizar_rollups só quando algum rollup já tem marca d'água: chamada depois de cada
+    ingestão, a atualização é incremental e a ingestão não vira uma construção completa
+    Returns: Dict com o número de linhas de cada rollup, ou None quando ainda não há rollups
+    """
+    if not inspect(db.get_bind()).has_table(RollupEstado.__tablename__):
+        return None
+    if db.query(RollupEstado).filter(RollupEstado.ultimo_created_at.isnot(None)).first() is None:
+        return None
+    return atualizar_rollups(db)
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        for tabela, linhas in atualizar_rollups(db).items():
+            print(f"{tabela}: {linhas} linhas")
+    finally:
+        db.close()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional
 from datetime import datetime
 
 # Schemas para Análise de Vendas por País
@@ -73,3 +73,116 @@ class AnaliseFaturamentoResponse(BaseModel):
     media_diaria: float
     proporcao_faturas_unicas: float
     evolucao_temporal: List[FaturamentoDiario]
+
+# Schema para o bundle (várias análises com os mesmos filtros em uma requisição)
+class AnaliseBundleResponse(BaseModel):
+    status: str
+    vendas_por_pais: Optional[AnaliseVendasPaisResponse] = None
+    temporal: Optional[AnaliseTemporalResponse] = None
+    produtos: Optional[AnaliseProdutosResponse] = None
+    clientes: Optional[AnaliseClientesResponse] = None
+    faturamento: Optional[AnaliseFaturamentoResponse] = None
+
+# Schemas para a segmentação RFM de clientes
+class SegmentoResumo(BaseModel):
+    segmento: str
+    descricao: str
+    quantidade_clientes: int
+    proporcao_clientes: float
+    recencia_media: float
+    frequencia_media: float
+    valor_monetario_medio: float
+
+class SegmentosResponse(BaseModel):
+    status: str
+    data_referencia: Optional[str] = None
+    total_clientes: int
+    segmentos: List[SegmentoResumo]
+
+class SegmentoClienteDetalhe(BaseModel):
+    id_cliente: str
+    segmento: str
+    cluster: int
+    recencia: int
+    frequencia: int
+    valor_monetario: float
+    ultima_compra: datetime
+
+class SegmentosClientesResponse(BaseModel):
+    status: str
+    data: List[SegmentoClienteDetalhe]
+    nao_encontrados: List[str]
+
+# Schemas para as regras de associação da análise de cestas
+class RegraCesta(BaseModel):
+    consequente: str
+    faturas: int
+    suporte: float
+    confianca: float
+    lift: float
+
+class RegrasCestaResponse(BaseModel):
+    status: str
+    produto: str
+    faturas_produto: int
+    total_faturas: int
+    regras: List[RegraCesta]
+
+# Schemas para a classificação de produtos novos em categorias
+class ProdutoClassificar(BaseModel):
+    codigo: str
+    descricao: Optional[str] = None
+
+class ClassificarProdutosRequest(BaseModel):
+    produtos: List[ProdutoClassificar]
+
+class ProdutoClassificado(BaseModel):
+    codigo: str
+    categoria: Optional[str] = None
+    cluster: int
+
+class ClassificarProdutosResponse(BaseModel):
+    status: str
+    versao: int
+    descricoes_unicas: int
+    cache_acertos: int
+    data: List[ProdutoClassificado]
+
+# Schemas para o detalhamento de transações (paginação por chave)
+class TransacaoDetalhe(BaseModel):
+    numero_fatura: str
+    data_fatura: datetime
+    codigo_produto: Optional[str] = None
+    descricao: Optional[str] = None
+    quantidade: Optional[int] = None
+    preco_unitario: Optional[float] = None
+    valor_total: Optional[float] = None
+    id_cliente: Optional[str] = None
+    pais: Optional[str] = None
+    categoria_produto: Optional[str] = None
+    categoria_preco: Optional[str] = None
+
+class TransacoesPaginaResponse(BaseModel):
+    status: str
+    data: List[TransacaoDetalhe]
+    proximo_cursor: Optional[str] = None
+
+# Schemas para a ingestão de transações pela API
+class RejeicaoTransacao(BaseModel):
+    linha: int
+    numero_fatura: Optional[str] = None
+    motivos: List[str]
+
+class IngestaoTransacoesResponse(BaseModel):
+    status: str
+    linhas_recebidas: int
+    linhas_aceitas: int
+    linhas_rejeitadas: int
+    faturas_novas: int
+    faturas_alteradas: int
+    faturas_inalteradas: int
+    linhas_inseridas: int
+    linhas_removidas: int
+    alteracao_id: Optional[int] = None
+    created_at: Optional[str] = None
+    rejeicoes: List[RejeicaoTransacao]
@@ -0,0 +1,216 @@
+"""
+Segmentação RFM dos clientes (Champions, Leais, Em Risco e Perdidos) com os artefatos
+treinados: o KMeans em MODEL_PATH, o StandardScaler em SCALER_PATH e a descrição do
+treino em MODEL_INFO_PATH, lidos pelo registro de app.modelos.
+
+Os atributos seguem o pré-processamento do treino: recência em dias até o dia seguinte
+à última compra da base, frequência (faturas distintas) e valor monetário por cliente,
+limitados aos percentis 1 e 99 da base de clientes, log1p e padronização pelo scaler.
+
+Como os rollups, a segmentação usa a marca d'água de created_at em rollup_estado: só os
+clientes com transações novas têm os atributos agregados de novo no banco (um GROUP BY
+por execução), assim como os que tiveram transações removidas pela ingestão incremental;
+quem fica sem transações sai da tabela. A recência e os limites dos percentis dependem
+da base inteira, então a classificação roda sobre os atributos guardados de todos os
+clientes, em lotes de SEGMENTACAO_TAMANHO_LOTE, como operações vetorizadas; só as linhas
+cuja recência ou segmento mudou são regravadas.
+
+Uso: python -m app.segmentacao
+"""
+from datetime import datetime, timezone
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, distinct, exists, func, or_, select, union, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.config.settings import get_settings
+from app.database import Base
+from app.modelos import registro_modelos
+from app.models import RollupEstado, SegmentoCliente, TransacaoRemovida, Transaction
+from app.rollups import REMOVIDAS, bloquear_ingestao, removidas_na_janela
+
+settings = get_settings()
+
+ATRIBUTOS = ["Recencia", "Frequencia", "ValorMonetario"]
+PERCENTIS_CORTE = (0.01, 0.99)
+
+
+class ModeloSegmentacao:
+    """Scaler, KMeans e nomes dos segmentos carregados dos artefatos"""
+
+    def __init__(self, scaler, modelo, info: Dict):
+        self.scaler = scaler
+        self.modelo = modelo
+        self.info = info
+        # model_info["segmentos"]: nome -> "Cluster N: descrição"
+        self.segmentos = {}
+        self.descricoes = {}
+        for nome, descricao in info["segmentos"].items():
+            cluster, _, texto = descricao.partition(":")
+            self.segmentos[int(cluster.split()[-1])] = nome
+            self.descricoes[nome] = texto.strip()
+
+    def classificar(self, recencia: np.ndarray, frequencia: np.ndarray, valor: np.ndarray) -> np.ndarray:
+        """Cluster de cada cliente; os limites de corte vêm do próprio conjunto, como no treino"""
+        atributos = np.column_stack([recencia, frequencia, valor]).astype(float)
+        inferior, superior = np.quantile(atributos, PERCENTIS_CORTE, axis=0)
+        atributos = np.log1p(np.clip(atributos, inferior, superior))
+
+        clusters = np.empty(len(atributos), dtype=int)
+        lote = settings.SEGMENTACAO_TAMANHO_LOTE
+        for inicio in range(0, len(atributos), lote):
+            parte = pd.DataFrame(atributos[inicio:inicio + lote], columns=ATRIBUTOS)
+            clusters[inicio:inicio + lote] = self.modelo.predict(self.scaler.transform(parte))
+        return clusters
+
+
+def carregar_modelo() -> ModeloSegmentacao:
+    """Modelo montado com os artefatos do registro (carregados na primeira chamada)"""
+    return ModeloSegmentacao(
+        registro_modelos.obter("scaler"),
+        registro_modelos.obter("segmentos_clientes"),
+        registro_modelos.obter("model_info"),
+    )
+
+
+def _select_atributos(limite, marca):
+    """Atributos RFM brutos dos clientes identificados (só os com transações após a marca)"""
+    consulta = (
+        select(
+            Transaction.IDCliente,
+            func.max(Transaction.DataFatura).label("UltimaCompra"),
+            func.count(distinct(Transaction.NumeroFatura)).label("Frequencia"),
+            func.coalesce(func.sum(Transaction.ValorTotalFatura), 0).label("ValorMonetario"),
+        )
+        .where(Transaction.IDCliente.is_not(None), Transaction.IDCliente != "Desconhecido")
+        .group_by(Transaction.IDCliente)
+    )
+    if limite is not None:
+        consulta = consulta.where(or_(Transaction.created_at.is_(None), Transaction.created_at <= limite))
+    if marca is not None:
+        consulta = consulta.where(Transaction.IDCliente.in_(_clientes_alterados(limite, marca)))
+    return consulta
+
+
+def _clientes_alterados(limite, marca):
+    """Clientes com transações inseridas ou removidas (ingestão incremental) entre a marca e o limite"""
+    return union(
+        select(Transaction.IDCliente).where(Transaction.created_at > marca, Transaction.created_at <= limite),
+        select(REMOVIDAS.IDCliente).where(*removidas_na_janela(marca, limite)),
+    )
+
+
+def _gravar_atributos(db: Session, linhas: list, agora: datetime):
+    tabela = SegmentoCliente.__table__
+    stmt = pg_insert(tabela)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[tabela.c.IDCliente],
+        set_={c: stmt.excluded[c] for c in ["UltimaCompra", "Frequencia", "ValorMonetario", "atualizado_em"]},
+    )
+    lote = settings.SEGMENTACAO_TAMANHO_LOTE
+    for inicio in range(0, len(linhas), lote):
+        db.execute(stmt, [{**l._asdict(), "atualizado_em": agora} for l in linhas[inicio:inicio + lote]])
+
+
+def _classificar_todos(db: Session, agora: datetime) -> Dict:
+    segmentacao = carregar_modelo()
+    clientes = db.execute(select(
+        SegmentoCliente.IDCliente, SegmentoCliente.UltimaCompra, SegmentoCliente.Frequencia,
+        SegmentoCliente.ValorMonetario, SegmentoCliente.Recencia, SegmentoCliente.Cluster,
+    )).all()
+    if not clientes:
+        return {"data_referencia": None, "clientes_reclassificados": 0}
+
+    ids, ultimas, frequencias, valores, recencias_atuais, clusters_atuais = zip(*clientes)
+    ultimas = np.array(ultimas, dtype="datetime64[us]")
+    referencia = (ultimas.max() + np.timedelta64(1, "D")).astype(datetime)
+    recencias = (np.datetime64(referencia) - ultimas).astype("timedelta64[D]").astype(int)
+    clusters = segmentacao.classificar(
+        recencias, np.array(frequencias, dtype=float), np.array(valores, dtype=float)
+    )
+
+    # Só as linhas com recência ou cluster diferentes do que já está gravado
+    atuais = np.array([-1 if r is None else r for r in recencias_atuais])
+    atuais_cluster = np.array([-1 if c is None else c for c in clusters_atuais])
+    mudaram = np.flatnonzero((atuais != recencias) | (atuais_cluster != clusters))
+    alteracoes = [
+        {
+            "IDCliente": ids[i],
+            "Recencia": int(recencias[i]),
+            "Cluster": int(clusters[i]),
+            "Segmento": segmentacao.segmentos[int(clusters[i])],
+            "atualizado_em": agora,
+        }
+        for i in mudaram
+    ]
+    lote = settings.SEGMENTACAO_TAMANHO_LOTE
+    for inicio in range(0, len(alteracoes), lote):
+        db.execute(update(SegmentoCliente), alteracoes[inicio:inicio + lote])
+    return {"data_referencia": referencia.date().isoformat(), "clientes_reclassificados": len(alteracoes)}
+
+
+def atualizar_segmentos(db: Session) -> Dict:
+    """
+    Recalcula os atributos RFM dos clientes com transações novas e reclassifica a base.
+    Na primeira execução (sem marca d'água) todos os clientes são calculados.
+    Returns: Dict com os clientes recalculados, reclassificados, o total e a data de referência
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        raise RuntimeError("Segmentação só está disponível no backend postgres")
+
+    Base.metadata.create_all(
+        bind=db.get_bind(),
+        tables=[SegmentoCliente.__table__, RollupEstado.__table__, TransacaoRemovida.__table__],
+    )
+
+    tabela = SegmentoCliente.__tablename__
+    bloquear_ingestao(db)
+    limite = db.query(func.max(Transaction.created_at)).scalar()
+    estado = db.get(RollupEstado, tabela)
+    marca = estado.ultimo_created_at if estado else None
+    agora = datetime.now(timezone.utc)
+
+    if marca is not None and (limite is None or marca >= limite):
+        linhas = []
+    else:
+        if marca is None:
+            db.execute(delete(SegmentoCliente))
+        linhas = db.execute(_select_atributos(limite, marca)).all()
+        _gravar_atributos(db, linhas, agora)
+        if marca is not None:
+            # Clientes cujas transações foram todas removidas saem da segmentação
+            db.execute(
+                delete(SegmentoCliente)
+                .where(
+                    SegmentoCliente.IDCliente.in_(_clientes_alterados(limite, marca)),
+                    ~exists().where(Transaction.IDCliente == SegmentoCliente.IDCliente),
+                )
+                .execution_options(synchronize_session=False)
+            )
+
+    resultado = {"clientes_recalculados": len(linhas)}
+    resultado.update(_classificar_todos(db, agora))
+    resultado["total_clientes"] = db.query(func.count()).select_from(SegmentoCliente).scalar()
+
+    db.merge(RollupEstado(
+        tabela=tabela,
+        ultimo_created_at=limite,
+        linhas=resultado["total_clientes"],
+        atualizado_em=agora,
+    ))
+    db.commit()
+    return resultado
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        for chave, valor in atualizar_segmentos(db).items():
+            print(f"{chave}: {valor}")
+    finally:
+        db.close()
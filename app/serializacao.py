@@ -0,0 +1,80 @@
+"""
+Serialização rápida das respostas das rotas de análise.
+
+As rotas montam a resposta como dict, na ordem dos campos do schema, e as listas de linhas
+como Tabela: uma lista por coluna, convertida de uma vez a partir das linhas da consulta,
+sem um modelo Pydantic por linha. RespostaJSON serializa esse dict com orjson e é devolvida
+diretamente, sem passar pela validação do response_model (que continua documentando o
+schema). O JSON gerado é o mesmo do schema correspondente em app.schemas.
+
+Com VALIDAR_RESPOSTAS=true (modo de depuração) cada resposta é validada pelo schema
+antes de ser enviada.
+"""
+from operator import attrgetter
+from typing import Dict, List, Type
+
+import orjson
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from app.config.settings import get_settings
+
+settings = get_settings()
+
+# Datas com fuso em UTC saem com "Z", como na serialização do Pydantic
+_OPCOES_ORJSON = orjson.OPT_UTC_Z
+
+
+class Tabela:
+    """Linhas de uma lista do schema (itens do tipo modelo) guardadas por coluna"""
+
+    def __init__(self, modelo: Type[BaseModel], **colunas: list):
+        self.modelo = modelo
+        self.colunas = colunas
+
+    def __len__(self) -> int:
+        return len(next(iter(self.colunas.values()), ()))
+
+    def linhas(self) -> List[Dict]:
+        """Uma linha por item, com as chaves na ordem dos campos do modelo"""
+        campos = [c for c in self.modelo.model_fields if c in self.colunas]
+        return [dict(zip(campos, valores)) for valores in zip(*(self.colunas[c] for c in campos))]
+
+
+def colunas(linhas: list, *nomes: str) -> List[list]:
+    """Colunas de um resultado, uma lista por nome, na ordem pedida"""
+    return [list(map(attrgetter(nome), linhas)) for nome in nomes]
+
+
+def _padrao(valor):
+    if isinstance(valor, Tabela):
+        return valor.linhas()
+    if isinstance(valor, BaseModel):
+        return valor.model_dump(mode="json")
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def _para_validacao(valor):
+    if isinstance(valor, Tabela):
+        return valor.linhas()
+    if isinstance(valor, dict):
+        return {k: _para_validacao(v) for k, v in valor.items()}
+    return valor
+
+
+def validar(resposta: Dict, modelo: Type[BaseModel]):
+    """Valida a resposta pelo schema (só em modo de depuração)"""
+    if settings.VALIDAR_RESPOSTAS:
+        modelo.model_validate(_para_validacao(resposta))
+
+
+class RespostaJSON(Response):
+    """Resposta JSON serializada com orjson; guarda o status para as métricas da rota"""
+    media_type = "application/json"
+
+    def __init__(self, conteudo: Dict, **kwargs):
+        self.status = conteudo.get("status")
+        super().__init__(conteudo, **kwargs)
+
+    def render(self, conteudo) -> bytes:
+        return orjson.dumps(conteudo, default=_padrao, option=_OPCOES_ORJSON)
@@ -0,0 +1,183 @@
+"""
+Benchmark: consultas separadas (formato anterior das rotas) vs. leitura única com GROUPING SETS.
+
+Para cada endpoint mede o número de comandos SQL, quantas vezes transactions_sample é lida
+(nós de scan no EXPLAIN), o tempo mediano gasto no banco e o tempo de parede mediano (que na
+versão agrupada inclui a montagem da resposta pela rota). Os rollups são ignorados para que
+as duas versões leiam a tabela base.
+
+Uso: python -m benchmarks.consultas_agrupadas [repeticoes]
+"""
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+from sqlalchemy import distinct, event, func, text
+
+from app.api.routes import get_analise_clientes, get_analise_faturamento, get_analise_temporal
+from app.database import AsyncSessionLocal, SessionLocal, async_engine, engine
+from app.filtros import FiltrosAnalise
+from app.models import Transaction
+from app.rollups import somente_tabela_base
+
+
+# Formato anterior: uma consulta (e uma leitura da tabela) por agregação
+def temporal_anterior(db):
+    for coluna in (Transaction.Mes, Transaction.DiaSemana, Transaction.SemanaAno):
+        (
+            db.query(
+                coluna,
+                func.sum(Transaction.ValorTotalFatura),
+                func.count(Transaction.NumeroFatura)
+            )
+            .group_by(coluna)
+            .order_by(coluna)
+            .all()
+        )
+
+def faturamento_anterior(db):
+    db.query(func.avg(Transaction.ValorTotalFatura)).scalar()
+    db.query(func.count(Transaction.NumeroFatura)).scalar()
+    db.query(func.count(Transaction.NumeroFatura)).filter(Transaction.FaturaUnica == True).scalar()
+    (
+        db.query(
+            Transaction.DataFatura,
+            func.sum(Transaction.ValorTotalFatura),
+            func.count(Transaction.NumeroFatura)
+        )
+        .group_by(Transaction.DataFatura)
+        .order_by(Transaction.DataFatura)
+        .all()
+    )
+
+def clientes_anterior(db):
+    (
+        db.query(
+            Transaction.IDCliente,
+            func.sum(Transaction.ValorTotalFatura),
+            func.count(Transaction.NumeroFatura),
+            func.max(Transaction.Pais)
+        )
+        .group_by(Transaction.IDCliente)
+        .order_by(func.sum(Transaction.ValorTotalFatura).desc())
+        .limit(10)
+        .all()
+    )
+    db.query(Transaction.Pais, func.count(distinct(Transaction.IDCliente))).group_by(Transaction.Pais).all()
+    db.query(func.count(Transaction.NumeroFatura) / func.count(distinct(Transaction.IDCliente))).scalar()
+
+
+# As rotas são assíncronas: todas as chamadas usam o mesmo event loop (e o mesmo pool de conexões)
+_loop = asyncio.new_event_loop()
+
+
+def _rota(rota):
+    async def executar():
+        async with AsyncSessionLocal() as db:
+            await rota(filtros=FiltrosAnalise(), db=db)
+
+    return lambda db: _loop.run_until_complete(executar())
+
+
+CENARIOS = [
+    ("temporal", temporal_anterior, _rota(get_analise_temporal)),
+    ("faturamento", faturamento_anterior, _rota(get_analise_faturamento)),
+    ("clientes", clientes_anterior, _rota(get_analise_clientes)),
+]
+
+ENGINES = (engine, async_engine.sync_engine)
+
+
+def _contar_scans(plano, tabela):
+    """Conta os nós do plano que leem a tabela informada"""
+    total = 1 if plano.get("Relation Name") == tabela else 0
+    return total + sum(_contar_scans(p, tabela) for p in plano.get("Plans", []))
+
+
+def _explicar(db, assincrono, statement, parameters):
+    """EXPLAIN do comando no mesmo driver que o executou (asyncpg usa parâmetros $n)"""
+    explain = f"EXPLAIN (FORMAT JSON) {statement}"
+    if not assincrono:
+        return db.connection().exec_driver_sql(explain, parameters).scalar()
+
+    async def executar():
+        async with async_engine.connect() as conn:
+            return (await conn.exec_driver_sql(explain, tuple(parameters))).scalar()
+
+    return _loop.run_until_complete(executar())
+
+
+def medir(db, funcao, repeticoes):
+    comandos = []
+
+    def capturar(conn, cursor, statement, parameters, context, executemany):
+        # Só as consultas contam: o SET LOCAL statement_timeout de cada transação fica de fora
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            comandos.append((conn.engine is async_engine.sync_engine, statement, parameters))
+
+    for e in ENGINES:
+        event.listen(e, "before_cursor_execute", capturar)
+    try:
+        funcao(db)
+    finally:
+        for e in ENGINES:
+            event.remove(e, "before_cursor_execute", capturar)
+
+    scans = 0
+    for assincrono, statement, parameters in comandos:
+        plano = _explicar(db, assincrono, statement, parameters)
+        if isinstance(plano, str):
+            plano = json.loads(plano)
+        scans += _contar_scans(plano[0]["Plan"], Transaction.__tablename__)
+
+    tempos_banco = []
+    tempos = []
+    inicio_comando = []
+
+    def iniciar(conn, cursor, statement, parameters, context, executemany):
+        inicio_comando.append(time.perf_counter())
+
+    def finalizar(conn, cursor, statement, parameters, context, executemany):
+        tempos_banco[-1] += time.perf_counter() - inicio_comando.pop()
+
+    for e in ENGINES:
+        event.listen(e, "before_cursor_execute", iniciar)
+        event.listen(e, "after_cursor_execute", finalizar)
+    try:
+        for _ in range(repeticoes):
+            tempos_banco.append(0.0)
+            inicio = time.perf_counter()
+            funcao(db)
+            tempos.append(time.perf_counter() - inicio)
+    finally:
+        for e in ENGINES:
+            event.remove(e, "before_cursor_execute", iniciar)
+            event.remove(e, "after_cursor_execute", finalizar)
+
+    return len(comandos), scans, statistics.median(tempos_banco) * 1000, statistics.median(tempos) * 1000
+
+
+def main(repeticoes=5):
+    db = SessionLocal()
+    try:
+        total_linhas = db.execute(text(f"SELECT COUNT(*) FROM {Transaction.__tablename__}")).scalar()
+        print(f"{Transaction.__tablename__}: {total_linhas} linhas, {repeticoes} repetições\n")
+        print(f"{'endpoint':<12} {'versão':<10} {'comandos':>8} {'scans':>6} {'banco (ms)':>11} {'total (ms)':>11}")
+        with somente_tabela_base():
+            for nome, anterior, agrupada in CENARIOS:
+                resultados = {}
+                for versao, funcao in (("anterior", anterior), ("agrupada", agrupada)):
+                    resultados[versao] = medir(db, funcao, repeticoes)
+                    comandos, scans, banco, total = resultados[versao]
+                    print(f"{nome:<12} {versao:<10} {comandos:>8} {scans:>6} {banco:>11.1f} {total:>11.1f}")
+                economia = [a - b for a, b in zip(resultados["anterior"], resultados["agrupada"])]
+                print(f"{'':<12} {'economia':<10} {economia[0]:>8} {economia[1]:>6} "
+                      f"{economia[2]:>11.1f} {economia[3]:>11.1f}\n")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
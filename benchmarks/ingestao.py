@@ -0,0 +1,149 @@
+"""
+Benchmark: validação e derivação das transações recebidas por POST /transacoes/ingerir com
+um modelo Pydantic por linha vs. máscaras por coluna (app.ingestao), e leitura do corpo em
+JSON, NDJSON e Arrow.
+
+Usa transações sintéticas com o formato do arquivo original (faturas de 1 a 20 linhas e
+cerca de 2% de linhas inválidas), então não precisa de banco; a gravação (app.etl.incremental)
+fica de fora. Mede o tempo mediano de leitura e de validação + derivação, confere que os dois
+caminhos rejeitam as mesmas linhas e compara a vazão de cada formato com METAS.
+
+Uso: python -m benchmarks.ingestao [linhas] [repeticoes]
+"""
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+import orjson
+import pandas as pd
+from pydantic import BaseModel, ValidationError, field_validator
+
+from app.etl.transformacoes import PRECO_MINIMO, QUANTIDADE_MINIMA, derivar_colunas, preencher
+from app.ingestao import ler_corpo, preparar_lote
+
+# Vazão mínima (linhas/s) de leitura + validação + derivação por formato
+METAS = {"json": 100_000, "ndjson": 100_000, "arrow": 250_000}
+
+
+def gerar_linhas(n: int, semente: int = 7) -> list:
+    rng = np.random.default_rng(semente)
+    faturas = np.cumsum(rng.random(n) < 0.1) + 600000
+    inicio = datetime(2011, 1, 1)
+    linhas = [
+        {
+            "NumeroFatura": str(f),
+            "CodigoProduto": f"{22000 + (i * 7919) % 3000}",
+            "Descricao": f"PRODUTO {(i * 7919) % 3000}",
+            "Quantidade": int(rng.integers(1, 24)),
+            "DataFatura": (inicio + timedelta(minutes=int(f - 600000) * 13)).isoformat(),
+            "PrecoUnitario": round(float(rng.uniform(0.2, 30)), 2),
+            "IDCliente": str(12000 + int(f) % 4000),
+            "Pais": "United Kingdom" if f % 5 else "France",
+        }
+        for i, f in enumerate(faturas)
+    ]
+    # Linhas inválidas: quantidade fracionária, data ilegível, sem país e sem fatura
+    for i in rng.choice(n, n // 50, replace=False):
+        campo, valor = [("Quantidade", 1.5), ("DataFatura", "ontem"), ("Pais", None), ("NumeroFatura", None)][i % 4]
+        linhas[i][campo] = valor
+    return linhas
+
+
+def corpos(linhas: list) -> dict:
+    import pyarrow as pa
+
+    tabela = pa.Table.from_pylist(linhas, schema=pa.schema([
+        ("NumeroFatura", pa.string()), ("CodigoProduto", pa.string()), ("Descricao", pa.string()),
+        ("Quantidade", pa.float64()), ("DataFatura", pa.string()), ("PrecoUnitario", pa.float64()),
+        ("IDCliente", pa.string()), ("Pais", pa.string()),
+    ]))
+    arrow = pa.BufferOutputStream()
+    with pa.ipc.new_stream(arrow, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    return {
+        "json": orjson.dumps(linhas),
+        "ndjson": b"\n".join(orjson.dumps(l) for l in linhas),
+        "arrow": arrow.getvalue().to_pybytes(),
+    }
+
+
+# Formato descartado: um modelo Pydantic por linha
+class TransacaoEntrada(BaseModel):
+    NumeroFatura: str
+    CodigoProduto: str
+    Descricao: Optional[str] = None
+    Quantidade: int
+    DataFatura: datetime
+    PrecoUnitario: float
+    IDCliente: Optional[str] = None
+    Pais: str
+
+    @field_validator("PrecoUnitario")
+    @classmethod
+    def preco_nao_negativo(cls, valor):
+        if valor < 0:
+            raise ValueError("preço negativo")
+        return valor
+
+
+def preparar_por_linha(linhas: list):
+    validas, rejeitadas = [], []
+    for i, linha in enumerate(linhas):
+        try:
+            validas.append(TransacaoEntrada(**linha).model_dump())
+        except ValidationError:
+            rejeitadas.append(i)
+    lote = pd.DataFrame(validas)
+    # Faturas com linha inválida saem inteiras; depois os filtros do ETL
+    invalidas = {linhas[i]["NumeroFatura"] for i in rejeitadas}
+    lote = lote[~lote["NumeroFatura"].isin(invalidas)]
+    lote = lote[(lote["Quantidade"] >= QUANTIDADE_MINIMA) & (lote["PrecoUnitario"] > PRECO_MINIMO)].drop_duplicates()
+    lote = preencher(lote.astype({"Quantidade": float}))
+    faturas_por_cliente = lote.groupby("IDCliente")["NumeroFatura"].nunique()
+    return derivar_colunas(lote, faturas_por_cliente), rejeitadas
+
+
+def medir(funcao, repeticoes: int):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return resultado, statistics.median(tempos)
+
+
+def main(linhas=100000, repeticoes=5):
+    dados = gerar_linhas(linhas)
+    formatos = corpos(dados)
+    print(f"ingestão: {linhas} linhas, {repeticoes} repetições\n")
+
+    print(f"{'versão':<22} {'leitura (ms)':>13} {'validação (ms)':>15} {'linhas/s':>10} {'meta':>9}")
+    objetos, leitura = medir(lambda: orjson.loads(formatos["json"]), repeticoes)
+    (por_linha, rejeitadas_por_linha), validacao = medir(lambda: preparar_por_linha(objetos), repeticoes)
+    vazao = linhas / (leitura + validacao)
+    print(f"{'pydantic (json)':<22} {leitura * 1000:>13.1f} {validacao * 1000:>15.1f} {vazao:>10.0f} {'-':>9}")
+
+    aceitas_por_formato = {}
+    for tipo, corpo in formatos.items():
+        bruto, leitura = medir(lambda: ler_corpo(corpo, tipo), repeticoes)
+        (aceitas, rejeitadas), validacao = medir(lambda: preparar_lote(bruto, categorias=False), repeticoes)
+        aceitas_por_formato[tipo] = (aceitas, rejeitadas)
+        vazao = linhas / (leitura + validacao)
+        situacao = "atende" if vazao >= METAS[tipo] else "abaixo"
+        print(f"{'colunas (' + tipo + ')':<22} {leitura * 1000:>13.1f} {validacao * 1000:>15.1f} {vazao:>10.0f} {situacao:>9}")
+
+    aceitas, rejeitadas = aceitas_por_formato["json"]
+    motivos = dict(zip(rejeitadas["linha"], rejeitadas["motivos"]))
+    invalidas = sorted(l for l, m in motivos.items() if not {"fatura_com_linha_invalida", "linha_duplicada",
+                                                              "quantidade_abaixo_minima", "preco_abaixo_minimo"} >= set(m))
+    iguais = all(a.equals(aceitas) for a, _ in aceitas_por_formato.values())
+    print(f"\nmesmas linhas inválidas que o Pydantic: {'sim' if invalidas == rejeitadas_por_linha else 'não'}")
+    print(f"mesmas linhas aceitas: {'sim' if len(aceitas) == len(por_linha) else 'não'} ({len(aceitas)} de {linhas})")
+    print(f"formatos com o mesmo resultado: {'sim' if iguais else 'não'}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
@@ -0,0 +1,100 @@
+"""
+Benchmark: resposta montada com um modelo Pydantic por linha e serializada pelo
+response_model (formato anterior) vs. Tabela por colunas serializada com orjson.
+
+Usa uma série de faturamento sintética com o formato das linhas da consulta da rota (Decimal
+nas somas, datas com fuso), então não precisa de banco. Mede o tempo mediano de montagem
+e de serialização e confere que os dois caminhos geram o mesmo JSON.
+
+Uso: python -m benchmarks.serializacao [linhas] [repeticoes]
+"""
+import json
+import statistics
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from pydantic import TypeAdapter
+
+from app.api.routes import _montar_faturamento
+from app.schemas import AnaliseFaturamentoResponse, FaturamentoDiario
+from app.serializacao import RespostaJSON
+
+Linha = namedtuple("Linha", ["total_geral", "DataFatura", "valor_total", "quantidade_faturas", "faturas_unicas"])
+
+
+def gerar_linhas(n: int) -> list:
+    inicio = datetime(2011, 1, 1, tzinfo=timezone.utc)
+    linhas = [
+        Linha(0, inicio + timedelta(minutes=7 * i), Decimal(f"{(i * 37) % 5000 + 1}.{i % 100:02d}"), i % 40 + 1, i % 3)
+        for i in range(n)
+    ]
+    total = Linha(1, None, sum(l.valor_total for l in linhas), sum(l.quantidade_faturas for l in linhas),
+                  sum(l.faturas_unicas for l in linhas))
+    return linhas + [total]
+
+
+# Formato anterior: um FaturamentoDiario por linha e serialização pelo response_model
+def montar_anterior(resultados):
+    evolucao = [r for r in resultados if r.total_geral == 0]
+    totais = next(r for r in resultados if r.total_geral == 1)
+    total_faturas = totais.quantidade_faturas or 0
+    return AnaliseFaturamentoResponse(
+        status="success",
+        media_diaria=float(totais.valor_total / total_faturas if total_faturas > 0 else 0),
+        proporcao_faturas_unicas=float(totais.faturas_unicas / total_faturas if total_faturas > 0 else 0),
+        evolucao_temporal=[
+            FaturamentoDiario(
+                data=e.DataFatura,
+                valor_total=float(e.valor_total),
+                quantidade_faturas=e.quantidade_faturas,
+                ticket_medio=float(e.valor_total/e.quantidade_faturas)
+            ) for e in evolucao
+        ]
+    )
+
+
+_adaptador = TypeAdapter(AnaliseFaturamentoResponse)
+
+
+def serializar_anterior(resposta) -> bytes:
+    # O que o FastAPI faz com o retorno da rota: valida pelo response_model, converte para
+    # tipos JSON e o JSONResponse gera o corpo com json.dumps
+    conteudo = _adaptador.dump_python(_adaptador.validate_python(resposta), mode="json")
+    return json.dumps(conteudo, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def serializar_rapida(resposta) -> bytes:
+    return RespostaJSON(resposta).body
+
+
+def medir(montar, serializar, resultados, repeticoes):
+    tempos_montagem, tempos_serializacao = [], []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resposta = montar(resultados)
+        meio = time.perf_counter()
+        corpo = serializar(resposta)
+        tempos_montagem.append(meio - inicio)
+        tempos_serializacao.append(time.perf_counter() - meio)
+    return corpo, statistics.median(tempos_montagem) * 1000, statistics.median(tempos_serializacao) * 1000
+
+
+def main(linhas=50000, repeticoes=5):
+    resultados = gerar_linhas(linhas)
+    print(f"faturamento: {linhas} linhas, {repeticoes} repetições\n")
+    print(f"{'versão':<10} {'montagem (ms)':>14} {'serialização (ms)':>18} {'total (ms)':>11}")
+    corpos = {}
+    for versao, montar, serializar in (
+        ("anterior", montar_anterior, serializar_anterior),
+        ("rápida", _montar_faturamento, serializar_rapida),
+    ):
+        corpos[versao], montagem, serializacao = medir(montar, serializar, resultados, repeticoes)
+        print(f"{versao:<10} {montagem:>14.1f} {serializacao:>18.1f} {montagem + serializacao:>11.1f}")
+    print(f"\nJSON idêntico: {'sim' if corpos['anterior'] == corpos['rápida'] else 'não'}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
@@ -120,6 +120,11 @@ st.markdown("""
                 <li>Demonstração de códigos e implementação</li>
             </ul>
         </li>
+        <li><span class="highlight">9. Explorar Transações</span>
+            <ul>
+                <li>Detalhamento das transações por produto, cliente, país ou período</li>
+            </ul>
+        </li>
     </ul>
 </div>
 """, unsafe_allow_html=True)
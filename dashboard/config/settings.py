@@ -16,4 +16,7 @@ class Settings:
     ENDPOINT_PRODUTOS = f"{API_BASE_URL}/api/v1/analise/produtos"
     ENDPOINT_CLIENTES = f"{API_BASE_URL}/api/v1/analise/clientes"
     ENDPOINT_FATURAMENTO = f"{API_BASE_URL}/api/v1/analise/faturamento"
+    ENDPOINT_BUNDLE = f"{API_BASE_URL}/api/v1/analise/bundle"
+    ENDPOINT_EXPORTAR = f"{API_BASE_URL}/api/v1/transacoes/exportar"
+    ENDPOINT_TRANSACOES = f"{API_BASE_URL}/api/v1/transacoes"
 
@@ -7,6 +7,7 @@ import requests
 from dotenv import load_dotenv
 import os
 import json
+import time
 from datetime import datetime, timedelta
 
 # Carregar variáveis de ambiente
@@ -50,8 +51,22 @@ class SerperAPI:
 
 class RetailAPI:
     """Classe para gerenciar chamadas à API de dados de varejo"""
+    # Tempo (s) que o bundle de análises fica guardado antes de ser buscado novamente
+    BUNDLE_TTL = 600
+
     def __init__(self):
         self.base_url = "https://render-api-rvd7.onrender.com/api/v1/analise"
+        self._bundle = None
+        self._bundle_expira_em = 0.0
+
+    def _get_bundle(self):
+        """Todas as análises em uma requisição, reaproveitadas entre as execuções da página"""
+        if self._bundle is None or time.monotonic() >= self._bundle_expira_em:
+            response = requests.get(f"{self.base_url}/bundle")
+            response.raise_for_status()
+            self._bundle = response.json()
+            self._bundle_expira_em = time.monotonic() + self.BUNDLE_TTL
+        return self._bundle
         
     def get_data(self, analysis_type):
         endpoint_mapping = {
@@ -67,10 +82,7 @@ class RetailAPI:
             if not endpoint:
                 raise ValueError(f"Tipo de análise inválido: {analysis_type}")
 
-            url = f"{self.base_url}{endpoint}"
-            response = requests.get(url)
-            response.raise_for_status()
-            return response.json()
+            return self._get_bundle()[endpoint.lstrip('/').replace('-', '_')]
         except requests.RequestException as e:
             raise Exception(f"Erro ao obter dados da API: {str(e)}")
 
@@ -7,7 +7,6 @@ import requests
 from dotenv import load_dotenv
 import os
 import json
-import time
 
 load_dotenv()
 
@@ -46,38 +45,40 @@ class RetailAPI:
         try:
             response = requests.get(f"{self.base_url}{endpoint}")
             response.raise_for_status()
-            data = response.json()
-            
-            if data.get('status') == 'success':
-                if endpoint == '/vendas-por-pais':
-                    return sorted(
-                        data.get('data', []),
-                        key=lambda x: x.get('total_vendas', 0),
-                        reverse=True
-                    )[:5]
-                    
-                elif endpoint == '/produtos':
-                    return sorted(
-                        data.get('data', []),
-                        key=lambda x: x.get('valor_total', 0),
-                        reverse=True
-                    )[:5]
-                    
-                elif endpoint == '/clientes':
-                    return [c for c in data.get('top_clientes', [])[:5]
-                           if c.get('id_cliente') != 'Desconhecido']
-                    
-                elif endpoint == '/faturamento':
-                    return {
-                        'media_diaria': data.get('media_diaria'),
-                        'crescimento': data.get('crescimento_mes_anterior')
-                    }
-            return []
+            return self.processar_dados(endpoint, response.json())
         except Exception as e:
             st.error(f"Erro no endpoint {endpoint}: {str(e)}")
             return None
+
+    def processar_dados(self, endpoint, data):
+        if data.get('status') == 'success':
+            if endpoint == '/vendas-por-pais':
+                return sorted(
+                    data.get('data', []),
+                    key=lambda x: x.get('total_vendas', 0),
+                    reverse=True
+                )[:5]
+                
+            elif endpoint == '/produtos':
+                return sorted(
+                    data.get('data', []),
+                    key=lambda x: x.get('valor_total', 0),
+                    reverse=True
+                )[:5]
+                
+            elif endpoint == '/clientes':
+                return [c for c in data.get('top_clientes', [])[:5]
+                       if c.get('id_cliente') != 'Desconhecido']
+                
+            elif endpoint == '/faturamento':
+                return {
+                    'media_diaria': data.get('media_diaria'),
+                    'crescimento': data.get('crescimento_mes_anterior')
+                }
+        return []
     
     def get_all_data(self):
+        """Busca as quatro análises em uma única requisição ao endpoint /bundle"""
         data = {}
         endpoints = {
             'vendas': '/vendas-por-pais',
@@ -85,12 +86,22 @@ class RetailAPI:
             'clientes': '/clientes',
             'faturamento': '/faturamento'
         }
-        
+
+        try:
+            response = requests.get(
+                f"{self.base_url}/bundle",
+                params={'analises': [endpoint.lstrip('/') for endpoint in endpoints.values()]}
+            )
+            response.raise_for_status()
+            bundle = response.json()
+        except Exception as e:
+            st.error(f"Erro no endpoint /bundle: {str(e)}")
+            return data
+
         for key, endpoint in endpoints.items():
-            result = self.get_endpoint_data(endpoint)
+            result = self.processar_dados(endpoint, bundle.get(endpoint.lstrip('/').replace('-', '_'), {}))
             if result:
                 data[key] = result
-            time.sleep(0.5)
         
         return data
 
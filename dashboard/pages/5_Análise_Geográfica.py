@@ -34,10 +34,13 @@ if 'filtro_pais' not in st.session_state:
 
 # Cache para dados da API
 @st.cache_data(ttl=3600)  # Cache por 1 hora
-def carregar_vendas_por_pais():
+def carregar_vendas_por_pais(data_inicio, data_fim):
     try:
         client = APIClient()
-        dados_pais = client.get_vendas_por_pais()
+        dados_pais = client.get_vendas_por_pais(
+            data_inicio=data_inicio.strftime("%Y-%m-%d"),
+            data_fim=data_fim.strftime("%Y-%m-%d")
+        )
         if not isinstance(dados_pais, pd.DataFrame):
             dados_pais = pd.DataFrame(dados_pais['data'])
         return dados_pais
@@ -58,32 +61,32 @@ def calcular_kpis(dados_pais):
 st.title("🌎 Análise Geográfica de Vendas")
 st.markdown("---")
 
-# Carregando dados
-dados_pais = carregar_vendas_por_pais()
+# Filtros
+with st.expander("Filtros", expanded=False):
+    col1, col2 = st.columns(2)
+    with col1:
+        start_date = st.date_input(
+            "Data Início",
+            value=st.session_state.data_inicio,
+            min_value=datetime(2011, 1, 4),
+            max_value=datetime(2011, 12, 31)
+        )
+    with col2:
+        end_date = st.date_input(
+            "Data Fim",
+            value=st.session_state.data_fim,
+            min_value=datetime(2011, 1, 4),
+            max_value=datetime(2011, 12, 31)
+        )
 
-if dados_pais is not None:
-    # Filtros
-    with st.expander("Filtros", expanded=False):
-        col1, col2 = st.columns(2)
-        with col1:
-            start_date = st.date_input(
-                "Data Início",
-                value=st.session_state.data_inicio,
-                min_value=datetime(2011, 1, 4),
-                max_value=datetime(2011, 12, 31)
-            )
-        with col2:
-            end_date = st.date_input(
-                "Data Fim",
-                value=st.session_state.data_fim,
-                min_value=datetime(2011, 1, 4),
-                max_value=datetime(2011, 12, 31)
-            )
-        
-        # Atualizar session state
-        st.session_state.data_inicio = start_date
-        st.session_state.data_fim = end_date
+    # Atualizar session state
+    st.session_state.data_inicio = start_date
+    st.session_state.data_fim = end_date
+
+# Carregando dados (o período é filtrado pela API)
+dados_pais = carregar_vendas_por_pais(st.session_state.data_inicio, st.session_state.data_fim)
 
+if dados_pais is not None:
     # Cálculo de KPIs
     kpis = calcular_kpis(dados_pais)
 
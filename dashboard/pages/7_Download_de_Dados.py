@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+import tempfile
 from datetime import date
 from utils.api import APIClient
 from locale_config import setup_locale, format_number, format_brl
@@ -54,6 +55,44 @@ def carregar_dados_temporais(data_inicio, data_fim):
         st.error(f"Erro ao carregar dados: {str(e)}")
         return None
 
+# Formatos aceitos pela exportação de transações: rótulo -> (formato da API, extensão, mime)
+FORMATOS_EXPORTACAO = {
+    "CSV": ("csv", "csv", "text/csv"),
+    "NDJSON (JSON por linha)": ("ndjson", "ndjson", "application/x-ndjson"),
+    "Parquet": ("parquet", "parquet", "application/vnd.apache.parquet"),
+}
+
+def exportar_transacoes(data_inicio, data_fim, formato, extensao):
+    """
+    Baixa as transações do período em streaming para um arquivo temporário,
+    sem manter o conteúdo inteiro em memória durante a transferência
+    """
+    progresso = st.empty()
+    arquivo = tempfile.NamedTemporaryFile(suffix=f".{extensao}", delete=False)
+    try:
+        with arquivo:
+            total = APIClient().exportar_transacoes(
+                arquivo,
+                formato=formato,
+                ao_receber=lambda n: progresso.caption(f"Recebidos {formatar_numero(n / 1024)} KB..."),
+                data_inicio=data_inicio.strftime("%Y-%m-%d"),
+                data_fim=data_fim.strftime("%Y-%m-%d")
+            )
+        progresso.caption(f"Arquivo gerado: {formatar_numero(total / 1024)} KB")
+        return arquivo.name
+    except Exception as e:
+        progresso.empty()
+        st.error(f"Erro ao exportar transações: {str(e)}")
+        return None
+
+def previa_exportacao(caminho, formato):
+    """Lê apenas as primeiras linhas do arquivo exportado"""
+    if formato == "csv":
+        return pd.read_csv(caminho, nrows=100)
+    if formato == "ndjson":
+        return pd.read_json(caminho, lines=True, nrows=100)
+    return None
+
 def formatar_dados(df, selected_fields):
     """
     Formata os dados numéricos usando as funções de formatação padrão
@@ -110,7 +149,7 @@ def main():
             )
 
     # Tabs para organizar a interface
-    tab1, tab2 = st.tabs(["📋 Seleção de Campos", "📊 Visualização e Download"])
+    tab1, tab2, tab3 = st.tabs(["📋 Seleção de Campos", "📊 Visualização e Download", "📦 Transações Detalhadas"])
 
     with tab1:
         # Descrição dos campos disponíveis
@@ -184,6 +223,36 @@ def main():
                 else:
                     st.error("Não foram encontrados dados para o período selecionado.")
 
+    with tab3:
+        st.markdown("""
+        Exporta as transações individuais do período selecionado. O arquivo é gerado
+        pela API em lotes e recebido aos poucos, então períodos longos não travam a página.
+        """)
+        rotulo = st.selectbox("Formato do arquivo", list(FORMATOS_EXPORTACAO))
+        formato, extensao, mime = FORMATOS_EXPORTACAO[rotulo]
+
+        if st.button("📦 Gerar Arquivo de Transações", type="primary"):
+            with st.spinner('Exportando transações...'):
+                caminho = exportar_transacoes(data_inicio, data_fim, formato, extensao)
+            if caminho:
+                st.session_state['exportacao_transacoes'] = (caminho, formato, extensao, mime)
+
+        exportado = st.session_state.get('exportacao_transacoes')
+        if exportado:
+            caminho, formato, extensao, mime = exportado
+            df_previa = previa_exportacao(caminho, formato)
+            if df_previa is not None:
+                st.subheader("Prévia (primeiras linhas)")
+                st.dataframe(df_previa, hide_index=True, use_container_width=True)
+
+            with open(caminho, "rb") as arquivo:
+                st.download_button(
+                    label=f"📥 Download {extensao.upper()}",
+                    data=arquivo,
+                    file_name=f"transacoes_{data_inicio.strftime('%Y%m%d')}_{data_fim.strftime('%Y%m%d')}.{extensao}",
+                    mime=mime,
+                )
+
     # Adicionar botão para recarregar os dados
     if st.button("🔄 Recarregar Dados"):
         st.cache_data.clear()
@@ -0,0 +1,144 @@
+import streamlit as st
+import pandas as pd
+from datetime import date
+from utils.api import APIClient
+from locale_config import setup_locale, format_number, format_brl
+
+# Primeiro comando Streamlit DEVE ser st.set_page_config
+st.set_page_config(
+    page_title="Explorar Transações | Dashboard de Vendas",
+    page_icon="🔎",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
+
+# Configurar locale para formatação de números
+setup_locale()
+
+# Linhas buscadas por página
+TAMANHO_PAGINA = 200
+
+COLUNAS = {
+    'data_fatura': 'Data',
+    'numero_fatura': 'Fatura',
+    'codigo_produto': 'Produto',
+    'descricao': 'Descrição',
+    'quantidade': 'Quantidade',
+    'preco_unitario': 'Preço Unitário',
+    'valor_total': 'Valor Total',
+    'id_cliente': 'Cliente',
+    'pais': 'País',
+    'categoria_produto': 'Categoria',
+    'categoria_preco': 'Faixa de Preço'
+}
+
+def filtros_atuais(data_inicio, data_fim, pais, codigo_produto, id_cliente, ordem):
+    return {
+        'data_inicio': data_inicio.strftime("%Y-%m-%d"),
+        'data_fim': data_fim.strftime("%Y-%m-%d"),
+        'paises': [pais] if pais else None,
+        'codigo_produto': codigo_produto or None,
+        'id_cliente': id_cliente or None,
+        'ordem': ordem
+    }
+
+def reiniciar(filtros):
+    """Descarta as páginas carregadas quando os filtros mudam"""
+    st.session_state.transacoes_filtros = filtros
+    st.session_state.transacoes_paginas = []
+    st.session_state.transacoes_cursor = None
+    st.session_state.transacoes_fim = False
+
+def carregar_proxima_pagina():
+    """Busca apenas a página seguinte a partir do cursor da última página recebida"""
+    try:
+        resposta = APIClient().get_transacoes(
+            cursor=st.session_state.transacoes_cursor,
+            limite=TAMANHO_PAGINA,
+            **st.session_state.transacoes_filtros
+        )
+    except Exception as e:
+        st.error(f"Erro ao carregar transações: {str(e)}")
+        return
+
+    if resposta.get('status') != 'success':
+        st.error("Erro na resposta da API")
+        return
+
+    if resposta['data']:
+        st.session_state.transacoes_paginas.append(pd.DataFrame(resposta['data']))
+    st.session_state.transacoes_cursor = resposta.get('proximo_cursor')
+    st.session_state.transacoes_fim = resposta.get('proximo_cursor') is None
+
+st.title("🔎 Explorar Transações")
+st.markdown("---")
+st.markdown("""
+Consulte as transações individuais por produto, cliente, país ou período.
+Os dados são carregados em páginas conforme você avança na lista.
+""")
+
+# Filtros
+with st.expander("Filtros", expanded=True):
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        data_inicio = st.date_input(
+            "Data Inicial",
+            value=date(2011, 1, 1),
+            min_value=date(2011, 1, 1),
+            max_value=date(2011, 12, 31),
+            format="DD/MM/YYYY"
+        )
+        data_fim = st.date_input(
+            "Data Final",
+            value=date(2011, 12, 31),
+            min_value=date(2011, 1, 1),
+            max_value=date(2011, 12, 31),
+            format="DD/MM/YYYY"
+        )
+    with col2:
+        codigo_produto = st.text_input("Código do Produto")
+        id_cliente = st.text_input("ID do Cliente")
+    with col3:
+        pais = st.text_input("País")
+        ordem = st.radio(
+            "Ordem",
+            ['asc', 'desc'],
+            format_func=lambda o: "Mais antigas primeiro" if o == 'asc' else "Mais recentes primeiro",
+            horizontal=True
+        )
+
+filtros = filtros_atuais(data_inicio, data_fim, pais.strip(), codigo_produto.strip(), id_cliente.strip(), ordem)
+if st.session_state.get('transacoes_filtros') != filtros:
+    reiniciar(filtros)
+    carregar_proxima_pagina()
+
+paginas = st.session_state.transacoes_paginas
+if paginas:
+    df = pd.concat(paginas, ignore_index=True)
+    df['data_fatura'] = pd.to_datetime(df['data_fatura'])
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Transações carregadas", format_number(len(df)))
+    with col2:
+        st.metric("Valor das transações carregadas", format_brl(df['valor_total'].sum()))
+
+    st.dataframe(
+        df[list(COLUNAS)],
+        column_config={
+            **COLUNAS,
+            'data_fatura': st.column_config.DatetimeColumn('Data', format="DD/MM/YYYY HH:mm"),
+            'preco_unitario': st.column_config.NumberColumn('Preço Unitário', format="%.2f"),
+            'valor_total': st.column_config.NumberColumn('Valor Total', format="%.2f")
+        },
+        hide_index=True,
+        use_container_width=True,
+        height=600
+    )
+else:
+    st.info("Nenhuma transação encontrada para os filtros selecionados.")
+
+if not st.session_state.transacoes_fim:
+    st.button(f"⬇️ Carregar mais {TAMANHO_PAGINA} transações", on_click=carregar_proxima_pagina)
+elif paginas:
+    st.caption("Todas as transações dos filtros selecionados foram carregadas.")
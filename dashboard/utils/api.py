@@ -1,82 +1,167 @@
 # utils/api.py
+import json
 import requests
 import pandas as pd
-from typing import Dict, Any
+import pyarrow as pa
+from typing import Any, BinaryIO, Callable, Dict, List, Tuple
 from config.settings import Settings
 
+MIDIA_ARROW = 'application/vnd.apache.arrow.stream'
+
 class APIClient:
     """Cliente para comunicação com a API"""
+
+    # Última resposta de cada URL com seu ETag, compartilhada entre instâncias
+    # (o Streamlit recria o cliente a cada execução da página)
+    _respostas: Dict[Tuple, Tuple[str, Dict[str, Any]]] = {}
     
     def __init__(self):
         """Inicializa o cliente API com as configurações"""
         self.settings = Settings()
+
+    def _get(self, url: str, params: Dict[str, Any] = None, arrow: bool = False) -> Tuple[int, Any]:
+        """
+        Faz um GET revalidando com If-None-Match: quando a API responde 304,
+        reaproveita a resposta guardada em vez de baixar o corpo novamente
+        Args:
+            arrow: Pede a resposta em Arrow IPC em vez de JSON
+        Returns: Tupla (status HTTP, JSON da resposta ou corpo Arrow em bytes)
+        """
+        chave = (url, arrow, tuple(sorted((params or {}).items())))
+        guardado = self._respostas.get(chave)
+        headers = {'If-None-Match': guardado[0]} if guardado else {}
+        if arrow:
+            headers['Accept'] = MIDIA_ARROW
+
+        response = requests.get(url, params=params, headers=headers)
+        if response.status_code == 304 and guardado:
+            return 200, guardado[1]
+
+        # Erros chegam sempre em JSON, mesmo quando Arrow foi pedido
+        if response.headers.get('Content-Type', '').startswith(MIDIA_ARROW):
+            data = response.content
+        else:
+            data = response.json()
+        etag = response.headers.get('ETag')
+        if response.status_code == 200 and etag:
+            self._respostas[chave] = (etag, data)
+        return response.status_code, data
+
+    @staticmethod
+    def _ler_arrow(corpo: bytes) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        """
+        Converte um corpo Arrow IPC em DataFrame sem passar por JSON; as colunas
+        numéricas sem nulos são aproveitadas do buffer recebido sem cópia
+        Returns: Tupla (DataFrame, demais campos da resposta)
+        """
+        tabela = pa.ipc.open_stream(pa.py_buffer(corpo)).read_all()
+        metadados = json.loads(tabela.schema.metadata[b'resposta'])
+        return tabela.to_pandas(split_blocks=True), metadados
+
+    @staticmethod
+    def _filtros(data_inicio: str = None, data_fim: str = None, paises: List[str] = None,
+                 categorias: List[str] = None, faixas_preco: List[str] = None) -> Dict[str, Any]:
+        """
+        Monta os parâmetros de filtro aceitos pelas rotas de análise
+        Args:
+            data_inicio: Data inicial no formato YYYY-MM-DD
+            data_fim: Data final no formato YYYY-MM-DD
+            paises: Lista de países
+            categorias: Lista de categorias de produto
+            faixas_preco: Lista de categorias de preço
+        Returns: Dict de parâmetros para a query string
+        """
+        params = {}
+        if data_inicio:
+            params['data_inicio'] = data_inicio
+        if data_fim:
+            params['data_fim'] = data_fim
+        if paises:
+            params['pais'] = tuple(paises)
+        if categorias:
+            params['categoria'] = tuple(categorias)
+        if faixas_preco:
+            params['faixa_preco'] = tuple(faixas_preco)
+        return params
     
     def get_vendas_pais(self) -> Dict[str, Any]:
         """
         Obtém dados de vendas por país (retorna JSON bruto)
         Returns: Dict com dados de vendas por país
         """
-        response = requests.get(self.settings.ENDPOINT_VENDAS_PAIS)
-        return response.json()
+        return self._get(self.settings.ENDPOINT_VENDAS_PAIS)[1]
     
-    def get_vendas_por_pais(self) -> pd.DataFrame:
+    def get_vendas_por_pais(self, arrow: bool = False, **filtros) -> pd.DataFrame:
         """
         Obtém dados de vendas por país e converte para DataFrame
+        Args:
+            arrow: Recebe os dados em Arrow IPC em vez de JSON
+            **filtros: data_inicio, data_fim, paises, categorias, faixas_preco
         Returns: DataFrame com dados de vendas por país
         """
+        if arrow:
+            return self.get_tabela_arrow(self.settings.ENDPOINT_VENDAS_PAIS, **filtros)[0]
         try:
-            response = requests.get(self.settings.ENDPOINT_VENDAS_PAIS)
-            if response.status_code == 200:
-                data = response.json()
+            status_code, data = self._get(self.settings.ENDPOINT_VENDAS_PAIS, params=self._filtros(**filtros))
+            if status_code == 200:
                 return pd.DataFrame(data['data'])
             else:
-                raise Exception(f"Erro na API: {response.status_code}")
+                raise Exception(f"Erro na API: {status_code}")
         except requests.exceptions.RequestException as e:
             raise Exception(f"Erro na requisição: {str(e)}")
     
-    def get_analise_temporal(self, data_inicio: str = None, data_fim: str = None) -> Dict[str, Any]:
+    def get_analise_temporal(self, data_inicio: str = None, data_fim: str = None, **filtros) -> Dict[str, Any]:
         """
         Obtém dados de análise temporal com filtro de datas
         Args:
             data_inicio: Data inicial no formato YYYY-MM-DD
             data_fim: Data final no formato YYYY-MM-DD
+            **filtros: paises, categorias, faixas_preco
         Returns: Dict com dados de análise temporal
         """
-        params = {}
-        if data_inicio:
-            params['data_inicio'] = data_inicio
-        if data_fim:
-            params['data_fim'] = data_fim
-            
-        response = requests.get(
-            self.settings.ENDPOINT_TEMPORAL,
-            params=params
-        )
-        return response.json()
+        params = self._filtros(data_inicio, data_fim, **filtros)
+        return self._get(self.settings.ENDPOINT_TEMPORAL, params=params)[1]
     
-    def get_analise_produtos(self) -> Dict[str, Any]:
+    def get_analise_produtos(self, **filtros) -> Dict[str, Any]:
         """
         Obtém dados de análise de produtos
+        Args:
+            **filtros: data_inicio, data_fim, paises, categorias, faixas_preco
         Returns: Dict com dados de análise de produtos
         """
-        response = requests.get(self.settings.ENDPOINT_PRODUTOS)
-        return response.json()
+        return self._get(self.settings.ENDPOINT_PRODUTOS, params=self._filtros(**filtros))[1]
     
-    def get_analise_clientes(self) -> Dict[str, Any]:
+    def get_analise_clientes(self, **filtros) -> Dict[str, Any]:
         """
         Obtém dados de análise de clientes
+        Args:
+            **filtros: data_inicio, data_fim, paises, categorias, faixas_preco
         Returns: Dict com dados de análise de clientes
         """
-        response = requests.get(self.settings.ENDPOINT_CLIENTES)
-        return response.json()
+        return self._get(self.settings.ENDPOINT_CLIENTES, params=self._filtros(**filtros))[1]
     
-    def get_analise_faturamento(self) -> Dict[str, Any]:
+    def get_analise_faturamento(self, **filtros) -> Dict[str, Any]:
         """
         Obtém dados de análise de faturamento
+        Args:
+            **filtros: data_inicio, data_fim, paises, categorias, faixas_preco
         Returns: Dict com dados de análise de faturamento
         """
-        response = requests.get(self.settings.ENDPOINT_FATURAMENTO)
-        return response.json()
+        return self._get(self.settings.ENDPOINT_FATURAMENTO, params=self._filtros(**filtros))[1]
+
+    def get_analise_bundle(self, analises: List[str] = None, **filtros) -> Dict[str, Any]:
+        """
+        Obtém várias análises com os mesmos filtros em uma única requisição
+        Args:
+            analises: Nomes das análises (vendas-por-pais, temporal, produtos, clientes, faturamento);
+                      todas quando não informado
+            **filtros: data_inicio, data_fim, paises, categorias, faixas_preco
+        Returns: Dict com uma chave por análise (vendas_por_pais, temporal, ...)
+        """
+        params = self._filtros(**filtros)
+        if analises:
+            params['analises'] = tuple(analises)
+        return self._get(self.settings.ENDPOINT_BUNDLE, params=params)[1]
 
     
 
@@ -84,3 +169,73 @@ class APIClient:
 # Exemplo de uso:
 # client = APIClient()
 # dados_vendas = client.get_vendas_pais()
+
+    def get_tabela_arrow(self, endpoint: str, tabela: str = None, **filtros) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        """
+        Obtém uma lista de uma rota de análise em Arrow IPC, já como DataFrame
+        Args:
+            endpoint: URL da análise (Settings.ENDPOINT_*; o bundle não suporta Arrow)
+            tabela: Lista da resposta (ex.: evolucao_temporal, categorias); a primeira quando omitida
+            **filtros: data_inicio, data_fim, paises, categorias, faixas_preco
+        Returns: Tupla (DataFrame da lista, demais campos da resposta como status e totais)
+        """
+        params = self._filtros(**filtros)
+        if tabela:
+            params['tabela'] = tabela
+        try:
+            status_code, data = self._get(endpoint, params=params, arrow=True)
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"Erro na requisição: {str(e)}")
+        if status_code != 200:
+            raise Exception(f"Erro na API: {status_code}")
+        if isinstance(data, dict):
+            raise Exception(f"Erro na API: {data.get('status')}")
+        return self._ler_arrow(data)
+
+    def get_transacoes(self, cursor: str = None, limite: int = 100, codigo_produto: str = None,
+                       id_cliente: str = None, ordem: str = 'asc', **filtros) -> Dict[str, Any]:
+        """
+        Obtém uma página de transações individuais (detalhamento)
+        Args:
+            cursor: proximo_cursor da página anterior; None para a primeira página
+            limite: Número de linhas da página
+            codigo_produto: Código do produto
+            id_cliente: ID do cliente
+            ordem: asc ou desc por data da fatura
+            **filtros: data_inicio, data_fim, paises, categorias, faixas_preco
+        Returns: Dict com data (linhas) e proximo_cursor (None na última página)
+        """
+        params = self._filtros(**filtros)
+        params.update(limite=limite, ordem=ordem)
+        if cursor:
+            params['cursor'] = cursor
+        if codigo_produto:
+            params['codigo_produto'] = codigo_produto
+        if id_cliente:
+            params['id_cliente'] = id_cliente
+        return self._get(self.settings.ENDPOINT_TRANSACOES, params=params)[1]
+
+    def exportar_transacoes(self, arquivo: BinaryIO, formato: str = 'csv',
+                            ao_receber: Callable[[int], None] = None, **filtros) -> int:
+        """
+        Baixa as transações em streaming, gravando cada pedaço no arquivo à medida que chega
+        Args:
+            arquivo: Arquivo binário aberto para escrita
+            formato: csv, ndjson ou parquet
+            ao_receber: Chamado com o total de bytes recebidos após cada pedaço
+            **filtros: data_inicio, data_fim, paises, categorias, faixas_preco
+        Returns: Total de bytes gravados
+        """
+        params = self._filtros(**filtros)
+        params['formato'] = formato
+        total = 0
+        with requests.get(self.settings.ENDPOINT_EXPORTAR, params=params, stream=True) as response:
+            response.raise_for_status()
+            if response.headers.get('Content-Type', '').startswith('application/json'):
+                raise RuntimeError(response.json().get('message', 'Erro na exportação'))
+            for pedaco in response.iter_content(chunk_size=1024 * 1024):
+                arquivo.write(pedaco)
+                total += len(pedaco)
+                if ao_receber:
+                    ao_receber(total)
+        return total
@@ -0,0 +1,37 @@
+"""
+Configuração dos testes.
+
+Os testes que usam o banco precisam de um Postgres dedicado em TESTE_DATABASE_URL (as
+tabelas são apagadas e recriadas); sem ela, só os testes sem banco rodam:
+
+    TESTE_DATABASE_URL=postgresql+psycopg2://postgres@localhost/retail_teste python -m pytest -q
+"""
+import os
+
+import pytest
+
+# Antes de importar app: as configurações são lidas na importação
+os.environ.setdefault("SUPABASE_URL", "http://teste")
+os.environ.setdefault("SUPABASE_KEY", "teste")
+os.environ["DATABASE_URL"] = os.environ.get("TESTE_DATABASE_URL", "postgresql+psycopg2://teste@localhost/teste")
+os.environ["BACKEND"] = "postgres"
+
+
+@pytest.fixture
+def banco():
+    """Banco de teste vazio: transactions_sample e as tabelas derivadas são recriadas"""
+    if "TESTE_DATABASE_URL" not in os.environ:
+        pytest.skip("TESTE_DATABASE_URL não definida")
+    from app.cache import cache_respostas
+    from app.database import Base, engine
+    from app.models import Transaction
+    from app.rollups import invalidar_cache_estado
+
+    with engine.begin() as conexao:
+        Base.metadata.drop_all(bind=conexao)
+        conexao.exec_driver_sql(f"DROP TABLE IF EXISTS {Transaction.__tablename__}_carga")
+    # Respostas e rollups disponíveis guardados em memória por um teste anterior
+    cache_respostas.invalidar()
+    invalidar_cache_estado()
+    yield engine
+    engine.dispose()
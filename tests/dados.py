@@ -0,0 +1,50 @@
+"""Dados sintéticos com o formato do arquivo Online Retail"""
+from datetime import datetime, timedelta
+
+
+def linhas_brutas(faturas: int, inicio: int = 500000, linhas_por_fatura: int = 4) -> list:
+    """Transações com as colunas do arquivo original, várias linhas por fatura com a mesma DataFatura"""
+    base = datetime(2011, 1, 3, 9)
+    return [
+        {
+            "InvoiceNo": str(f),
+            "StockCode": f"P{(f + j) % 17}",
+            "Description": f"PRODUTO {(f + j) % 17}",
+            "Quantity": 1 + (f * 7 + j) % 9,
+            # Duas faturas por hora: a paginação cruza faturas com a mesma data
+            "InvoiceDate": (base + timedelta(hours=(f - inicio) // 2)).isoformat(),
+            "UnitPrice": round(0.5 + ((f * 13 + j) % 40) / 4, 2),
+            "CustomerID": str(12000 + f % 23),
+            "Country": ("United Kingdom", "France", "Germany")[f % 3],
+        }
+        for f in range(inicio, inicio + faturas)
+        for j in range(1 + (f % linhas_por_fatura))
+    ]
+
+
+def transacoes(linhas: list) -> list:
+    """Linhas brutas com as colunas de transactions_sample; a categoria vem do código do produto"""
+    saida = []
+    for linha in linhas:
+        data = datetime.fromisoformat(linha["InvoiceDate"])
+        preco = linha["UnitPrice"]
+        saida.append({
+            "NumeroFatura": linha["InvoiceNo"],
+            "CodigoProduto": linha["StockCode"],
+            "Descricao": linha["Description"],
+            "Quantidade": linha["Quantity"],
+            "DataFatura": data,
+            "PrecoUnitario": preco,
+            "IDCliente": linha["CustomerID"],
+            "Pais": linha["Country"],
+            "CategoriaProduto": f"Categoria {ord(linha['StockCode'][-1]) % 3}",
+            "CategoriaPreco": "Barato" if preco <= 5 else "Moderado" if preco <= 20 else "Caro",
+            "ValorTotalFatura": round(linha["Quantity"] * preco, 2),
+            "FaturaUnica": False,
+            "Ano": data.year,
+            "Mes": data.month,
+            "Dia": data.day,
+            "DiaSemana": data.weekday(),
+            "SemanaAno": data.isocalendar()[1],
+        })
+    return saida
@@ -0,0 +1,70 @@
+"""Rotas de /api/v1/analise sobre transactions_sample com rollups e esboços HLL"""
+import pytest
+
+from tests.dados import linhas_brutas, transacoes
+
+
+@pytest.fixture
+def cliente(banco):
+    from fastapi.testclient import TestClient
+
+    from app.database import SessionLocal, async_engine
+    from app.main import app
+    from app.models import Transaction
+    from app.rollups import atualizar_rollups
+
+    with banco.begin() as conexao:
+        Transaction.__table__.create(bind=conexao)
+        conexao.execute(Transaction.__table__.insert(), transacoes(linhas_brutas(90)))
+    db = SessionLocal()
+    try:
+        atualizar_rollups(db)
+    finally:
+        db.close()
+    with TestClient(app) as cliente:
+        yield cliente
+        # As conexões do pool assíncrono pertencem ao event loop deste cliente
+        cliente.portal.call(async_engine.dispose)
+
+
+@pytest.mark.parametrize("approx", [False, True])
+def test_clientes_sem_transacoes_no_filtro(cliente, approx):
+    resposta = cliente.get("/api/v1/analise/clientes", params={"pais": "Nowhere", "approx": approx}).json()
+
+    assert resposta["status"] == "success"
+    assert resposta["top_clientes"] == []
+    assert resposta["distribuicao_por_pais"] == {}
+    assert resposta["media_compras_por_cliente"] == 0
+
+
+def test_bundle_respeita_o_limite_de_sessoes_paralelas(cliente, monkeypatch):
+    import weakref
+
+    from app import database
+    from app.cache import cache_respostas
+
+    esperado = cliente.get("/api/v1/analise/bundle").json()
+
+    abertas = pico = 0
+    fabrica = database.AsyncSessionLocal
+
+    class SessaoContada:
+        async def __aenter__(self):
+            nonlocal abertas, pico
+            abertas += 1
+            pico = max(pico, abertas)
+            self.sessao = fabrica()
+            return await self.sessao.__aenter__()
+
+        async def __aexit__(self, *exc):
+            nonlocal abertas
+            abertas -= 1
+            return await self.sessao.__aexit__(*exc)
+
+    monkeypatch.setattr(database, "AsyncSessionLocal", SessaoContada)
+    monkeypatch.setattr(database, "SESSOES_PARALELAS", 1)
+    monkeypatch.setattr(database, "_vagas_paralelas", weakref.WeakKeyDictionary())
+    cache_respostas.invalidar()
+
+    assert cliente.get("/api/v1/analise/bundle").json() == esperado
+    assert pico == 1
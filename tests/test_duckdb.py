@@ -0,0 +1,82 @@
+"""Paridade entre backends: as mesmas rotas no Postgres e no DuckDB lendo o Parquet exportado pela API"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from tests.dados import linhas_brutas, transacoes
+
+pytest.importorskip("duckdb_engine")
+pytest.importorskip("pyarrow")
+
+ROTAS = [
+    "/api/v1/analise/vendas-por-pais",
+    "/api/v1/analise/vendas-por-pais?pais=France&pais=Germany",
+    "/api/v1/analise/temporal",
+    "/api/v1/analise/produtos?data_inicio=2011-01-04&data_fim=2011-01-04",
+    "/api/v1/analise/clientes",
+    "/api/v1/analise/clientes?categoria=Categoria 1",
+    "/api/v1/analise/faturamento?granularity=week",
+    "/api/v1/analise/bundle",
+    "/api/v1/analise/bundle?pais=United Kingdom&faixa_preco=Barato",
+    "/api/v1/transacoes?limite=50",
+]
+
+# Executado em outro processo: o backend é escolhido na importação de app.database
+_CONSULTAR_DUCKDB = """
+import json, sys
+from fastapi.testclient import TestClient
+from app.main import app
+with TestClient(app) as cliente:
+    print(json.dumps([cliente.get(rota).json() for rota in json.loads(sys.argv[1])]))
+"""
+
+
+@pytest.fixture
+def cliente(banco):
+    from fastapi.testclient import TestClient
+
+    from app.database import async_engine
+    from app.main import app
+    from app.models import Transaction
+
+    with banco.begin() as conexao:
+        Transaction.__table__.create(bind=conexao)
+        conexao.execute(Transaction.__table__.insert(), transacoes(linhas_brutas(90)))
+    with TestClient(app) as cliente:
+        yield cliente
+        # As conexões do pool assíncrono pertencem ao event loop deste cliente
+        cliente.portal.call(async_engine.dispose)
+
+
+def _respostas_duckdb(parquet: Path) -> list:
+    ambiente = dict(os.environ, BACKEND="duckdb", DUCKDB_PARQUET=str(parquet))
+    saida = subprocess.run(
+        [sys.executable, "-c", _CONSULTAR_DUCKDB, json.dumps(ROTAS)],
+        cwd=Path(__file__).parent.parent, env=ambiente, capture_output=True, text=True, check=True,
+    )
+    return json.loads(saida.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize("rollups", [False, True])
+def test_respostas_iguais_no_postgres_e_no_duckdb(cliente, tmp_path, rollups):
+    from app.database import SessionLocal
+    from app.rollups import atualizar_rollups
+
+    if rollups:
+        db = SessionLocal()
+        try:
+            atualizar_rollups(db)
+        finally:
+            db.close()
+    parquet = tmp_path / "transacoes.parquet"
+    parquet.write_bytes(cliente.get("/api/v1/transacoes/exportar", params={"formato": "parquet"}).content)
+
+    postgres = [cliente.get(rota).json() for rota in ROTAS]
+
+    assert all(r["status"] == "success" for r in postgres)
+    for rota, esperada, obtida in zip(ROTAS, postgres, _respostas_duckdb(parquet)):
+        assert obtida == esperada, rota
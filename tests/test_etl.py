@@ -0,0 +1,49 @@
+"""Pipeline de app.etl: deduplicação entre lotes e colunas derivadas"""
+import pandas as pd
+
+from app.etl.pipeline import PipelineETL
+from app.etl.transformacoes import CATEGORIA_DESCONHECIDA
+from tests.dados import linhas_brutas
+
+
+def _rodar(caminho, tamanho_lote: int):
+    pipeline = PipelineETL(str(caminho), tamanho_lote, categorias=False)
+    saida = pd.concat(list(pipeline.lotes()), ignore_index=True)
+    return saida, pipeline.estatisticas
+
+
+def _arquivo(tmp_path, linhas: list):
+    caminho = tmp_path / "bruto.csv"
+    pd.DataFrame(linhas).to_csv(caminho, index=False)
+    return caminho
+
+
+def test_duplicatas_entre_lotes_sao_descartadas(tmp_path):
+    linhas = linhas_brutas(60)
+    # Repetidas no mesmo lote (vizinhas) e em lotes posteriores (fim do arquivo)
+    repetidas = [linhas[3], linhas[3]] + linhas[:25]
+    caminho = _arquivo(tmp_path, linhas[:10] + repetidas[:2] + linhas[10:] + repetidas[2:])
+
+    saida, estatisticas = _rodar(caminho, tamanho_lote=7)
+    referencia, _ = _rodar(_arquivo(tmp_path, linhas), tamanho_lote=len(linhas))
+
+    assert estatisticas["linhas_lidas"] == len(linhas) + len(repetidas)
+    assert estatisticas["linhas_duplicadas"] == len(repetidas)
+    assert not saida.duplicated(["NumeroFatura", "CodigoProduto", "Quantidade", "PrecoUnitario"]).any()
+    pd.testing.assert_frame_equal(saida, referencia)
+
+
+def test_linha_igual_com_outro_valor_nao_e_duplicata(tmp_path):
+    linhas = linhas_brutas(20)
+    alterada = dict(linhas[0], Quantity=linhas[0]["Quantity"] + 1)
+    saida, estatisticas = _rodar(_arquivo(tmp_path, linhas + [alterada]), tamanho_lote=5)
+
+    assert estatisticas["linhas_duplicadas"] == 0
+    assert len(saida) == len(linhas) + 1
+
+
+def test_sem_categorias_preenche_categoria_desconhecida(tmp_path):
+    saida, _ = _rodar(_arquivo(tmp_path, linhas_brutas(20)), tamanho_lote=8)
+
+    assert saida["CategoriaProduto"].notna().all()
+    assert set(saida["CategoriaProduto"]) == {CATEGORIA_DESCONHECIDA}
@@ -0,0 +1,80 @@
+"""Paginação por chave (DataFatura, id) de GET /api/v1/transacoes"""
+from datetime import datetime
+
+import pytest
+
+from app.api.routes import _codificar_cursor, _decodificar_cursor
+from tests.dados import linhas_brutas, transacoes
+
+
+@pytest.mark.parametrize("data_fatura", [datetime(2011, 3, 1, 9, 30), datetime(2011, 12, 9, 12, 50, 0, 123456)])
+def test_cursor_ida_e_volta(data_fatura):
+    cursor = _codificar_cursor(data_fatura, 9_007_199_254_740_993)
+
+    assert "=" not in cursor
+    assert _decodificar_cursor(cursor) == (data_fatura, 9_007_199_254_740_993)
+
+
+@pytest.fixture
+def cliente(banco):
+    from fastapi.testclient import TestClient
+
+    from app.database import async_engine
+    from app.main import app
+    from app.models import Transaction
+
+    with banco.begin() as conexao:
+        Transaction.__table__.create(bind=conexao)
+        conexao.execute(Transaction.__table__.insert(), transacoes(linhas_brutas(90)))
+    with TestClient(app) as cliente:
+        yield cliente
+        # As conexões do pool assíncrono pertencem ao event loop deste cliente
+        cliente.portal.call(async_engine.dispose)
+
+
+def _paginar(cliente, limite: int, **parametros) -> list:
+    linhas, cursor = [], None
+    while True:
+        pagina = cliente.get("/api/v1/transacoes", params=dict(parametros, limite=limite, cursor=cursor)).json()
+        assert pagina["status"] == "success"
+        linhas += [(l["data_fatura"], l["numero_fatura"], l["codigo_produto"]) for l in pagina["data"]]
+        cursor = pagina["proximo_cursor"]
+        if cursor is None:
+            return linhas
+
+
+@pytest.mark.parametrize("limite", [1, 3, 7, 1000])
+def test_paginas_trazem_cada_linha_uma_vez(banco, cliente, limite):
+    from sqlalchemy import func, select
+
+    from app.models import Transaction
+
+    with banco.connect() as conexao:
+        total = conexao.execute(select(func.count()).select_from(Transaction)).scalar()
+    linhas = _paginar(cliente, limite)
+
+    # Faturas com várias linhas e a mesma DataFatura são divididas entre páginas
+    assert len(linhas) == total
+    assert len(set(linhas)) == total
+    assert [l[0] for l in linhas] == sorted(l[0] for l in linhas)
+
+
+def test_ordem_decrescente_e_o_inverso(cliente):
+    crescente = _paginar(cliente, 4)
+
+    assert _paginar(cliente, 4, ordem="desc") == crescente[::-1]
+
+
+def test_filtro_por_cliente(banco, cliente):
+    from sqlalchemy import func, select
+
+    from app.models import Transaction
+
+    with banco.connect() as conexao:
+        total = conexao.execute(
+            select(func.count()).select_from(Transaction).where(Transaction.IDCliente == "12005")
+        ).scalar()
+    linhas = _paginar(cliente, 2, id_cliente="12005")
+
+    assert total > 2
+    assert len(set(linhas)) == len(linhas) == total
@@ -0,0 +1,164 @@
+"""Atualização incremental dos rollups (app.rollups) com linhas novas e removidas pela ingestão"""
+import pandas as pd
+import pytest
+from sqlalchemy import inspect, select
+
+from tests.dados import linhas_brutas, transacoes
+
+
+def _atualizar():
+    from app.database import SessionLocal
+    from app.rollups import atualizar_rollups
+
+    db = SessionLocal()
+    try:
+        return atualizar_rollups(db)
+    finally:
+        db.close()
+
+
+def _conteudo(banco) -> dict:
+    """Linhas de cada rollup que desconta as removidas (os esboços HLL só crescem)"""
+    from app.rollups import VAZIAS
+
+    with banco.connect() as conexao:
+        return {
+            modelo.__tablename__: sorted(tuple(l) for l in conexao.execute(select(modelo.__table__)))
+            for modelo in VAZIAS
+        }
+
+
+def _reconstruir(banco) -> dict:
+    from app.rollups import descartar_marcas
+
+    with banco.begin() as conexao:
+        descartar_marcas(conexao)
+    _atualizar()
+    return _conteudo(banco)
+
+
+def _ingerir(linhas: list):
+    from app.etl.incremental import ingerir
+
+    return ingerir([pd.DataFrame(transacoes(linhas))], "teste")
+
+
+@pytest.fixture
+def carregado(banco):
+    from app.etl.carga import carregar
+
+    linhas = linhas_brutas(120)
+    carregar([pd.DataFrame(transacoes(linhas))])
+    _atualizar()
+    return linhas
+
+
+def _fatura(linhas: list, numero: int) -> list:
+    return [l for l in linhas if l["InvoiceNo"] == str(numero)]
+
+
+def test_incremental_igual_a_reconstrucao(banco, carregado):
+    alteradas = [dict(l, Quantity=l["Quantity"] + 2) for n in range(500000, 500010) for l in _fatura(carregado, n)]
+    # Fatura com uma linha a menos, fatura que muda de país e faturas novas
+    encolhida = _fatura(carregado, 500011)[:-1]
+    mudou_pais = [dict(l, Country="Spain") for l in _fatura(carregado, 500012)]
+    novas = linhas_brutas(10, inicio=500120)
+    resultado = _ingerir(alteradas + encolhida + mudou_pais + novas)
+
+    assert resultado["faturas_alteradas"] == 12
+    assert resultado["faturas_novas"] == 10
+    assert resultado["linhas_removidas"] >= len(alteradas) + len(encolhida) + 1 + len(mudou_pais)
+
+    _atualizar()
+    incremental = _conteudo(banco)
+    assert incremental == _reconstruir(banco)
+
+
+def test_linhas_esvaziadas_saem_do_rollup(banco, carregado):
+    from app.models import RollupClientes, RollupProdutos
+
+    fatura = [dict(l, InvoiceNo="600000", CustomerID="99999", StockCode="NOVO") for l in _fatura(carregado, 500003)]
+    _ingerir(fatura)
+    _atualizar()
+    # A mesma fatura reenviada com outro cliente e outro produto
+    _ingerir([dict(l, CustomerID="99998", StockCode="OUTRO") for l in fatura])
+    _atualizar()
+
+    with banco.connect() as conexao:
+        clientes = set(conexao.execute(select(RollupClientes.IDCliente)).scalars())
+        produtos = set(conexao.execute(select(RollupProdutos.CodigoProduto)).scalars())
+    assert "99999" not in clientes and "99998" in clientes
+    assert "NOVO" not in produtos and "OUTRO" in produtos
+    assert _conteudo(banco) == _reconstruir(banco)
+
+
+def test_desconto_das_linhas_substituidas(banco, carregado):
+    from app.models import RollupProdutos
+
+    antes = _fatura(carregado, 500001)
+    produto = antes[0]["StockCode"]
+    with banco.connect() as conexao:
+        quantidade_antes = conexao.execute(
+            select(RollupProdutos.quantidade_vendida).where(RollupProdutos.CodigoProduto == produto)
+        ).scalar()
+
+    _ingerir([dict(antes[0], Quantity=antes[0]["Quantity"] + 5)] + antes[1:])
+    _atualizar()
+
+    with banco.connect() as conexao:
+        quantidade_depois = conexao.execute(
+            select(RollupProdutos.quantidade_vendida).where(RollupProdutos.CodigoProduto == produto)
+        ).scalar()
+    assert quantidade_depois == quantidade_antes + 5
+
+
+def test_reprocessar_o_mesmo_lote_nao_altera_rollups(banco, carregado):
+    lote = [dict(l, Quantity=l["Quantity"] + 1) for l in _fatura(carregado, 500020)] + linhas_brutas(5, inicio=500200)
+    _ingerir(lote)
+    _atualizar()
+    conteudo = _conteudo(banco)
+
+    resultado = _ingerir(lote)
+    _atualizar()
+
+    assert resultado["faturas_alteradas"] == resultado["faturas_novas"] == 0
+    assert resultado["linhas_inseridas"] == 0
+    assert _conteudo(banco) == conteudo
+
+
+def test_ingestao_atualiza_os_rollups_construidos(banco, carregado):
+    from app.models import RollupProdutos
+
+    antes = _fatura(carregado, 500001)
+    produto = antes[0]["StockCode"]
+    with banco.connect() as conexao:
+        quantidade_antes = conexao.execute(
+            select(RollupProdutos.quantidade_vendida).where(RollupProdutos.CodigoProduto == produto)
+        ).scalar()
+
+    # Sem _atualizar(): as rotas leem os rollups logo depois da ingestão
+    resultado = _ingerir([dict(antes[0], Quantity=antes[0]["Quantity"] + 5)] + antes[1:] + linhas_brutas(5, inicio=500200))
+
+    assert RollupProdutos.__tablename__ in resultado["rollups"]
+    with banco.connect() as conexao:
+        quantidade_depois = conexao.execute(
+            select(RollupProdutos.quantidade_vendida).where(RollupProdutos.CodigoProduto == produto)
+        ).scalar()
+    assert quantidade_depois >= quantidade_antes + 5
+    assert _conteudo(banco) == _reconstruir(banco)
+
+
+def test_ingestao_nao_constroi_rollups(banco):
+    from app.etl.carga import carregar
+    from app.models import RollupEstado
+
+    carregar([pd.DataFrame(transacoes(linhas_brutas(20)))])
+    resultado = _ingerir(linhas_brutas(5, inicio=500200))
+
+    assert resultado["linhas_inseridas"] > 0
+    assert resultado["rollups"] is None
+    with banco.connect() as conexao:
+        construidos = inspect(conexao).has_table(RollupEstado.__tablename__) and conexao.execute(
+            select(RollupEstado).where(RollupEstado.ultimo_created_at.isnot(None))
+        ).first()
+    assert not construidos